@@ -1,5 +1,14 @@
 from django.contrib import admin
-from .models import Category, Supplier, Item, StockMovement, Order, OrderItem
+from .models import (
+    Sequence, Category, Supplier, Location, Item, ItemStock, StockMovement, Order, OrderItem, ReportSnapshot,
+    ArchivedStockMovement, OpeningBalance, ChangeLogEntry, CycleCount, ItemPrice,
+)
+
+
+@admin.register(Sequence)
+class SequenceAdmin(admin.ModelAdmin):
+    list_display = ['name', 'value']
+    readonly_fields = ['name', 'value']
 
 
 @admin.register(Category)
@@ -16,6 +25,21 @@ class SupplierAdmin(admin.ModelAdmin):
     list_filter = ['created_at']
 
 
+@admin.register(Location)
+class LocationAdmin(admin.ModelAdmin):
+    list_display = ['name', 'code', 'is_active', 'created_at']
+    search_fields = ['name', 'code']
+    list_filter = ['is_active']
+
+
+class ItemStockInline(admin.TabularInline):
+    model = ItemStock
+    extra = 0
+    fields = ['location', 'quantity']
+    readonly_fields = ['location', 'quantity']
+    can_delete = False
+
+
 @admin.register(Item)
 class ItemAdmin(admin.ModelAdmin):
     list_display = [
@@ -26,6 +50,7 @@ class ItemAdmin(admin.ModelAdmin):
     list_filter = ['category', 'supplier', 'is_active', 'unit_of_measurement', 'created_at']
     list_editable = ['quantity_in_stock', 'minimum_stock_level', 'unit_price', 'is_active']
     readonly_fields = ['created_at', 'updated_at', 'stock_value', 'profit_margin']
+    inlines = [ItemStockInline]
     
     fieldsets = (
         ('Basic Information', {
@@ -54,9 +79,9 @@ class ItemAdmin(admin.ModelAdmin):
 
 @admin.register(StockMovement)
 class StockMovementAdmin(admin.ModelAdmin):
-    list_display = ['item', 'movement_type', 'quantity', 'reference', 'created_at', 'created_by']
+    list_display = ['item', 'location', 'movement_type', 'quantity', 'reference', 'created_at', 'created_by']
     search_fields = ['item__name', 'item__sku', 'reference', 'notes']
-    list_filter = ['movement_type', 'created_at', 'item__category']
+    list_filter = ['movement_type', 'location', 'created_at', 'item__category']
     readonly_fields = ['created_at']
     
     def save_model(self, request, obj, form, change):
@@ -65,6 +90,34 @@ class StockMovementAdmin(admin.ModelAdmin):
         super().save_model(request, obj, form, change)
 
 
+@admin.register(ArchivedStockMovement)
+class ArchivedStockMovementAdmin(admin.ModelAdmin):
+    list_display = ['item', 'location', 'movement_type', 'quantity', 'reference', 'created_at', 'archived_at']
+    search_fields = ['item__name', 'item__sku', 'reference']
+    list_filter = ['movement_type', 'location']
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(OpeningBalance)
+class OpeningBalanceAdmin(admin.ModelAdmin):
+    list_display = ['item', 'location', 'quantity', 'as_of']
+    search_fields = ['item__name', 'item__sku']
+    readonly_fields = ['item', 'location', 'quantity', 'as_of']
+
+
+@admin.register(ItemPrice)
+class ItemPriceAdmin(admin.ModelAdmin):
+    list_display = ['item', 'unit_price', 'selling_price', 'effective_at', 'reason', 'created_by']
+    search_fields = ['item__name', 'item__sku', 'reason']
+    list_filter = ['effective_at']
+    readonly_fields = ['item', 'unit_price', 'selling_price', 'effective_at', 'reason', 'created_by']
+
+
 class OrderItemInline(admin.TabularInline):
     model = OrderItem
     extra = 1
@@ -74,7 +127,9 @@ class OrderItemInline(admin.TabularInline):
 
 @admin.register(Order)
 class OrderAdmin(admin.ModelAdmin):
-    list_display = ['order_number', 'supplier', 'status', 'order_date', 'expected_delivery_date', 'total_amount']
+    list_display = [
+        'order_number', 'supplier', 'status', 'order_date', 'expected_delivery_date', 'received_at', 'total_amount',
+    ]
     search_fields = ['order_number', 'supplier__name', 'notes']
     list_filter = ['status', 'order_date', 'expected_delivery_date', 'supplier']
     readonly_fields = ['order_date', 'total_amount']
@@ -83,11 +138,7 @@ class OrderAdmin(admin.ModelAdmin):
     def save_model(self, request, obj, form, change):
         if not obj.created_by:
             obj.created_by = request.user
-        if not obj.order_number:
-            # Auto-generate order number
-            import datetime
-            today = datetime.date.today()
-            obj.order_number = f"PO-{today.strftime('%Y%m%d')}-{Order.objects.count() + 1:03d}"
+        # Order.save() assigns the order number from the order sequence
         super().save_model(request, obj, form, change)
 
 
@@ -96,3 +147,23 @@ class OrderItemAdmin(admin.ModelAdmin):
     list_display = ['order', 'item', 'quantity_ordered', 'unit_price', 'quantity_received', 'subtotal']
     search_fields = ['order__order_number', 'item__name', 'item__sku']
     list_filter = ['order__status', 'order__order_date']
+
+
+@admin.register(ReportSnapshot)
+class ReportSnapshotAdmin(admin.ModelAdmin):
+    list_display = ['id', 'created_at', 'build_seconds']
+    readonly_fields = ['data', 'build_seconds', 'created_at']
+
+
+@admin.register(ChangeLogEntry)
+class ChangeLogEntryAdmin(admin.ModelAdmin):
+    list_display = ['seq', 'model', 'object_id', 'action', 'created_at']
+    list_filter = ['model', 'action']
+    readonly_fields = ['seq', 'model', 'object_id', 'action', 'payload', 'created_at']
+
+
+@admin.register(CycleCount)
+class CycleCountAdmin(admin.ModelAdmin):
+    list_display = ['id', 'location', 'status', 'adjustment_count', 'created_at', 'approved_at']
+    list_filter = ['status', 'location']
+    readonly_fields = ['status', 'adjustment_count', 'created_at', 'created_by', 'approved_at', 'approved_by']
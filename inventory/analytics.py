@@ -0,0 +1,343 @@
+"""
+Catalogue analytics: ABC classification, turnover, days of supply and
+supplier performance.
+
+Items are ranked by stock value and by the value of stock issued ('out'
+movements) over a period. Class A holds the items that make up the first
+80% of the total, B the next 15% and C the rest. Columns are pulled once
+into NumPy arrays and ranked with vectorized sorts and cumulative sums; the
+classes are stored in ``ItemClassification`` so lists can filter on them.
+
+Turnover figures come from one grouped aggregation of the period's stock
+movements per item (or per category), so they can be sorted and paged in
+the database. Supplier lead times, on-time and fill rates come from grouped
+aggregations of received orders and their lines, cached per data version.
+"""
+import datetime
+import time
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import (
+    Avg, BooleanField, Case, Count, DurationField, Exists, ExpressionWrapper, F, FloatField, Max, OuterRef, Q,
+    Sum, Value, When,
+)
+from django.db.models.functions import Cast, Coalesce, Greatest, Least, NullIf
+from django.utils import timezone
+
+from . import costing
+from .caching import bump_data_version, get_data_version
+from .models import Item, ItemClassification, Order, OrderItem, StockMovement
+
+CLASSES = np.array(['A', 'B', 'C'])
+DEFAULT_THRESHOLDS = (0.80, 0.95)
+DEFAULT_PERIOD_DAYS = 90
+DEFAULT_DEAD_STOCK_DAYS = 90
+DEFAULT_SUPPLIER_PERIOD_DAYS = 365
+
+
+def thresholds():
+    return getattr(settings, 'INVENTORY_ABC_THRESHOLDS', DEFAULT_THRESHOLDS)
+
+
+def period_days():
+    return getattr(settings, 'INVENTORY_ABC_PERIOD_DAYS', DEFAULT_PERIOD_DAYS)
+
+
+def dead_stock_days():
+    return getattr(settings, 'INVENTORY_DEAD_STOCK_DAYS', DEFAULT_DEAD_STOCK_DAYS)
+
+
+def supplier_period_days():
+    return getattr(settings, 'INVENTORY_SUPPLIER_PERIOD_DAYS', DEFAULT_SUPPLIER_PERIOD_DAYS)
+
+
+def _float(expression):
+    return ExpressionWrapper(expression, output_field=FloatField())
+
+
+def abc_classes(values, limits=None):
+    """
+    Return the class index (0=A, 1=B, 2=C) of each value.
+
+    An item's class is set by the cumulative share of everything ranked above
+    it, so the item that crosses a threshold still belongs to the higher class.
+    Items with no value are always C.
+    """
+    limits = np.asarray(limits or thresholds())
+    values = np.asarray(values, dtype=float)
+    total = values.sum()
+    classes = np.full(len(values), 2, dtype=np.int8)
+    if total <= 0:
+        return classes
+    order = np.argsort(-values, kind='stable')
+    ranked = values[order]
+    share_before = (np.cumsum(ranked) - ranked) / total
+    classes[order] = np.searchsorted(limits, share_before, side='right')
+    classes[values <= 0] = 2
+    return classes
+
+
+def load_columns(days):
+    """(ids, stock values, issue values) of active items as arrays aligned on id"""
+    rows = list(Item.objects.filter(is_active=True).annotate(
+        stock_value=costing.value_expression()
+    ).order_by('id').values_list('id', 'stock_value', 'unit_price'))
+    columns = list(zip(*rows)) or [(), (), ()]
+    ids = np.array(columns[0], dtype=np.int64)
+    stock_values = np.array(columns[1], dtype=float)
+    unit_prices = np.array(columns[2], dtype=float)
+
+    since = timezone.now() - datetime.timedelta(days=days)
+    issued = StockMovement.objects.filter(
+        movement_type='out', created_at__gte=since, item__is_active=True
+    ).order_by().values('item_id').annotate(quantity=Sum('quantity')).values_list('item_id', 'quantity')
+    issued_quantity = np.zeros(len(ids))
+    issued = list(issued)
+    if issued:
+        issued_ids, quantities = (np.array(col) for col in zip(*issued))
+        issued_quantity[np.searchsorted(ids, issued_ids)] = quantities
+    return ids, stock_values, issued_quantity * unit_prices
+
+
+def classify(days=None, limits=None, batch_size=5000):
+    """
+    Classify every active item and replace the stored classifications.
+
+    Returns ``{'items': n, 'seconds': compute time, 'value': {class: count},
+    'usage': {class: count}}``.
+    """
+    days = period_days() if days is None else days
+    started = time.perf_counter()
+    ids, stock_values, usage_values = load_columns(days)
+    value_classes = abc_classes(stock_values, limits)
+    usage_classes = abc_classes(usage_values, limits)
+    seconds = time.perf_counter() - started
+
+    now = timezone.now()
+    with transaction.atomic():
+        ItemClassification.objects.all().delete()
+        ItemClassification.objects.bulk_create((
+            ItemClassification(
+                item_id=item_id, value_class=value_class, usage_class=usage_class,
+                stock_value=round(stock_value, 2), usage_value=round(usage_value, 2),
+                period_days=days, classified_at=now,
+            )
+            for item_id, value_class, usage_class, stock_value, usage_value in zip(
+                ids.tolist(), CLASSES[value_classes].tolist(), CLASSES[usage_classes].tolist(),
+                stock_values.tolist(), usage_values.tolist(),
+            )
+        ), batch_size=batch_size)
+    bump_data_version()
+
+    return {
+        'items': len(ids),
+        'seconds': seconds,
+        'value': dict(zip(CLASSES.tolist(), np.bincount(value_classes, minlength=3).tolist())),
+        'usage': dict(zip(CLASSES.tolist(), np.bincount(usage_classes, minlength=3).tolist())),
+    }
+
+
+def class_summary():
+    """Item count and total value per class for each basis, from the stored run"""
+    summary = {}
+    for basis, class_field, value_field in (('value', 'value_class', 'stock_value'),
+                                            ('usage', 'usage_class', 'usage_value')):
+        rows = ItemClassification.objects.values(class_field).annotate(
+            total=Sum(value_field), items=Count('item')
+        ).order_by(class_field)
+        total = sum(row['total'] or 0 for row in rows)
+        summary[basis] = [{
+            'abc_class': row[class_field],
+            'items': row['items'],
+            'total': row['total'] or 0,
+            'share': (row['total'] or 0) / total * 100 if total else 0,
+        } for row in rows]
+    return summary
+
+
+# Turnover
+
+ITEM_SORTS = ('name', 'sku', 'on_hand', 'issued', 'turnover', 'days_of_supply', 'last_issued_at')
+CATEGORY_SORTS = ('name', 'on_hand', 'issued', 'turnover', 'days_of_supply', 'dead_stock_items')
+
+
+def _period_filters(days, prefix=''):
+    """Filters for receipts and issues in the period, optionally across a relation"""
+    since = timezone.now() - datetime.timedelta(days=days)
+    return tuple(
+        Q(**{f'{prefix}movement_type': movement_type, f'{prefix}created_at__gte': since})
+        for movement_type in ('in', 'out')
+    )
+
+
+def item_turnover(days=None, dead_days=None):
+    """
+    Per-item turnover over the last ``days`` days as a sortable queryset of dicts.
+
+    Rows carry ``on_hand``, period ``received`` and ``issued`` quantities,
+    ``average_stock`` (mean of the opening balance, rebuilt as on hand -
+    received + issued, and the stock on hand), ``turnover`` (issued / average
+    stock), ``days_of_supply`` (stock on hand at the period's issue rate),
+    ``last_issued_at`` and ``dead_stock`` (stock on hand but nothing issued
+    for ``dead_days`` days). Ratios are null where their denominator is zero.
+    Everything comes from one grouped join of items to their movements.
+    """
+    days = period_days() if days is None else days
+    dead_days = dead_stock_days() if dead_days is None else dead_days
+    received_q, issued_q = _period_filters(days, prefix='stock_movements__')
+    dead_cutoff = timezone.now() - datetime.timedelta(days=dead_days)
+
+    qs = Item.objects.filter(is_active=True).values(
+        'id', 'name', 'sku', category_name=F('category__name'),
+    ).annotate(
+        on_hand=F('quantity_in_stock'),
+        received=Coalesce(Sum('stock_movements__quantity', filter=received_q), 0),
+        issued=Coalesce(Sum('stock_movements__quantity', filter=issued_q), 0),
+        last_issued_at=Max('stock_movements__created_at', filter=Q(stock_movements__movement_type='out')),
+    ).annotate(
+        average_stock=_float(
+            (Cast('on_hand', FloatField()) + Greatest(F('on_hand') - F('received') + F('issued'), 0)) / 2
+        ),
+    ).annotate(
+        turnover=_float(Cast('issued', FloatField()) / NullIf('average_stock', 0.0)),
+        days_of_supply=_float(Cast('on_hand', FloatField()) * days / NullIf('issued', 0)),
+        dead_stock=Case(
+            When(Q(on_hand__gt=0) & (Q(last_issued_at__isnull=True) | Q(last_issued_at__lt=dead_cutoff)),
+                 then=Value(True)),
+            default=Value(False),
+            output_field=BooleanField(),
+        ),
+    )
+    return qs
+
+
+def category_turnover(days=None, dead_days=None):
+    """
+    The ``item_turnover`` figures summed per category, as a list of dicts.
+
+    Movement totals are one grouped aggregation of the period's movements by
+    category; stock on hand and dead-stock counts are one grouped query over
+    items.
+    """
+    days = period_days() if days is None else days
+    dead_days = dead_stock_days() if dead_days is None else dead_days
+    received_q, issued_q = _period_filters(days)
+    dead_cutoff = timezone.now() - datetime.timedelta(days=dead_days)
+
+    movements = {
+        row['item__category_id']: row
+        for row in StockMovement.objects.filter(item__is_active=True).filter(received_q | issued_q).order_by().values(
+            'item__category_id'
+        ).annotate(
+            received=Coalesce(Sum('quantity', filter=received_q), 0),
+            issued=Coalesce(Sum('quantity', filter=issued_q), 0),
+        )
+    }
+    recent_issue = StockMovement.objects.filter(
+        item=OuterRef('pk'), movement_type='out', created_at__gte=dead_cutoff
+    )
+    rows = Item.objects.filter(is_active=True).order_by().values(
+        'category_id', 'category__name',
+    ).annotate(
+        items=Count('id'),
+        on_hand=Sum('quantity_in_stock'),
+        dead_stock_items=Count('id', filter=Q(quantity_in_stock__gt=0) & ~Exists(recent_issue)),
+    )
+
+    results = []
+    for row in rows:
+        totals = movements.get(row['category_id'], {})
+        received, issued, on_hand = totals.get('received', 0), totals.get('issued', 0), row['on_hand'] or 0
+        average_stock = (on_hand + max(on_hand - received + issued, 0)) / 2
+        results.append({
+            'category_id': row['category_id'],
+            'name': row['category__name'],
+            'items': row['items'],
+            'dead_stock_items': row['dead_stock_items'],
+            'on_hand': on_hand,
+            'received': received,
+            'issued': issued,
+            'average_stock': average_stock,
+            'turnover': issued / average_stock if average_stock else None,
+            'days_of_supply': on_hand * days / issued if issued else None,
+        })
+    return results
+
+
+def turnover_report(level='item', days=None, dead_days=None, sort='-turnover', dead_only=False):
+    """
+    Turnover rows for ``level`` ('item' or 'category') ordered by ``sort``
+    (a field name, '-' prefixed for descending; nulls always sort last).
+    Items come back as a queryset to page in the database, categories as a list.
+    """
+    descending = sort.startswith('-')
+    field = sort.lstrip('-')
+    if level == 'category':
+        if field not in CATEGORY_SORTS:
+            raise ValueError(f'Unknown sort "{sort}"')
+        rows = category_turnover(days, dead_days)
+        if dead_only:
+            rows = [row for row in rows if row['dead_stock_items']]
+        present = sorted((r for r in rows if r[field] is not None), key=lambda r: r[field], reverse=descending)
+        return present + [r for r in rows if r[field] is None]
+    if level != 'item':
+        raise ValueError(f'Unknown level "{level}"')
+    if field not in ITEM_SORTS:
+        raise ValueError(f'Unknown sort "{sort}"')
+    qs = item_turnover(days, dead_days)
+    if dead_only:
+        qs = qs.filter(dead_stock=True)
+    order = F(field).desc(nulls_last=True) if descending else F(field).asc(nulls_last=True)
+    return qs.order_by(order, 'id')
+
+
+# Supplier performance
+
+def _supplier_performance(days):
+    since = timezone.now() - datetime.timedelta(days=days)
+    received = Order.objects.filter(status='received', received_at__isnull=False, order_date__gte=since)
+    has_due_date = Q(expected_delivery_date__isnull=False)
+
+    performance = {}
+    for row in received.order_by().values('supplier_id').annotate(
+        received_orders=Count('id'),
+        lead_time=Avg(ExpressionWrapper(F('received_at') - F('order_date'), output_field=DurationField())),
+        due_orders=Count('id', filter=has_due_date),
+        on_time_orders=Count('id', filter=has_due_date & Q(received_at__date__lte=F('expected_delivery_date'))),
+    ):
+        performance[row['supplier_id']] = {
+            'received_orders': row['received_orders'],
+            'lead_time_days': row['lead_time'].total_seconds() / 86400 if row['lead_time'] is not None else None,
+            'on_time_rate': row['on_time_orders'] / row['due_orders'] if row['due_orders'] else None,
+            'fill_rate': None,
+        }
+
+    lines = OrderItem.objects.filter(order__in=received).order_by().values('order__supplier_id').annotate(
+        ordered=Sum('quantity_ordered'),
+        # Over-deliveries do not make up for short lines
+        filled=Sum(Least('quantity_received', 'quantity_ordered')),
+    )
+    for row in lines:
+        stats = performance.get(row['order__supplier_id'])
+        if stats is not None and row['ordered']:
+            stats['fill_rate'] = row['filled'] / row['ordered']
+    return performance
+
+
+def supplier_performance(days=None):
+    """
+    ``{supplier_id: {'received_orders', 'lead_time_days', 'on_time_rate',
+    'fill_rate'}}`` over orders placed in the last ``days`` days and since
+    received.
+
+    Lead time is the mean time from ordering to receipt; on-time rate the
+    share of orders with an expected date received on or before it; fill rate
+    the share of ordered units received. Rates are None without data. Results
+    are cached until inventory data changes.
+    """
+    days = supplier_period_days() if days is None else days
+    key = f'inventory:supplier-performance:{get_data_version()}:{days}'
+    return cache.get_or_set(key, lambda: _supplier_performance(days), timeout=None)
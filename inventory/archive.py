@@ -0,0 +1,118 @@
+"""
+Archival of old stock movements.
+
+Movements older than a cutoff are copied into ``ArchivedStockMovement`` (with
+their original ids) and removed from ``StockMovement`` in item-id batches, one
+transaction per batch. Each archived item keeps an ``OpeningBalance`` row per
+location holding its stock after the archived history, so the ledger can start
+from those rows instead of replaying the archive. Dashboards, reports and item
+pages that read recent movements then only scan the hot table.
+"""
+import datetime
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Max, Min
+from django.utils import timezone
+
+from .caching import bump_data_version
+from .ledger import apply_movement
+from .models import ArchivedStockMovement, CostLayer, Item, Location, OpeningBalance, StockMovement
+
+DEFAULT_ARCHIVE_AFTER_DAYS = 365
+
+FIELDS = (
+    'id', 'item_id', 'location_id', 'movement_type', 'quantity', 'unit_cost',
+    'reference', 'notes', 'created_at', 'created_by_id',
+)
+
+
+def archive_after_days():
+    return getattr(settings, 'INVENTORY_ARCHIVE_AFTER_DAYS', DEFAULT_ARCHIVE_AFTER_DAYS)
+
+
+def default_cutoff(days=None):
+    days = archive_after_days() if days is None else days
+    return timezone.now() - datetime.timedelta(days=days)
+
+
+@transaction.atomic
+def archive_range(bounds, cutoff, batch_size=1000):
+    """
+    Archive movements before ``cutoff`` of items with ``lo <= id < hi``.
+
+    The archived rows are replayed on top of the items' existing opening
+    balances, and every opening balance of an archived item moves to
+    ``cutoff``. Returns the number of movements archived.
+    """
+    lo, hi = bounds
+    rows = list(StockMovement.objects.filter(
+        item_id__gte=lo, item_id__lt=hi, created_at__lt=cutoff
+    ).order_by('item_id', 'created_at', 'id').values(*FIELDS))
+    if not rows:
+        return 0
+
+    item_ids = {row['item_id'] for row in rows}
+    balances = {
+        (item_id, location_id): quantity
+        for item_id, location_id, quantity in OpeningBalance.objects.filter(item_id__in=item_ids).values_list(
+            'item_id', 'location_id', 'quantity'
+        )
+    }
+    default_location_id = None
+    for row in rows:
+        location_id = row['location_id']
+        if location_id is None:
+            # Movements without a location were booked to the default warehouse
+            default_location_id = default_location_id or Location.default().id
+            location_id = default_location_id
+        key = (row['item_id'], location_id)
+        balances[key] = apply_movement(balances.get(key, 0), row['movement_type'], row['quantity'])
+
+    ArchivedStockMovement.objects.bulk_create(
+        (ArchivedStockMovement(**row) for row in rows), batch_size=batch_size
+    )
+    OpeningBalance.objects.bulk_create(
+        [OpeningBalance(item_id=item_id, location_id=location_id, quantity=quantity, as_of=cutoff)
+         for (item_id, location_id), quantity in balances.items()],
+        update_conflicts=True, unique_fields=['item', 'location'], update_fields=['quantity', 'as_of'],
+        batch_size=batch_size,
+    )
+
+    ids = [row['id'] for row in rows]
+    for start in range(0, len(ids), batch_size):
+        chunk = ids[start:start + batch_size]
+        CostLayer.objects.filter(movement_id__in=chunk).update(movement=None)
+        # An explicit DELETE rather than QuerySet.delete(): the movements are
+        # moved, not deleted, so the change feed and the per-row delete
+        # signals must not see them, and nothing cascades from the table
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {connection.ops.quote_name(StockMovement._meta.db_table)} '
+                f'WHERE id IN ({", ".join(["%s"] * len(chunk))})',
+                chunk,
+            )
+    return len(rows)
+
+
+def archive(cutoff=None, chunk_size=500, batch_size=1000, progress=None):
+    """
+    Archive every movement older than ``cutoff`` (default: older than
+    ``INVENTORY_ARCHIVE_AFTER_DAYS``) in item-id chunks. ``progress`` is
+    called with ``(chunks_done, chunks_total, movements_archived)``. Returns
+    the number of movements archived.
+    """
+    cutoff = cutoff or default_cutoff()
+    bounds = Item.objects.aggregate(lo=Min('id'), hi=Max('id'))
+    if bounds['lo'] is None:
+        return 0
+    ranges = [(lo, lo + chunk_size) for lo in range(bounds['lo'], bounds['hi'] + 1, chunk_size)]
+
+    archived = 0
+    for done, chunk in enumerate(ranges, start=1):
+        archived += archive_range(chunk, cutoff, batch_size)
+        if progress:
+            progress(done, len(ranges), archived)
+    if archived:
+        bump_data_version()
+    return archived
@@ -0,0 +1,34 @@
+"""
+Cache helpers shared by views and templates.
+
+Every write to inventory data bumps a single version number stored in the
+cache. Cached fragments and lookups include that version in their keys, so a
+change anywhere makes stale entries unreachable without having to track and
+delete them individually.
+"""
+from django.conf import settings
+from django.core.cache import cache
+
+DATA_VERSION_KEY = 'inventory:data-version'
+
+
+def get_data_version():
+    """Return the current inventory data version"""
+    version = cache.get(DATA_VERSION_KEY)
+    if version is None:
+        cache.add(DATA_VERSION_KEY, 1, timeout=None)
+        version = cache.get(DATA_VERSION_KEY, 1)
+    return version
+
+
+def bump_data_version():
+    """Invalidate everything keyed on the data version"""
+    try:
+        return cache.incr(DATA_VERSION_KEY)
+    except ValueError:
+        cache.add(DATA_VERSION_KEY, 1, timeout=None)
+        return cache.incr(DATA_VERSION_KEY)
+
+
+def fragment_cache_timeout():
+    return getattr(settings, 'INVENTORY_FRAGMENT_CACHE_TIMEOUT', 300)
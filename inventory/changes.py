@@ -0,0 +1,108 @@
+"""
+Change feed for incremental sync.
+
+Writes to items, stock movements and orders append a ``ChangeLogEntry`` in
+the same transaction, so consumers can follow ``seq`` numbers instead of
+re-downloading the catalogue.
+
+Compaction removes superseded entries, which consumers can skip because a
+later entry for the same object is still there, and expired ones, which they
+cannot. The highest ``seq`` removed by age is kept as a watermark in the
+``Sequence`` table: a consumer whose position is below it must resync.
+"""
+import datetime
+
+from django.conf import settings
+from django.core import serializers
+from django.db import transaction
+from django.db.models import Exists, F, OuterRef
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from .models import ChangeLogEntry, Sequence
+
+DEFAULT_RETENTION_DAYS = 30
+EXPIRED_WATERMARK = 'changelog-expired'
+
+
+def retention_days():
+    return getattr(settings, 'INVENTORY_CHANGE_RETENTION_DAYS', DEFAULT_RETENTION_DAYS)
+
+
+def serialize(instance):
+    """Field values of ``instance`` as JSON-compatible data"""
+    return serializers.serialize('python', [instance])[0]['fields']
+
+
+def record(instance, action):
+    """Append a change for ``instance``; call inside the writing transaction"""
+    return ChangeLogEntry.objects.create(
+        model=instance._meta.model_name,
+        object_id=instance.pk,
+        action=action,
+        payload={} if action == 'delete' else serialize(instance),
+    )
+
+
+def record_many(instances, action):
+    """Append one change per instance in a single insert"""
+    instances = list(instances)
+    payloads = [{}] * len(instances) if action == 'delete' else [
+        row['fields'] for row in serializers.serialize('python', instances)
+    ]
+    return ChangeLogEntry.objects.bulk_create([
+        ChangeLogEntry(model=instance._meta.model_name, object_id=instance.pk, action=action, payload=payload)
+        for instance, payload in zip(instances, payloads)
+    ], batch_size=1000)
+
+
+def changes_since(since, limit):
+    """
+    Return up to ``limit`` entries with ``seq > since`` and whether more remain.
+
+    Sequence numbers come from the table's auto-increment key. SQLite
+    serializes writers, so entries commit in sequence order.
+    """
+    entries = list(ChangeLogEntry.objects.filter(seq__gt=since).order_by('seq')[:limit + 1])
+    return entries[:limit], len(entries) > limit
+
+
+def expired_through():
+    """Highest ``seq`` compaction has removed by age, or 0"""
+    return Sequence.objects.filter(name=EXPIRED_WATERMARK).values_list('value', flat=True).first() or 0
+
+
+def _advance_watermark(seq):
+    counter = Sequence.objects.filter(name=EXPIRED_WATERMARK)
+    if not counter.update(value=Greatest(F('value'), seq)):
+        Sequence.objects.bulk_create([Sequence(name=EXPIRED_WATERMARK)], ignore_conflicts=True)
+        counter.update(value=Greatest(F('value'), seq))
+
+
+def _delete_in_batches(qs, batch_size, watermark=False):
+    deleted = 0
+    while True:
+        seqs = list(qs.values_list('seq', flat=True)[:batch_size])
+        if not seqs:
+            return deleted
+        with transaction.atomic():
+            if watermark:
+                _advance_watermark(max(seqs))
+            deleted += ChangeLogEntry.objects.filter(seq__in=seqs).delete()[0]
+
+
+def compact(days=None, batch_size=5000):
+    """
+    Drop entries older than the retention window, advancing the expiry
+    watermark, then drop entries that a later entry for the same object
+    supersedes. Returns (expired, superseded).
+    """
+    days = retention_days() if days is None else days
+    cutoff = timezone.now() - datetime.timedelta(days=days)
+    expired = _delete_in_batches(ChangeLogEntry.objects.filter(created_at__lt=cutoff), batch_size, watermark=True)
+
+    newer = ChangeLogEntry.objects.filter(
+        model=OuterRef('model'), object_id=OuterRef('object_id'), seq__gt=OuterRef('seq')
+    )
+    superseded = _delete_in_batches(ChangeLogEntry.objects.filter(Exists(newer)), batch_size)
+    return expired, superseded
@@ -0,0 +1,9 @@
+from .caching import get_data_version, fragment_cache_timeout
+
+
+def data_version(request):
+    """Expose the values templates need to build fragment cache keys"""
+    return {
+        'data_version': get_data_version(),
+        'fragment_cache_timeout': fragment_cache_timeout(),
+    }
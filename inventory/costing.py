@@ -0,0 +1,314 @@
+"""
+Stock valuation from incrementally maintained cost layers.
+
+Every receipt opens a ``CostLayer`` at its unit cost and every issue consumes
+the oldest open layers, while ``ItemCost`` keeps each item's weighted average
+cost and FIFO value current. Valuing the inventory then reads one
+precomputed row per item instead of replaying the movement ledger.
+"""
+import heapq
+from concurrent.futures import ProcessPoolExecutor
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import DecimalField, ExpressionWrapper, F, Max, Min, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .ledger import apply_movement
+from .models import ArchivedStockMovement, Item, StockMovement, ItemCost, CostLayer
+from .workers import init_worker
+
+AVERAGE = 'average'
+FIFO = 'fifo'
+VALUATION_METHODS = (AVERAGE, FIFO)
+
+COST_PLACES = Decimal('0.0001')
+VALUE_FIELD = DecimalField(max_digits=18, decimal_places=4)
+
+
+def valuation_method():
+    return getattr(settings, 'INVENTORY_VALUATION_METHOD', AVERAGE)
+
+
+class CostState:
+    """Cost balance of one item and its open layers, oldest first"""
+
+    def __init__(self, item_id, average_cost=Decimal('0'), layers=()):
+        self.item_id = item_id
+        self.average_cost = average_cost
+        self.layers = list(layers)
+        self.closed = []
+
+    @property
+    def quantity(self):
+        return sum(layer.quantity_remaining for layer in self.layers)
+
+    @property
+    def fifo_value(self):
+        return sum((layer.quantity_remaining * layer.unit_cost for layer in self.layers), Decimal('0'))
+
+    def receive(self, quantity, unit_cost, movement_id=None, created_at=None):
+        unit_cost = Decimal(unit_cost).quantize(COST_PLACES)
+        on_hand = self.quantity
+        self.average_cost = (
+            (on_hand * self.average_cost + quantity * unit_cost) / (on_hand + quantity)
+        ).quantize(COST_PLACES)
+        layer = CostLayer(
+            item_id=self.item_id, movement_id=movement_id, unit_cost=unit_cost,
+            quantity_received=quantity, quantity_remaining=quantity,
+        )
+        if created_at is not None:
+            layer.created_at = created_at
+        self.layers.append(layer)
+
+    def issue(self, quantity):
+        while quantity and self.layers:
+            layer = self.layers[0]
+            taken = min(quantity, layer.quantity_remaining)
+            layer.quantity_remaining -= taken
+            quantity -= taken
+            if not layer.quantity_remaining:
+                self.closed.append(self.layers.pop(0))
+
+    def move_to(self, quantity, unit_cost, movement_id=None, created_at=None):
+        """Receive or issue whatever brings the balance to ``quantity``"""
+        on_hand = self.quantity
+        if quantity > on_hand:
+            self.receive(quantity - on_hand, unit_cost, movement_id, created_at)
+        elif quantity < on_hand:
+            self.issue(on_hand - quantity)
+
+
+def _load_many(item_ids):
+    """Locked cost states of ``item_ids``, creating missing balances, as ``{item_id: CostState}``"""
+    ItemCost.objects.bulk_create([ItemCost(item_id=item_id) for item_id in item_ids], ignore_conflicts=True)
+    costs = dict(ItemCost.objects.select_for_update().filter(item_id__in=item_ids).values_list('item_id', 'average_cost'))
+    states = {item_id: CostState(item_id, costs[item_id]) for item_id in item_ids}
+    for layer in CostLayer.objects.select_for_update().filter(item_id__in=item_ids):
+        layer._loaded_remaining = layer.quantity_remaining
+        states[layer.item_id].layers.append(layer)
+    return states
+
+
+def _load(item_id):
+    return _load_many([item_id])[item_id]
+
+
+def _save_many(states):
+    closed, changed, created = [], [], []
+    for state in states:
+        closed.extend(layer.pk for layer in state.closed if layer.pk)
+        for layer in state.layers:
+            if layer.pk is None:
+                created.append(layer)
+            elif layer.quantity_remaining != layer._loaded_remaining:
+                changed.append(layer)
+    CostLayer.objects.filter(pk__in=closed).delete()
+    CostLayer.objects.bulk_update(changed, ['quantity_remaining'], batch_size=1000)
+    CostLayer.objects.bulk_create(created, batch_size=1000)
+    now = timezone.now()
+    ItemCost.objects.bulk_update([
+        ItemCost(item_id=state.item_id, quantity=state.quantity, average_cost=state.average_cost,
+                 fifo_value=state.fifo_value, updated_at=now)
+        for state in states
+    ], ['quantity', 'average_cost', 'fifo_value', 'updated_at'], batch_size=1000)
+
+
+def _save(state):
+    _save_many([state])
+
+
+def record_movement(movement, quantity_before):
+    """
+    Update cost layers for a movement that took the item's stock from
+    ``quantity_before`` to ``movement.item.quantity_in_stock``.
+
+    Stock that changed outside the ledger (bulk writes that bypass it) is first
+    absorbed at the item's unit price so the layers always match the stock on
+    hand.
+    """
+    item = movement.item
+    with transaction.atomic():
+        state = _load(item.id)
+        state.move_to(quantity_before, item.unit_price)
+        if movement.movement_type == 'in':
+            unit_cost = movement.unit_cost if movement.unit_cost is not None else item.unit_price
+        else:
+            unit_cost = state.average_cost or item.unit_price
+        state.move_to(item.quantity_in_stock, unit_cost, movement.id, movement.created_at)
+        _save(state)
+
+
+def record_adjustments(adjustments):
+    """
+    Bulk form of ``record_movement`` for non-receipt movements.
+    ``adjustments`` holds ``(movement, quantity_before, quantity_after,
+    unit_price)`` tuples, with quantities being the item's total stock, applied
+    in order (an item may appear more than once); all cost states are loaded
+    and saved in a handful of set-based queries.
+    """
+    with transaction.atomic():
+        states = _load_many(list(dict.fromkeys(movement.item_id for movement, *_ in adjustments)))
+        for movement, quantity_before, quantity_after, unit_price in adjustments:
+            state = states[movement.item_id]
+            state.move_to(quantity_before, unit_price)
+            state.move_to(quantity_after, state.average_cost or unit_price, movement.id, movement.created_at)
+        _save_many(states.values())
+
+
+def sync_item(item):
+    """Bring an item's cost layers in line with a directly edited stock level"""
+    tracked = ItemCost.objects.filter(item_id=item.id).values_list('quantity', flat=True).first() or 0
+    if tracked == item.quantity_in_stock:
+        return
+    with transaction.atomic():
+        state = _load(item.id)
+        state.move_to(item.quantity_in_stock, state.average_cost or item.unit_price)
+        _save(state)
+
+
+def sync_items(items):
+    """Bulk form of ``sync_item`` for the ``items`` queryset, in a handful of queries"""
+    stock = dict(items.values_list('id', 'quantity_in_stock'))
+    tracked = dict(ItemCost.objects.filter(item_id__in=list(stock)).values_list('item_id', 'quantity'))
+    changed = [item_id for item_id, quantity in stock.items() if tracked.get(item_id, 0) != quantity]
+    if not changed:
+        return
+    unit_prices = dict(Item.objects.filter(id__in=changed).values_list('id', 'unit_price'))
+    with transaction.atomic():
+        states = _load_many(changed)
+        for item_id, state in states.items():
+            state.move_to(stock[item_id], state.average_cost or unit_prices[item_id])
+        _save_many(states.values())
+
+
+# Valuation
+
+def value_expression(method=None):
+    """Per-item stock value; items without cost data fall back to the unit price"""
+    method = method or valuation_method()
+    if method not in VALUATION_METHODS:
+        raise ValueError(f'Unknown valuation method "{method}"')
+    if method == FIFO:
+        cost_value = F('cost__fifo_value')
+    else:
+        cost_value = F('cost__quantity') * F('cost__average_cost')
+    return Coalesce(
+        ExpressionWrapper(cost_value, output_field=VALUE_FIELD),
+        ExpressionWrapper(F('quantity_in_stock') * F('unit_price'), output_field=VALUE_FIELD),
+        output_field=VALUE_FIELD,
+    )
+
+
+def inventory_value(method=None):
+    """Total value of active stock from the precomputed cost balances"""
+    total = Item.objects.filter(is_active=True).aggregate(total=Sum(value_expression(method)))['total']
+    return total or Decimal('0')
+
+
+def category_values(method=None):
+    """[{'name': ..., 'total_value': ...}] for active stock, highest value first"""
+    qs = Item.objects.filter(is_active=True).values('category__name').annotate(
+        total_value=Sum(value_expression(method))
+    ).order_by('-total_value')
+    return [{'name': row['category__name'], 'total_value': row['total_value']} for row in qs]
+
+
+# Rebuild
+
+def replay_range(bounds):
+    """
+    Recompute cost balances for items with ``lo <= id < hi`` from the ledger.
+
+    Runs in worker processes; returns plain tuples for the parent to write:
+    ``(item_id, average_cost, [(unit_cost, received, remaining, created_at, movement_id), ...])``.
+    """
+    lo, hi = bounds
+    items = {
+        item_id: (quantity, unit_price, CostState(item_id), {})
+        for item_id, quantity, unit_price in Item.objects.filter(id__gte=lo, id__lt=hi).values_list(
+            'id', 'quantity_in_stock', 'unit_price'
+        )
+    }
+
+    def movements(model, live):
+        return (
+            (item_id, created_at, movement_id, location_id, movement_type, quantity, unit_cost, live)
+            for item_id, created_at, movement_id, location_id, movement_type, quantity, unit_cost in
+            model.objects.filter(item_id__gte=lo, item_id__lt=hi).order_by('item_id', 'created_at', 'id').values_list(
+                'item_id', 'created_at', 'id', 'location_id', 'movement_type', 'quantity', 'unit_cost'
+            ).iterator(chunk_size=5000)
+        )
+
+    # Archived history precedes each item's live movements, so the two ordered
+    # streams merge into one ledger; layers only link to live movements
+    ledger = heapq.merge(movements(ArchivedStockMovement, False), movements(StockMovement, True))
+    for item_id, created_at, movement_id, location_id, movement_type, quantity, unit_cost, live in ledger:
+        _, unit_price, state, balances = items[item_id]
+        balances[location_id] = apply_movement(balances.get(location_id, 0), movement_type, quantity)
+        if movement_type != 'in' or unit_cost is None:
+            unit_cost = unit_price if movement_type == 'in' else (state.average_cost or unit_price)
+        state.move_to(sum(balances.values()), unit_cost, movement_id if live else None, created_at)
+
+    results = []
+    for item_id, (quantity, unit_price, state, _) in items.items():
+        state.move_to(quantity, state.average_cost or unit_price)
+        results.append((item_id, state.average_cost, [
+            (layer.unit_cost, layer.quantity_received, layer.quantity_remaining,
+             layer.created_at, layer.movement_id)
+            for layer in state.layers
+        ]))
+    return results
+
+
+@transaction.atomic
+def write_range(bounds, results):
+    lo, hi = bounds
+    CostLayer.objects.filter(item_id__gte=lo, item_id__lt=hi).delete()
+    ItemCost.objects.filter(item_id__gte=lo, item_id__lt=hi).delete()
+    costs, layers = [], []
+    for item_id, average_cost, item_layers in results:
+        costs.append(ItemCost(
+            item_id=item_id,
+            quantity=sum(layer[2] for layer in item_layers),
+            average_cost=average_cost,
+            fifo_value=sum((layer[0] * layer[2] for layer in item_layers), Decimal('0')),
+        ))
+        layers.extend(
+            CostLayer(item_id=item_id, unit_cost=unit_cost, quantity_received=received,
+                      quantity_remaining=remaining, created_at=created_at, movement_id=movement_id)
+            for unit_cost, received, remaining, created_at, movement_id in item_layers
+        )
+    ItemCost.objects.bulk_create(costs, batch_size=1000)
+    CostLayer.objects.bulk_create(layers, batch_size=1000)
+
+
+def rebuild(chunk_size=1000, workers=None, progress=None):
+    """
+    Recompute every item's cost layers from the ledger in item-id chunks.
+
+    Chunks are replayed across a process pool and written back by this
+    process one chunk per transaction. ``progress`` is called with
+    ``(chunks_done, chunks_total)``. Returns the number of chunks written.
+    """
+    bounds = Item.objects.aggregate(lo=Min('id'), hi=Max('id'))
+    if bounds['lo'] is None:
+        return 0
+    ranges = [(lo, lo + chunk_size) for lo in range(bounds['lo'], bounds['hi'] + 1, chunk_size)]
+
+    def results():
+        if workers == 1:
+            yield from ((r, replay_range(r)) for r in ranges)
+            return
+        # Forked workers must not share this process's database connections
+        connections.close_all()
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_worker) as pool:
+            yield from zip(ranges, pool.map(replay_range, ranges))
+
+    for done, (chunk, rows) in enumerate(results(), start=1):
+        write_range(chunk, rows)
+        if progress:
+            progress(done, len(ranges))
+    return len(ranges)
@@ -0,0 +1,171 @@
+"""
+Cycle-count reconciliation.
+
+Counted quantities are staged as ``CycleCountLine`` rows and compared with
+the book stock at the count's location in one join. Approving a count posts
+every variance as an 'adjustment' movement with bulk inserts and set-based
+updates, instead of one ``StockMovement.save()`` per line.
+"""
+import csv
+
+from django.db import transaction
+from django.db.models import Count, F, FilteredRelation, IntegerField, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Abs, Coalesce, Greatest
+from django.utils import timezone
+
+from . import changes, costing, sequences
+from .caching import bump_data_version
+from .models import CycleCount, CycleCountLine, Item, ItemStock, Location, StockMovement
+
+
+def parse_counts(lines):
+    """
+    Read ``sku,counted_qty`` rows into ``{sku: quantity}``. A header row is
+    skipped, and repeated SKUs (counted in several bins) are added together.
+    Raises ValueError naming the first bad line.
+    """
+    counts = {}
+    for number, row in enumerate(csv.reader(lines), start=1):
+        if not row or not any(cell.strip() for cell in row):
+            continue
+        if len(row) < 2:
+            raise ValueError(f'Line {number}: expected "sku,counted_qty"')
+        sku, quantity = row[0].strip(), row[1].strip()
+        try:
+            quantity = int(quantity)
+        except ValueError:
+            if number == 1:
+                continue
+            raise ValueError(f'Line {number}: "{quantity}" is not a whole number')
+        if not sku or quantity < 0:
+            raise ValueError(f'Line {number}: SKU is required and quantity cannot be negative')
+        counts[sku] = counts.get(sku, 0) + quantity
+    if not counts:
+        raise ValueError('No counts found')
+    return counts
+
+
+@transaction.atomic
+def create_count(counts, location=None, user=None, notes='', batch_size=1000):
+    """Stage ``{sku: quantity}`` counts and resolve their items in one UPDATE"""
+    count = CycleCount.objects.create(location=location or Location.default(), created_by=user, notes=notes)
+    CycleCountLine.objects.bulk_create(
+        (CycleCountLine(cycle_count=count, sku=sku, counted_quantity=quantity) for sku, quantity in counts.items()),
+        batch_size=batch_size,
+    )
+    count.lines.update(item_id=Subquery(Item.objects.filter(sku=OuterRef('sku')).values('id')[:1]))
+    return count
+
+
+def variance_lines(count):
+    """
+    Lines annotated with ``book_quantity`` (stock at the count's location, or
+    the approved-time figure once posted) and ``variance`` (counted - book),
+    joined in a single query.
+    """
+    qs = count.lines.annotate(
+        stock_here=FilteredRelation(
+            'item__location_stock', condition=Q(item__location_stock__location_id=count.location_id)
+        ),
+    ).annotate(
+        book_quantity=Coalesce(
+            F('expected_quantity'), F('stock_here__quantity'), Value(0), output_field=IntegerField()
+        ),
+    ).annotate(
+        variance=F('counted_quantity') - F('book_quantity'),
+    )
+    return qs
+
+
+def summarize(count):
+    """Line, unknown-SKU and variance totals for ``count`` in one aggregate"""
+    totals = variance_lines(count).aggregate(
+        lines=Count('id'),
+        unknown=Count('id', filter=Q(item__isnull=True)),
+        variances=Count('id', filter=Q(item__isnull=False) & ~Q(variance=0)),
+        net_variance=Coalesce(Sum('variance', filter=Q(item__isnull=False)), 0),
+        absolute_variance=Coalesce(Sum(Abs('variance'), filter=Q(item__isnull=False)), 0),
+    )
+    return totals
+
+
+def approve(count, user=None, batch_size=1000):
+    """
+    Post the variances of a pending count as adjustment movements.
+
+    Book quantities are frozen on the lines in one UPDATE, the movements are
+    bulk inserted, location rows and item totals are set with one UPDATE
+    each, and cost layers and the change feed are written in bulk. Returns the
+    number of adjustments posted.
+    """
+    with transaction.atomic():
+        count = CycleCount.objects.select_for_update().get(pk=count.pk)
+        if count.status != 'pending':
+            raise ValueError(f'Cycle count #{count.pk} is {count.get_status_display().lower()}')
+
+        lines = count.lines.filter(item__isnull=False)
+        lines.update(expected_quantity=Coalesce(
+            Subquery(ItemStock.objects.filter(
+                item_id=OuterRef('item_id'), location_id=count.location_id
+            ).values('quantity')[:1]),
+            0,
+        ))
+        adjusted = list(lines.exclude(counted_quantity=F('expected_quantity')).values_list(
+            'item_id', 'counted_quantity', 'expected_quantity', 'item__quantity_in_stock', 'item__unit_price',
+        ))
+
+        now = timezone.now()
+        if adjusted:
+            references = sequences.allocate_numbers(sequences.MOVEMENT, len(adjusted))
+            movements = StockMovement.objects.bulk_create([
+                StockMovement(
+                    item_id=item_id, location_id=count.location_id, movement_type='adjustment',
+                    quantity=counted, reference=reference, notes=f'Cycle count #{count.pk}', created_by=user,
+                )
+                for (item_id, counted, *_), reference in zip(adjusted, references)
+            ], batch_size=batch_size)
+
+            item_ids = [row[0] for row in adjusted]
+            counted_here = CycleCountLine.objects.filter(
+                cycle_count=count, item_id=OuterRef('item_id')
+            ).values('counted_quantity')[:1]
+            ItemStock.objects.bulk_create(
+                [ItemStock(item_id=item_id, location_id=count.location_id) for item_id in item_ids],
+                ignore_conflicts=True, batch_size=batch_size,
+            )
+            ItemStock.objects.filter(location_id=count.location_id, item_id__in=item_ids).update(
+                quantity=Subquery(counted_here)
+            )
+            Item.objects.filter(id__in=item_ids).update(
+                quantity_in_stock=Greatest(F('quantity_in_stock') + Subquery(
+                    CycleCountLine.objects.filter(cycle_count=count, item_id=OuterRef('pk')).annotate(
+                        delta=F('counted_quantity') - F('expected_quantity')
+                    ).values('delta')[:1]
+                ), 0),
+                updated_at=now,
+            )
+
+            costing.record_adjustments([
+                (movement, total, max(0, total + counted - expected), unit_price)
+                for movement, (_, counted, expected, total, unit_price) in zip(movements, adjusted)
+            ])
+            changes.record_many(movements, 'create')
+            changes.record_many(Item.objects.filter(id__in=item_ids), 'update')
+
+        count.status = 'approved'
+        count.approved_at = now
+        count.approved_by = user
+        count.adjustment_count = len(adjusted)
+        count.save(update_fields=['status', 'approved_at', 'approved_by', 'adjustment_count'])
+
+        # Bulk writes skip the model signals that normally invalidate cached pages
+        bump_data_version()
+        transaction.on_commit(bump_data_version)
+    return len(adjusted)
+
+
+def cancel(count):
+    """Discard a pending count without touching stock"""
+    updated = CycleCount.objects.filter(pk=count.pk, status='pending').update(status='cancelled')
+    if not updated:
+        raise ValueError(f'Cycle count #{count.pk} is not pending')
@@ -1,5 +1,35 @@
 from django import forms
-from .models import Item, Category, Supplier, StockMovement, Order, OrderItem
+from django.forms.models import ModelChoiceIterator, ModelChoiceIteratorValue
+from . import refdata
+from .models import Item, Category, Supplier, Location, ItemStock, StockMovement, Order, OrderItem
+
+
+class ReferenceChoiceIterator(ModelChoiceIterator):
+    """Choices from the reference data cache rather than a query per render"""
+
+    def __iter__(self):
+        if self.field.empty_label is not None:
+            yield ("", self.field.empty_label)
+        for row in self.field.reference():
+            yield (ModelChoiceIteratorValue(row['id'], None), row['name'])
+
+    def __len__(self):
+        return len(self.field.reference()) + (self.field.empty_label is not None)
+
+    def __bool__(self):
+        return self.field.empty_label is not None or bool(self.field.reference())
+
+
+class CategoryChoiceField(forms.ModelChoiceField):
+    """Category dropdown rendered from ``refdata``; submitted values are still checked against the table"""
+    iterator = ReferenceChoiceIterator
+    reference = staticmethod(refdata.categories)
+
+
+class SupplierChoiceField(forms.ModelChoiceField):
+    """Supplier dropdown rendered from ``refdata``; submitted values are still checked against the table"""
+    iterator = ReferenceChoiceIterator
+    reference = staticmethod(refdata.suppliers)
 
 
 class CategoryForm(forms.ModelForm):
@@ -37,8 +67,9 @@ class ItemForm(forms.ModelForm):
         fields = [
             'name', 'description', 'sku', 'category', 'supplier',
             'unit_price', 'selling_price', 'quantity_in_stock',
-            'minimum_stock_level', 'unit_of_measurement', 'is_active'
+            'minimum_stock_level', 'unit_of_measurement', 'is_active', 'image'
         ]
+        field_classes = {'category': CategoryChoiceField, 'supplier': SupplierChoiceField}
         widgets = {
             'name': forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'Item name'}),
             'description': forms.Textarea(attrs={'class': 'form-control', 'rows': 3, 'placeholder': 'Item description'}),
@@ -51,6 +82,7 @@ class ItemForm(forms.ModelForm):
             'minimum_stock_level': forms.NumberInput(attrs={'class': 'form-control', 'min': '0'}),
             'unit_of_measurement': forms.Select(attrs={'class': 'form-control'}),
             'is_active': forms.CheckboxInput(attrs={'class': 'form-check-input'}),
+            'image': forms.ClearableFileInput(attrs={'class': 'form-control', 'accept': 'image/*'}),
         }
 
     def __init__(self, *args, **kwargs):
@@ -65,11 +97,13 @@ class StockMovementForm(forms.ModelForm):
     
     class Meta:
         model = StockMovement
-        fields = ['item', 'movement_type', 'quantity', 'reference', 'notes']
+        fields = ['item', 'location', 'movement_type', 'quantity', 'unit_cost', 'reference', 'notes']
         widgets = {
             'item': forms.Select(attrs={'class': 'form-control'}),
+            'location': forms.Select(attrs={'class': 'form-control'}),
             'movement_type': forms.Select(attrs={'class': 'form-control'}),
             'quantity': forms.NumberInput(attrs={'class': 'form-control', 'min': '1'}),
+            'unit_cost': forms.NumberInput(attrs={'class': 'form-control', 'step': '0.01', 'min': '0', 'placeholder': 'Defaults to the item unit price'}),
             'reference': forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'Reference number or note'}),
             'notes': forms.Textarea(attrs={'class': 'form-control', 'rows': 3, 'placeholder': 'Additional notes'}),
         }
@@ -77,6 +111,8 @@ class StockMovementForm(forms.ModelForm):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.fields['item'].empty_label = "Select an item"
+        self.fields['location'].queryset = Location.objects.filter(is_active=True)
+        self.fields['location'].empty_label = "Main warehouse"
 
     def clean_quantity(self):
         """Validate stock movement quantity"""
@@ -85,9 +121,13 @@ class StockMovementForm(forms.ModelForm):
         item = self.cleaned_data.get('item')
 
         if movement_type == 'out' and item:
-            if quantity > item.quantity_in_stock:
+            location = self.cleaned_data.get('location') or Location.default()
+            available = ItemStock.objects.filter(
+                item=item, location=location
+            ).values_list('quantity', flat=True).first() or 0
+            if quantity > available:
                 raise forms.ValidationError(
-                    f"Cannot remove {quantity} items. Only {item.quantity_in_stock} available in stock."
+                    f"Cannot remove {quantity} items. Only {available} available in stock at {location}."
                 )
         
         return quantity
@@ -99,6 +139,7 @@ class OrderForm(forms.ModelForm):
     class Meta:
         model = Order
         fields = ['supplier', 'expected_delivery_date', 'notes']
+        field_classes = {'supplier': SupplierChoiceField}
         widgets = {
             'supplier': forms.Select(attrs={'class': 'form-control'}),
             'expected_delivery_date': forms.DateInput(attrs={'class': 'form-control', 'type': 'date'}),
@@ -137,6 +178,33 @@ class OrderItemForm(forms.ModelForm):
         self.fields['item'].empty_label = "Select an item"
 
 
+class CycleCountUploadForm(forms.Form):
+    """Upload a physical count file of sku,counted_qty lines"""
+    file = forms.FileField(
+        help_text="CSV with one sku,counted_qty line per item; a header row is optional",
+        widget=forms.ClearableFileInput(attrs={'class': 'form-control', 'accept': '.csv,.txt'}),
+    )
+    location = forms.ModelChoiceField(
+        queryset=Location.objects.filter(is_active=True), required=False, empty_label="Main warehouse",
+        widget=forms.Select(attrs={'class': 'form-control'}),
+    )
+    notes = forms.CharField(
+        required=False, widget=forms.Textarea(attrs={'class': 'form-control', 'rows': 2, 'placeholder': 'Optional notes'}),
+    )
+
+    def clean_file(self):
+        """Parse the upload into {sku: quantity}"""
+        from .cyclecounts import parse_counts
+        upload = self.cleaned_data['file']
+        try:
+            text = upload.read().decode('utf-8-sig')
+            return parse_counts(text.splitlines())
+        except UnicodeDecodeError:
+            raise forms.ValidationError("The file must be UTF-8 text.")
+        except ValueError as exc:
+            raise forms.ValidationError(str(exc))
+
+
 # Formset for handling multiple order items
 OrderItemFormSet = forms.inlineformset_factory(
     Order, OrderItem, form=OrderItemForm, extra=1, can_delete=True
@@ -0,0 +1,121 @@
+"""
+Item photo variants.
+
+Uploaded originals are never shown by pages. Once the item is committed,
+its thumbnail (lists) and preview (detail page) are rendered with Pillow on
+a small background thread pool, outside the request, and stored under
+content-hashed names. A name therefore never changes content, so
+``item_image`` serves the variants with year-long immutable cache headers.
+"""
+import hashlib
+import io
+import logging
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connections, transaction
+from PIL import Image, ImageOps
+
+from .caching import bump_data_version
+from .models import Item
+
+logger = logging.getLogger(__name__)
+
+# Variant -> bounding box in pixels; the aspect ratio is kept
+VARIANTS = {
+    'thumbnail': (96, 96),
+    'preview': (480, 480),
+}
+VARIANT_DIR = 'items/variants/'
+VARIANT_NAME = re.compile(r'^[0-9a-f]{32}\.jpg$')
+JPEG_QUALITY = 85
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def image_workers():
+    return getattr(settings, 'INVENTORY_IMAGE_WORKERS', 2)
+
+
+def render_in_background():
+    return getattr(settings, 'INVENTORY_IMAGE_ASYNC', True)
+
+
+def executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=image_workers(), thread_name_prefix='inventory-images')
+    return _executor
+
+
+def render(image, size):
+    """JPEG bytes of ``image`` scaled to fit within ``size``"""
+    variant = ImageOps.exif_transpose(image)
+    variant.thumbnail(size, Image.LANCZOS)
+    if variant.mode != 'RGB':
+        background = Image.new('RGB', variant.size, 'white')
+        variant = variant.convert('RGBA')
+        background.paste(variant, mask=variant.getchannel('A'))
+        variant = background
+    out = io.BytesIO()
+    variant.save(out, 'JPEG', quality=JPEG_QUALITY, optimize=True)
+    return out.getvalue()
+
+
+def store(content):
+    """Save variant bytes under their hash and return the file name (without the directory)"""
+    name = f'{hashlib.sha256(content).hexdigest()[:32]}.jpg'
+    if not default_storage.exists(VARIANT_DIR + name):
+        default_storage.save(VARIANT_DIR + name, ContentFile(content))
+    return name
+
+
+def generate(item_id, original):
+    """
+    Render and store the variants of ``original`` and record them on the
+    item, unless its image has been replaced in the meantime.
+    """
+    try:
+        with default_storage.open(original) as source:
+            image = Image.open(source)
+            image.load()
+        names = {variant: store(render(image, size)) for variant, size in VARIANTS.items()}
+        updated = Item.objects.filter(pk=item_id, image=original).update(
+            image_thumbnail=names['thumbnail'], image_preview=names['preview'],
+        )
+        if updated:
+            # A queryset update skips the signals that invalidate cached item tables
+            bump_data_version()
+    except Exception:
+        logger.exception('Could not render image variants for item %s', item_id)
+    finally:
+        if threading.current_thread().name.startswith('inventory-images'):
+            connections.close_all()
+
+
+def schedule(item):
+    """Render ``item``'s variants once the current transaction commits"""
+    if not item.image:
+        return
+    item_id, original = item.pk, item.image.name
+    if render_in_background():
+        transaction.on_commit(lambda: executor().submit(generate, item_id, original))
+    else:
+        transaction.on_commit(lambda: generate(item_id, original))
+
+
+def image_changed(form):
+    """
+    Call with a valid ``ItemForm`` before saving its item: a new or cleared
+    photo drops the old variants. Returns whether variants must be scheduled.
+    """
+    if 'image' not in form.changed_data:
+        return False
+    form.instance.image_thumbnail = form.instance.image_preview = ''
+    return True
@@ -0,0 +1,256 @@
+"""
+Barcode shelf labels.
+
+Each label carries a Code 128 barcode of the SKU, the item name and the
+selling price. Labels are laid out on A4 sheets at 300 dpi; sheets are
+rendered with Pillow across a process pool, a sheet per task, and written out
+as they finish, so only a few sheets are ever held in memory however many
+labels are printed. Output is either one PDF (streamed page by page) or one
+PNG per sheet.
+"""
+import io
+import os
+import zlib
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+from django.conf import settings
+from PIL import Image, ImageDraw, ImageFont
+
+DPI = 300
+PAGE_SIZE = (2480, 3508)  # A4
+MARGIN = 60
+COLUMNS = 3
+ROWS = 8
+LABELS_PER_SHEET = COLUMNS * ROWS
+CURRENCY = 'UGX'
+PDF = 'pdf'
+PNG = 'png'
+FORMATS = (PDF, PNG)
+
+# Code 128 bar/space widths for symbol values 0-105, then the stop pattern
+CODE128_PATTERNS = (
+    '212222 222122 222221 121223 121322 131222 122213 122312 132212 221213 '
+    '221312 231212 112232 122132 122231 113222 123122 123221 223211 221132 '
+    '221231 213212 223112 312131 311222 321122 321221 312212 322112 322211 '
+    '212123 212321 232121 111323 131123 131321 112313 132113 132311 211313 '
+    '231113 231311 112133 112331 132131 113123 113321 133121 313121 211331 '
+    '231131 213113 213311 213131 311123 311321 331121 312113 312311 332111 '
+    '314111 221411 431111 111224 111422 121124 121421 141122 141221 112214 '
+    '112412 122114 122411 142112 142211 241211 221114 413111 241112 134111 '
+    '111242 121142 121241 114212 124112 124211 411212 421112 421211 212141 '
+    '214121 412121 111143 111341 131141 114113 114311 411113 411311 113141 '
+    '114131 311141 411131 211412 211214 211232 2331112'
+).split()
+START_B = 104
+STOP = 106
+QUIET_ZONE = 10
+
+
+def label_workers():
+    return getattr(settings, 'INVENTORY_LABEL_WORKERS', None)
+
+
+def view_label_workers():
+    return getattr(settings, 'INVENTORY_LABEL_VIEW_WORKERS', 1)
+
+
+def code128_modules(text):
+    """
+    Bar (True) / space (False) modules encoding ``text`` in Code 128 set B,
+    quiet zones included. Raises ValueError for characters outside ASCII 32-126.
+    """
+    values = []
+    for char in text:
+        code = ord(char)
+        if not 32 <= code <= 126:
+            raise ValueError(f'Cannot encode {char!r} in a Code 128 barcode')
+        values.append(code - 32)
+    checksum = (START_B + sum(position * value for position, value in enumerate(values, start=1))) % 103
+    modules = [False] * QUIET_ZONE
+    for value in [START_B, *values, checksum, STOP]:
+        for index, width in enumerate(CODE128_PATTERNS[value]):
+            modules.extend([index % 2 == 0] * int(width))
+    modules.extend([False] * QUIET_ZONE)
+    return modules
+
+
+def _font(size):
+    try:
+        return ImageFont.load_default(size=size)
+    except TypeError:  # Pillow built without FreeType
+        return ImageFont.load_default()
+
+
+def _fit(draw, text, font, width):
+    """``text`` shortened with an ellipsis until it fits ``width`` pixels"""
+    if draw.textlength(text, font=font) <= width:
+        return text
+    while text and draw.textlength(text + '…', font=font) > width:
+        text = text[:-1]
+    return text + '…'
+
+
+def draw_label(draw, box, sku, name, price):
+    left, top, right, bottom = box
+    width, height = right - left, bottom - top
+    pad = 20
+    name_font, price_font, sku_font = _font(44), _font(52), _font(34)
+
+    draw.text((left + pad, top + pad), _fit(draw, name, name_font, width - 2 * pad), font=name_font, fill=0)
+    draw.text((left + pad, top + pad + 56), f'{CURRENCY} {price:,.2f}', font=price_font, fill=0)
+
+    try:
+        modules = code128_modules(sku)
+    except ValueError:
+        modules = []
+    bar_top = top + pad + 130
+    bar_bottom = bottom - pad - 44
+    if modules:
+        scale = max(1, (width - 2 * pad) // len(modules))
+        x = left + (width - scale * len(modules)) // 2
+        for is_bar in modules:
+            if is_bar:
+                draw.rectangle((x, bar_top, x + scale - 1, bar_bottom), fill=0)
+            x += scale
+    text = _fit(draw, sku, sku_font, width - 2 * pad)
+    draw.text((left + (width - draw.textlength(text, font=sku_font)) / 2, bar_bottom + 6), text, font=sku_font, fill=0)
+
+
+def render_sheet(labels):
+    """A bilevel A4 sheet with up to ``LABELS_PER_SHEET`` ``(sku, name, price)`` labels"""
+    sheet = Image.new('1', PAGE_SIZE, 1)
+    draw = ImageDraw.Draw(sheet)
+    cell_width = (PAGE_SIZE[0] - 2 * MARGIN) // COLUMNS
+    cell_height = (PAGE_SIZE[1] - 2 * MARGIN) // ROWS
+    for index, (sku, name, price) in enumerate(labels):
+        row, column = divmod(index, COLUMNS)
+        left, top = MARGIN + column * cell_width, MARGIN + row * cell_height
+        draw_label(draw, (left, top, left + cell_width, top + cell_height), sku, name, price)
+    return sheet
+
+
+def render_page(task):
+    """Worker entry point: ``(labels, format)`` -> encoded sheet bytes"""
+    labels, fmt = task
+    sheet = render_sheet(labels)
+    if fmt == PNG:
+        out = io.BytesIO()
+        sheet.save(out, 'PNG', dpi=(DPI, DPI), optimize=True)
+        return out.getvalue()
+    return zlib.compress(sheet.tobytes())
+
+
+class PdfStream:
+    """
+    Minimal PDF writer for full-page bilevel images, producing bytes as pages
+    arrive. Object 1 is the catalog and object 2 the page tree, both written
+    last; every page adds an image, a content stream and a page object.
+    """
+
+    def __init__(self, pixel_size, dpi=DPI):
+        self.pixel_size = pixel_size
+        self.point_size = tuple(round(pixels * 72 / dpi, 2) for pixels in pixel_size)
+        self.offsets = {}
+        self.position = 0
+        self.next_object = 3
+        self.pages = []
+
+    def _emit(self, data):
+        self.position += len(data)
+        return data
+
+    def _object(self, number, body, stream=None):
+        self.offsets[number] = self.position
+        data = f'{number} 0 obj\n'.encode() + body
+        if stream is not None:
+            data += b'\nstream\n' + stream + b'\nendstream'
+        return self._emit(data + b'\nendobj\n')
+
+    def header(self):
+        return self._emit(b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n')
+
+    def page(self, compressed_bits):
+        image, content, page = self.next_object, self.next_object + 1, self.next_object + 2
+        self.next_object += 3
+        self.pages.append(page)
+        width, height = self.pixel_size
+        draw = f'q {self.point_size[0]} 0 0 {self.point_size[1]} 0 0 cm /Im0 Do Q'.encode()
+        return b''.join([
+            self._object(image, (
+                f'<< /Type /XObject /Subtype /Image /Width {width} /Height {height} /ColorSpace /DeviceGray '
+                f'/BitsPerComponent 1 /Filter /FlateDecode /Length {len(compressed_bits)} >>'
+            ).encode(), compressed_bits),
+            self._object(content, f'<< /Length {len(draw)} >>'.encode(), draw),
+            self._object(page, (
+                f'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {self.point_size[0]} {self.point_size[1]}] '
+                f'/Resources << /XObject << /Im0 {image} 0 R >> >> /Contents {content} 0 R >>'
+            ).encode()),
+        ])
+
+    def trailer(self):
+        kids = ' '.join(f'{page} 0 R' for page in self.pages)
+        data = self._object(2, f'<< /Type /Pages /Kids [{kids}] /Count {len(self.pages)} >>'.encode())
+        data += self._object(1, b'<< /Type /Catalog /Pages 2 0 R >>')
+        xref_at = self.position
+        lines = [f'xref\n0 {self.next_object}\n', '0000000000 65535 f \n']
+        lines += [f'{self.offsets[number]:010d} 00000 n \n' for number in range(1, self.next_object)]
+        lines.append(f'trailer\n<< /Size {self.next_object} /Root 1 0 R >>\nstartxref\n{xref_at}\n%%EOF\n')
+        return data + self._emit(''.join(lines).encode())
+
+
+def label_rows(items):
+    """``(sku, name, price)`` for each item of ``items``, read in chunks"""
+    return (
+        (sku, name, float(price))
+        for sku, name, price in items.order_by('sku').values_list('sku', 'name', 'selling_price').iterator(
+            chunk_size=2000
+        )
+    )
+
+
+def _sheets(rows):
+    rows = iter(rows)
+    while True:
+        sheet = list(islice(rows, LABELS_PER_SHEET))
+        if not sheet:
+            return
+        yield sheet
+
+
+def render_pages(rows, fmt=PDF, workers=None):
+    """
+    Encoded sheets for the ``(sku, name, price)`` rows, in order. Sheets are
+    rendered across a process pool with at most two per worker in flight,
+    so memory stays bounded for any number of labels; ``workers=1`` renders
+    inline.
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f'Unknown label format "{fmt}"')
+    tasks = ((sheet, fmt) for sheet in _sheets(rows))
+    workers = workers or label_workers() or os.cpu_count() or 1
+    if workers == 1:
+        yield from map(render_page, tasks)
+        return
+
+    # Workers only draw and never touch the database, so the parent keeps
+    # streaming rows from its own connection
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        window = deque()
+        in_flight = 2 * workers
+        for task in tasks:
+            window.append(pool.submit(render_page, task))
+            if len(window) >= in_flight:
+                yield window.popleft().result()
+        while window:
+            yield window.popleft().result()
+
+
+def pdf_chunks(rows, workers=None):
+    """The label sheets as one PDF, yielded a page at a time"""
+    pdf = PdfStream(PAGE_SIZE)
+    yield pdf.header()
+    for page in render_pages(rows, PDF, workers):
+        yield pdf.page(page)
+    yield pdf.trailer()
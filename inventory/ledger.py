@@ -0,0 +1,185 @@
+"""
+Stock movement ledger queries: running balances and keyset-paged history.
+
+An item's history may be split by ``archive_movements``: movements before its
+opening balances' ``as_of`` live in ``ArchivedStockMovement`` and later ones
+in ``StockMovement``. Queries here read whichever side of that boundary they
+need, so callers see one continuous ledger.
+"""
+from django.core import signing
+from django.db.models import Q, Sum, F
+from django.utils.dateparse import parse_datetime
+
+from .models import ArchivedStockMovement, OpeningBalance, StockMovement
+
+CURSOR_SALT = 'inventory.ledger.cursor'
+
+
+def apply_movement(balance, movement_type, quantity):
+    """Return the stock level after a movement, mirroring StockMovement.save()"""
+    if movement_type == 'in':
+        return balance + quantity
+    if movement_type == 'out':
+        return max(0, balance - quantity)
+    if movement_type == 'adjustment':
+        return max(0, quantity)
+    return balance
+
+
+def _before(created_at, movement_id=None):
+    """Filter for movements strictly before the (created_at, id) key"""
+    if movement_id is None:
+        return Q(created_at__lt=created_at)
+    return Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=movement_id)
+
+
+def _after(created_at, movement_id):
+    return Q(created_at__gt=created_at) | Q(created_at=created_at, id__gt=movement_id)
+
+
+def opening_balances(item_id):
+    """
+    ``({location_id: quantity}, as_of)`` for an item whose older movements
+    have been archived, or ``({}, None)`` when its whole history is live.
+    """
+    rows = list(OpeningBalance.objects.filter(item_id=item_id).values_list('location_id', 'quantity', 'as_of'))
+    if not rows:
+        return {}, None
+    return {location_id: quantity for location_id, quantity, _ in rows}, rows[0][2]
+
+
+def _location_balance_before(history, opening=0):
+    """Balance of one location's ``history`` queryset at its end, starting from ``opening``"""
+    last_adjustment = history.filter(movement_type='adjustment').order_by(
+        '-created_at', '-id'
+    ).values('created_at', 'id', 'quantity').first()
+
+    balance = opening
+    if last_adjustment:
+        balance = max(0, last_adjustment['quantity'])
+        history = history.filter(_after(last_adjustment['created_at'], last_adjustment['id']))
+
+    totals = history.aggregate(
+        stock_in=Sum('quantity', filter=Q(movement_type='in')),
+        stock_out=Sum('quantity', filter=Q(movement_type='out')),
+    )
+    return max(0, balance + (totals['stock_in'] or 0) - (totals['stock_out'] or 0))
+
+
+def location_balances_before(item_id, created_at, movement_id=None):
+    """
+    Stock of an item per location just before the (created_at, id) ledger
+    position, as ``{location_id: quantity}``.
+
+    Each location starts from its latest adjustment before that position (or
+    zero) and adds the net of later in/out movements in one aggregate.
+    Clamping of 'out' movements at zero is not replayed, which only matters
+    for movements that exceeded the stock on hand when recorded.
+
+    Positions at or after the archive boundary start from the opening
+    balances and only read live movements; earlier positions read the archive.
+    """
+    opening, as_of = opening_balances(item_id)
+    if as_of is not None and created_at < as_of:
+        model, opening = ArchivedStockMovement, {}
+    else:
+        model = StockMovement
+    history = model.objects.filter(item_id=item_id).filter(_before(created_at, movement_id))
+    locations = set(history.order_by().values_list('location_id', flat=True).distinct()) | set(opening)
+    return {
+        location_id: _location_balance_before(history.filter(location_id=location_id), opening.get(location_id, 0))
+        for location_id in locations
+    }
+
+
+def balance_before(item_id, created_at, movement_id=None):
+    """Total stock of an item across locations just before a ledger position"""
+    return sum(location_balances_before(item_id, created_at, movement_id).values())
+
+
+def encode_cursor(created_at, movement_id, balances):
+    return signing.dumps({
+        't': created_at.isoformat(),
+        'id': movement_id,
+        'b': None if balances is None else {str(k): v for k, v in balances.items()},
+    }, salt=CURSOR_SALT)
+
+
+def decode_cursor(cursor):
+    """Return (created_at iso string, id, balances); raises signing.BadSignature"""
+    data = signing.loads(cursor, salt=CURSOR_SALT)
+    balances = data.get('b')
+    if balances is not None:
+        balances = {None if k == 'None' else int(k): v for k, v in balances.items()}
+    return data['t'], data['id'], balances
+
+
+def movement_page(item_id, limit, cursor=None, movement_type=None, start=None, end=None):
+    """
+    Return one page of an item's movements in chronological order.
+
+    Pages are addressed by a signed (created_at, id) cursor, so fetching any
+    page is an index range scan regardless of how much history precedes it.
+    Unless the page is filtered by movement type, every row carries the
+    running stock balance (summed over locations) after that movement; the
+    cursor carries the per-location balances forward so only the very first
+    page has to compute an opening balance. Pages that start before the
+    archive boundary are filled from the archive first, then from live rows.
+
+    Returns ``(rows, next_cursor)``.
+    """
+    with_balance = movement_type is None
+    balances = None
+    position = None
+    if cursor:
+        created_at, last_id, balances = decode_cursor(cursor)
+        created_at = parse_datetime(created_at)
+        position = _after(created_at, last_id)
+    elif with_balance:
+        balances = location_balances_before(item_id, start) if start is not None else {}
+
+    as_of = OpeningBalance.objects.filter(item_id=item_id).values_list('as_of', flat=True).first()
+    page_start = created_at if cursor else start
+    models = []
+    if as_of is not None and (page_start is None or page_start < as_of):
+        models.append(ArchivedStockMovement)
+    if as_of is None or end is None or end > as_of:
+        models.append(StockMovement)
+
+    rows = []
+    for model in models:
+        qs = model.objects.filter(item_id=item_id)
+        if start is not None:
+            qs = qs.filter(created_at__gte=start)
+        if end is not None:
+            qs = qs.filter(created_at__lt=end)
+        if position is not None:
+            qs = qs.filter(position)
+        if movement_type:
+            qs = qs.filter(movement_type=movement_type)
+        rows.extend(qs.order_by('created_at', 'id').values(
+            'id', 'created_at', 'movement_type', 'quantity', 'reference', 'notes',
+            'location_id',
+            location_name=F('location__name'),
+            created_by_username=F('created_by__username'),
+        )[:limit + 1 - len(rows)])
+        if len(rows) > limit:
+            break
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    for row in rows:
+        location_id = row.pop('location_id')
+        if with_balance and balances is not None:
+            balances[location_id] = apply_movement(
+                balances.get(location_id, 0), row['movement_type'], row['quantity']
+            )
+            row['balance'] = sum(balances.values())
+        else:
+            row['balance'] = None
+
+    next_cursor = None
+    if has_more:
+        last = rows[-1]
+        next_cursor = encode_cursor(last['created_at'], last['id'], balances if with_balance else None)
+    return rows, next_cursor
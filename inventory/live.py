@@ -0,0 +1,132 @@
+"""
+Live stock updates for Server-Sent Events clients.
+
+A single broadcaster per process watches the change feed and fans each
+stock change out to every connected client's queue, so the database is
+polled once per interval no matter how many screens are listening.
+"""
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.db.models import F
+
+from .models import ChangeLogEntry, Item
+
+QUEUE_SIZE = 100
+POLL_BATCH = 1000
+
+
+def poll_interval():
+    return getattr(settings, 'INVENTORY_LIVE_POLL_INTERVAL', 1.0)
+
+
+def streaming_supported(request):
+    """
+    Whether ``request`` came through ASGI. A WSGI server reads an async
+    stream to the end before sending any of it, so an endless event stream
+    would never reach the browser and would hold its worker for good.
+    """
+    return isinstance(request, ASGIRequest)
+
+
+class StockBroadcaster:
+    """Polls item changes once per interval and fans them out to subscribers"""
+
+    def __init__(self):
+        self.subscribers = set()
+        self.last_seq = None
+        self.low_stock_ids = set()
+        self._task = None
+        self._primed = None
+        self._loop = None
+
+    def prime(self):
+        """Start from the current end of the feed and the current low-stock set"""
+        self.last_seq = ChangeLogEntry.objects.order_by('-seq').values_list('seq', flat=True).first() or 0
+        self.low_stock_ids = set(
+            Item.objects.filter(
+                quantity_in_stock__lte=F('minimum_stock_level'), is_active=True
+            ).values_list('id', flat=True)
+        )
+
+    def poll(self):
+        """Return events for item changes since the last poll"""
+        entries = ChangeLogEntry.objects.filter(
+            seq__gt=self.last_seq, model='item'
+        ).order_by('seq').values_list('seq', 'object_id', 'action', 'payload')[:POLL_BATCH]
+
+        events = []
+        for seq, item_id, action, payload in entries:
+            self.last_seq = seq
+            if action == 'delete':
+                self.low_stock_ids.discard(item_id)
+                continue
+            quantity = payload.get('quantity_in_stock', 0)
+            is_low = payload.get('is_active', True) and quantity <= payload.get('minimum_stock_level', 0)
+            event = {
+                'seq': seq,
+                'id': item_id,
+                'sku': payload.get('sku'),
+                'name': payload.get('name'),
+                'quantity_in_stock': quantity,
+                'minimum_stock_level': payload.get('minimum_stock_level'),
+                'is_low_stock': is_low,
+            }
+            events.append({**event, 'type': 'stock'})
+            if is_low and item_id not in self.low_stock_ids:
+                self.low_stock_ids.add(item_id)
+                events.append({**event, 'type': 'low_stock'})
+            elif not is_low and item_id in self.low_stock_ids:
+                self.low_stock_ids.discard(item_id)
+                events.append({**event, 'type': 'restocked'})
+        return events
+
+    async def subscribe(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # Tasks cannot outlive their event loop; start over on a new one
+            self.subscribers = set()
+            self._task = None
+            self._loop = loop
+        queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+        self.subscribers.add(queue)
+        # Start the watcher before the first await, so subscribers arriving
+        # together share one; each waits until it has primed, so no change
+        # committed after subscribe() returns is skipped
+        if self._task is None or self._task.done():
+            self._primed = loop.create_future()
+            self._task = loop.create_task(self._watch(self._primed))
+        try:
+            await asyncio.shield(self._primed)
+        except BaseException:
+            self.unsubscribe(queue)
+            raise
+        return queue
+
+    def unsubscribe(self, queue):
+        self.subscribers.discard(queue)
+
+    def publish(self, event):
+        for queue in list(self.subscribers):
+            try:
+                queue.put_nowait(event)
+            except asyncio.QueueFull:
+                # A stalled client misses updates rather than holding up the rest
+                pass
+
+    async def _watch(self, primed):
+        try:
+            await sync_to_async(self.prime)()
+        except Exception as exc:
+            primed.set_exception(exc)
+            return
+        primed.set_result(None)
+        while self.subscribers:
+            for event in await sync_to_async(self.poll)():
+                self.publish(event)
+            await asyncio.sleep(poll_interval())
+
+
+broadcaster = StockBroadcaster()
@@ -0,0 +1,249 @@
+"""
+Concurrent load generator for the inventory routes.
+
+Workers pick requests from a weighted mix of searches, item views, stock
+movement posts and report fetches until the deadline, recording latency and
+outcome per route. Requests go either through an in-process WSGI handler
+(Django's test client, one per worker thread) or over HTTP to a running
+server.
+"""
+import http.cookiejar
+import math
+import random
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import OperationalError, connection
+from django.test import Client
+from django.urls import reverse
+
+from .models import Item
+
+# Route name -> weight in the request mix
+DEFAULT_MIX = {
+    'search': 30,
+    'item_list': 15,
+    'item_detail': 25,
+    'movement_post': 15,
+    'reports': 5,
+    'report_data': 10,
+}
+
+LOCK_MESSAGE = 'database is locked'
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(pct * len(sorted_values) / 100))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+class RequestPlan:
+    """Builds (method, path, data) for each route from a sample of items"""
+
+    def __init__(self, items):
+        if not items:
+            raise ValueError('Load testing needs at least one active item')
+        self.items = items
+        self._moves = {}
+        self._moves_lock = threading.Lock()
+
+    @classmethod
+    def from_database(cls, sample_size=200):
+        items = list(Item.objects.filter(is_active=True).order_by('?').values_list('id', 'sku', 'name')[:sample_size])
+        return cls(items)
+
+    def build(self, route, rng):
+        item_id, sku, name = rng.choice(self.items)
+        if route == 'search':
+            return 'GET', reverse('inventory:api_item_search') + '?' + urllib.parse.urlencode({'q': sku[:3]}), None
+        if route == 'item_list':
+            return 'GET', reverse('inventory:item_list') + '?' + urllib.parse.urlencode({'search': name[:4]}), None
+        if route == 'item_detail':
+            return 'GET', reverse('inventory:item_detail', args=[item_id]), None
+        if route == 'movement_post':
+            return 'POST', reverse('inventory:stock_movement_create'), {
+                'item': item_id,
+                'movement_type': self._next_move(item_id),
+                'quantity': 1,
+                'reference': 'LOADTEST',
+            }
+        if route == 'reports':
+            return 'GET', reverse('inventory:reports'), None
+        if route == 'report_data':
+            return 'GET', reverse('inventory:stock_by_item_data'), None
+        raise ValueError(f'Unknown route "{route}"')
+
+    def _next_move(self, item_id):
+        """
+        Alternate in and out per item, starting with in, so every item nets to
+        zero change (give or take its last movement) and an issue never
+        finds the stock it needs missing
+        """
+        with self._moves_lock:
+            movement_type = self._moves.get(item_id, 'in')
+            self._moves[item_id] = 'out' if movement_type == 'in' else 'in'
+        return movement_type
+
+
+class InProcessTransport:
+    """Sends requests through the WSGI handler in this process"""
+
+    def __init__(self):
+        self.client = Client(SERVER_NAME=self.host())
+
+    @staticmethod
+    def host():
+        """A host name the project accepts; 'localhost' passes host validation under DEBUG"""
+        names = [h.lstrip('.') for h in settings.ALLOWED_HOSTS if h != '*']
+        return names[0] if names else 'localhost'
+
+    def send(self, method, path, data):
+        """Return (status, lock_error)"""
+        try:
+            if method == 'POST':
+                response = self.client.post(path, data)
+            else:
+                response = self.client.get(path)
+        except OperationalError as exc:
+            return 500, LOCK_MESSAGE in str(exc)
+        except Exception:
+            return 500, False
+        return response.status_code, False
+
+    def close(self):
+        connection.close()
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+class HttpTransport:
+    """Sends requests to a running server, keeping a session cookie and CSRF token"""
+
+    def __init__(self, base_url, timeout=30):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.cookies = http.cookiejar.CookieJar()
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(self.cookies), _NoRedirect()
+        )
+        self.csrf_token = None
+
+    def _csrf(self):
+        if self.csrf_token is None:
+            self.send('GET', reverse('inventory:stock_movement_create'), None)
+            self.csrf_token = next((c.value for c in self.cookies if c.name == 'csrftoken'), '')
+        return self.csrf_token
+
+    def send(self, method, path, data):
+        url = self.base_url + path
+        body = None
+        headers = {}
+        if method == 'POST':
+            body = urllib.parse.urlencode({**data, 'csrfmiddlewaretoken': self._csrf()}).encode()
+            headers = {'Referer': url, 'X-CSRFToken': self.csrf_token}
+        request = urllib.request.Request(url, data=body, headers=headers, method=method)
+        try:
+            with self.opener.open(request, timeout=self.timeout) as response:
+                response.read()
+                return response.status, False
+        except urllib.error.HTTPError as exc:
+            content = exc.read().decode('utf-8', 'replace') if exc.code >= 500 else ''
+            return exc.code, LOCK_MESSAGE in content
+        except OSError:
+            return 0, False
+
+    def close(self):
+        pass
+
+
+def is_error(method, status):
+    """
+    Whether a response failed: 400 and above, no response at all, or a POST
+    answered with 200, which is the form re-rendered with errors rather than
+    the redirect a saved movement gets
+    """
+    return status == 0 or status >= 400 or (method == 'POST' and status == 200)
+
+
+class RouteStats:
+    def __init__(self):
+        self.latencies = []
+        self.errors = 0
+        self.lock_errors = 0
+
+    def summary(self, duration):
+        latencies = sorted(self.latencies)
+        return {
+            'requests': len(latencies),
+            'throughput': len(latencies) / duration if duration else 0.0,
+            'p50_ms': percentile(latencies, 50) * 1000,
+            'p95_ms': percentile(latencies, 95) * 1000,
+            'p99_ms': percentile(latencies, 99) * 1000,
+            'errors': self.errors,
+            'lock_errors': self.lock_errors,
+        }
+
+
+def run(duration=10.0, workers=8, mix=None, base_url=None, plan=None, seed=None):
+    """
+    Drive ``workers`` threads for ``duration`` seconds and return
+    ``{'duration': seconds, 'routes': {route: summary}, 'total': summary}``.
+
+    Responses of 400 and above, connection failures and form re-renders on
+    POST count as errors (see ``is_error``); SQLite "database is locked" failures are also counted separately.
+    """
+    mix = mix or DEFAULT_MIX
+    plan = plan or RequestPlan.from_database()
+    routes, weights = zip(*mix.items())
+    stats = {route: RouteStats() for route in routes}
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def worker(index):
+        rng = random.Random(None if seed is None else seed + index)
+        transport = HttpTransport(base_url) if base_url else InProcessTransport()
+        results = []
+        try:
+            while time.perf_counter() < deadline:
+                route = rng.choices(routes, weights)[0]
+                method, path, data = plan.build(route, rng)
+                started = time.perf_counter()
+                status, lock_error = transport.send(method, path, data)
+                results.append((route, time.perf_counter() - started, is_error(method, status), lock_error))
+        finally:
+            transport.close()
+        with lock:
+            for route, elapsed, error, lock_error in results:
+                route_stats = stats[route]
+                route_stats.latencies.append(elapsed)
+                if error:
+                    route_stats.errors += 1
+                if lock_error:
+                    route_stats.lock_errors += 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        list(pool.map(worker, range(workers)))
+    elapsed = time.perf_counter() - started
+
+    total = RouteStats()
+    for route_stats in stats.values():
+        total.latencies.extend(route_stats.latencies)
+        total.errors += route_stats.errors
+        total.lock_errors += route_stats.lock_errors
+    return {
+        'duration': elapsed,
+        'routes': {route: route_stats.summary(elapsed) for route, route_stats in stats.items()},
+        'total': total.summary(elapsed),
+    }
@@ -0,0 +1,53 @@
+"""Per-location stock rows and the cached item totals derived from them"""
+from django.db import transaction
+from django.db.models import Sum
+
+from .models import Item, ItemStock, Location, StockMovement
+
+
+def sync_item_locations(item):
+    """
+    Post a directly edited ``quantity_in_stock`` (item form, admin) to the
+    ledger as adjustment movements, so the edit is on record and replaying
+    the ledger gives the same stock.
+
+    Increases go to the default location; decreases are taken from the
+    default location first and then from the others in name order.
+    """
+    tracked = ItemStock.objects.filter(item_id=item.id).aggregate(total=Sum('quantity'))['total'] or 0
+    delta = item.quantity_in_stock - tracked
+    if not delta:
+        return
+
+    with transaction.atomic():
+        default = Location.default()
+        levels = []
+        if delta > 0:
+            stock, _ = ItemStock.objects.select_for_update().get_or_create(item_id=item.id, location=default)
+            levels.append((default, stock.quantity + delta))
+        else:
+            remaining = -delta
+            rows = sorted(
+                ItemStock.objects.select_for_update().filter(item_id=item.id, quantity__gt=0).select_related('location'),
+                key=lambda row: (row.location_id != default.id, row.location.name),
+            )
+            for stock in rows:
+                taken = min(remaining, stock.quantity)
+                levels.append((stock.location, stock.quantity - taken))
+                remaining -= taken
+                if not remaining:
+                    break
+
+        # The movements move the total by the same delta, so it goes back to
+        # the ledger's figure first
+        Item.objects.filter(pk=item.pk).update(quantity_in_stock=tracked)
+        for location, quantity in levels:
+            StockMovement.objects.create(
+                item=item, location=location, movement_type='adjustment', quantity=quantity,
+                notes='Stock level edited on the item',
+            )
+
+
+def stock_by_location(item):
+    """Location rows holding stock of ``item``"""
+    return ItemStock.objects.filter(item=item, quantity__gt=0).select_related('location')
@@ -0,0 +1,40 @@
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from inventory import archive
+
+
+class Command(BaseCommand):
+    help = 'Move stock movements older than a cutoff into the archive table, keeping per-item opening balances'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=None,
+                            help='Archive movements older than this many days (default: INVENTORY_ARCHIVE_AFTER_DAYS)')
+        parser.add_argument('--before', default=None,
+                            help='Archive movements before this date (YYYY-MM-DD) instead of --days')
+        parser.add_argument('--chunk-size', type=int, default=500,
+                            help='Number of item ids archived per transaction')
+
+    def handle(self, *args, **options):
+        if options['before']:
+            day = parse_date(options['before'])
+            if day is None:
+                raise CommandError('--before must be a date in YYYY-MM-DD format')
+            cutoff = timezone.make_aware(datetime.datetime.combine(day, datetime.time.min))
+        else:
+            cutoff = archive.default_cutoff(options['days'])
+
+        def progress(done, total, archived):
+            self.stdout.write(f'  {done}/{total} chunks, {archived} movements')
+
+        archived = archive.archive(
+            cutoff=cutoff,
+            chunk_size=options['chunk_size'],
+            progress=progress if options['verbosity'] > 1 else None,
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Archived {archived} movement{"s" if archived != 1 else ""} before {cutoff:%Y-%m-%d %H:%M}'
+        ))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from inventory import changes
+
+
+class Command(BaseCommand):
+    help = 'Remove expired and superseded entries from the change feed'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=None,
+                            help='Retention in days (default: INVENTORY_CHANGE_RETENTION_DAYS)')
+
+    def handle(self, *args, **options):
+        expired, superseded = changes.compact(days=options['days'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Removed {expired} expired and {superseded} superseded change entries'
+        ))
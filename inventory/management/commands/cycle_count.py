@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand, CommandError
+from inventory import cyclecounts
+from inventory.models import Location
+
+
+class Command(BaseCommand):
+    help = 'Load a sku,counted_qty count file, report variances and optionally post them as adjustments'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV file of sku,counted_qty lines')
+        parser.add_argument('--location', default=None,
+                            help='Location code the count was taken at (default: main warehouse)')
+        parser.add_argument('--notes', default='', help='Notes stored with the count')
+        parser.add_argument('--approve', action='store_true',
+                            help='Post variances as stock adjustments immediately')
+
+    def handle(self, *args, **options):
+        location = None
+        if options['location']:
+            location = Location.objects.filter(code=options['location']).first()
+            if location is None:
+                raise CommandError(f'Unknown location "{options["location"]}"')
+        try:
+            with open(options['path'], encoding='utf-8-sig', newline='') as handle:
+                counts = cyclecounts.parse_counts(handle)
+        except (OSError, ValueError) as exc:
+            raise CommandError(str(exc))
+
+        count = cyclecounts.create_count(counts, location=location, notes=options['notes'])
+        summary = cyclecounts.summarize(count)
+        self.stdout.write(
+            f'Cycle count #{count.id} at {count.location}: {summary["lines"]} SKUs, '
+            f'{summary["unknown"]} unknown, {summary["variances"]} variances '
+            f'(net {summary["net_variance"]}, absolute {summary["absolute_variance"]})'
+        )
+        if options['approve']:
+            posted = cyclecounts.approve(count)
+            self.stdout.write(self.style.SUCCESS(f'Posted {posted} stock adjustment(s)'))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'Cycle count #{count.id} is pending approval'))
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+from inventory import reorders
+
+
+class Command(BaseCommand):
+    help = 'Compute reorder points and draft purchase orders for items that need restocking'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lookback-days', type=int, default=reorders.DEFAULT_LOOKBACK_DAYS,
+                            help='Days of stock-out history used to estimate consumption')
+        parser.add_argument('--lead-time-days', type=int, default=reorders.DEFAULT_LEAD_TIME_DAYS,
+                            help='Lead time in days for suppliers without received orders')
+        parser.add_argument('--safety-days', type=int, default=reorders.DEFAULT_SAFETY_DAYS,
+                            help='Days of demand held as safety stock')
+        parser.add_argument('--cover-days', type=int, default=reorders.DEFAULT_COVER_DAYS,
+                            help='Days of demand each order should cover beyond the reorder point')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Only report suggestions, do not create orders')
+
+    def handle(self, *args, **options):
+        plan = reorders.plan_reorders(
+            lookback_days=options['lookback_days'],
+            lead_time_days=options['lead_time_days'],
+            safety_days=options['safety_days'],
+            cover_days=options['cover_days'],
+        )
+        count = len(plan['item_id'])
+        self.stdout.write(f'{count} item{"s" if count != 1 else ""} at or below reorder point')
+
+        if options['dry_run'] or not count:
+            return
+
+        orders = reorders.create_draft_orders(plan)
+        self.stdout.write(self.style.SUCCESS(
+            f'Created {len(orders)} draft order{"s" if len(orders) != 1 else ""} '
+            f'covering {count} item{"s" if count != 1 else ""}'
+        ))
@@ -0,0 +1,70 @@
+import logging
+
+from django.core.management.base import BaseCommand, CommandError
+from inventory import loadtest
+
+
+class Command(BaseCommand):
+    help = ('Run a concurrent mix of searches, item views, stock movement posts and report fetches '
+            'and report throughput, latency percentiles and errors per route. '
+            'Stock movement posts write to the configured database.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--duration', type=float, default=10.0,
+                            help='Seconds to run for')
+        parser.add_argument('--workers', type=int, default=8,
+                            help='Concurrent worker threads')
+        parser.add_argument('--url', default=None,
+                            help='Root URL of a running server sharing this database (e.g. http://127.0.0.1:8000); '
+                                 'defaults to an in-process WSGI handler')
+        parser.add_argument('--mix', default=None,
+                            help='Comma separated route=weight pairs, e.g. search=50,movement_post=50 '
+                                 f'(routes: {", ".join(loadtest.DEFAULT_MIX)})')
+        parser.add_argument('--seed', type=int, default=None,
+                            help='Random seed for a repeatable request sequence')
+
+    def parse_mix(self, value):
+        mix = {}
+        for pair in value.split(','):
+            route, _, weight = pair.partition('=')
+            route = route.strip()
+            if route not in loadtest.DEFAULT_MIX:
+                raise CommandError(f'Unknown route "{route}"')
+            try:
+                mix[route] = int(weight or 1)
+            except ValueError:
+                raise CommandError(f'Invalid weight for "{route}"')
+        return mix
+
+    def handle(self, *args, **options):
+        mix = self.parse_mix(options['mix']) if options['mix'] else None
+        # Failed requests are counted below; their tracebacks would flood the output
+        request_logger = logging.getLogger('django.request')
+        level = request_logger.level
+        if options['verbosity'] < 2:
+            request_logger.setLevel(logging.CRITICAL)
+        try:
+            result = loadtest.run(
+                duration=options['duration'], workers=options['workers'],
+                mix=mix, base_url=options['url'],
+                seed=options['seed'],
+            )
+        except ValueError as exc:
+            raise CommandError(str(exc))
+        finally:
+            request_logger.setLevel(level)
+
+        header = f'{"route":<15}{"requests":>10}{"req/s":>10}{"p50 ms":>10}{"p95 ms":>10}{"p99 ms":>10}{"errors":>8}{"locked":>8}'
+        self.stdout.write(header)
+        rows = list(result['routes'].items()) + [('total', result['total'])]
+        for route, s in rows:
+            self.stdout.write(
+                f'{route:<15}{s["requests"]:>10}{s["throughput"]:>10.1f}{s["p50_ms"]:>10.1f}'
+                f'{s["p95_ms"]:>10.1f}{s["p99_ms"]:>10.1f}{s["errors"]:>8}{s["lock_errors"]:>8}'
+            )
+        total = result['total']
+        style = self.style.SUCCESS if not total['errors'] else self.style.WARNING
+        self.stdout.write(style(
+            f'{total["requests"]} requests in {result["duration"]:.1f}s with {options["workers"]} workers, '
+            f'{total["errors"]} errors ({total["lock_errors"]} database locked)'
+        ))
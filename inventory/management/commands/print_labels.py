@@ -0,0 +1,46 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from inventory import labels
+from inventory.models import Item
+
+
+class Command(BaseCommand):
+    help = 'Render barcode shelf labels (SKU, name, selling price) onto printable A4 sheets'
+
+    def add_arguments(self, parser):
+        parser.add_argument('output', help='PDF file to write, or a directory for one PNG per sheet')
+        parser.add_argument('--format', choices=labels.FORMATS, default=labels.PDF)
+        parser.add_argument('--sku', nargs='+', default=None, help='Only these SKUs')
+        parser.add_argument('--category', default=None, help='Only items in this category (name)')
+        parser.add_argument('--include-inactive', action='store_true', help='Also label inactive items')
+        parser.add_argument('--workers', type=int, default=None,
+                            help='Render processes (default: INVENTORY_LABEL_WORKERS or one per CPU, 1 runs inline)')
+
+    def handle(self, *args, **options):
+        items = Item.objects.all() if options['include_inactive'] else Item.objects.filter(is_active=True)
+        if options['sku']:
+            items = items.filter(sku__in=options['sku'])
+        if options['category']:
+            items = items.filter(category__name=options['category'])
+        count = items.count()
+        if not count:
+            raise CommandError('No items match')
+
+        rows = labels.label_rows(items)
+        output = options['output']
+        if options['format'] == labels.PDF:
+            with open(output, 'wb') as out:
+                for chunk in labels.pdf_chunks(rows, options['workers']):
+                    out.write(chunk)
+            sheets = -(-count // labels.LABELS_PER_SHEET)
+        else:
+            os.makedirs(output, exist_ok=True)
+            sheets = 0
+            for sheets, page in enumerate(labels.render_pages(rows, labels.PNG, options['workers']), start=1):
+                with open(os.path.join(output, f'labels-{sheets:05d}.png'), 'wb') as out:
+                    out.write(page)
+        self.stdout.write(self.style.SUCCESS(
+            f'Wrote {count} label{"s" if count != 1 else ""} on {sheets} sheet{"s" if sheets != 1 else ""} to {output}'
+        ))
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+from inventory import costing
+
+
+class Command(BaseCommand):
+    help = 'Recompute FIFO cost layers and average costs for every item from the stock movement ledger'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000,
+                            help='Number of item ids replayed per chunk')
+        parser.add_argument('--workers', type=int, default=None,
+                            help='Worker processes (default: one per CPU, 1 runs inline)')
+
+    def handle(self, *args, **options):
+        def progress(done, total):
+            self.stdout.write(f'  {done}/{total} chunks')
+
+        chunks = costing.rebuild(
+            chunk_size=options['chunk_size'],
+            workers=options['workers'],
+            progress=progress if options['verbosity'] > 1 else None,
+        )
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt cost layers in {chunks} chunk{"s" if chunks != 1 else ""}'))
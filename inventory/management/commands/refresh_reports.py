@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from inventory.snapshots import DEFAULT_KEEP, refresh_snapshot
+
+
+class Command(BaseCommand):
+    help = 'Recompute all report datasets and store them as a new snapshot'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--keep', type=int, default=DEFAULT_KEEP,
+                            help='Number of snapshots to retain (0 keeps all)')
+
+    def handle(self, *args, **options):
+        snapshot = refresh_snapshot(keep=options['keep'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Stored report snapshot v{snapshot.version} in {snapshot.build_seconds:.2f}s'
+        ))
@@ -0,0 +1,43 @@
+from decimal import Decimal, InvalidOperation
+
+from django.core.management.base import BaseCommand, CommandError
+
+from inventory import pricing
+from inventory.models import Category, Supplier
+
+
+class Command(BaseCommand):
+    help = 'Change the prices of every active item in a category and/or from a supplier, recording price history'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--category', default=None, help='Category name')
+        parser.add_argument('--supplier', default=None, help='Supplier name')
+        change = parser.add_mutually_exclusive_group(required=True)
+        change.add_argument('--percent', default=None, help='Percentage change, e.g. 5 or -2.5')
+        change.add_argument('--amount', default=None, help='Absolute change per unit, e.g. 500 or -250')
+        parser.add_argument('--field', choices=['selling_price', 'unit_price', 'both'], default='selling_price',
+                            help='Price to change (default: selling_price)')
+        parser.add_argument('--reason', default='', help='Note stored with the price history rows')
+
+    def handle(self, *args, **options):
+        filters = {}
+        try:
+            if options['category']:
+                filters['category'] = Category.objects.get(name=options['category'])
+            if options['supplier']:
+                filters['supplier'] = Supplier.objects.filter(name=options['supplier']).get()
+        except (Category.DoesNotExist, Supplier.DoesNotExist) as exc:
+            raise CommandError(str(exc))
+        except Supplier.MultipleObjectsReturned:
+            raise CommandError(f'Several suppliers are named "{options["supplier"]}"')
+
+        try:
+            change = {key: Decimal(options[key]) for key in ('percent', 'amount') if options[key] is not None}
+        except InvalidOperation:
+            raise CommandError('--percent and --amount must be numbers')
+
+        try:
+            repriced = pricing.reprice(field=options['field'], reason=options['reason'], **change, **filters)
+        except ValueError as exc:
+            raise CommandError(str(exc))
+        self.stdout.write(self.style.SUCCESS(f'Repriced {repriced} item{"s" if repriced != 1 else ""}'))
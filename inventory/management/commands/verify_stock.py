@@ -0,0 +1,54 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from inventory import stockcheck
+from inventory.models import Location
+
+
+class Command(BaseCommand):
+    help = 'Check item and location stock levels against the stock movement ledger, optionally repairing drift'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repair', action='store_true',
+                            help='Set drifted stock levels to their ledger balances')
+        parser.add_argument('--chunk-size', type=int, default=1000,
+                            help='Number of item ids replayed per chunk')
+        parser.add_argument('--workers', type=int, default=None,
+                            help='Worker processes (default: one per CPU, 1 runs inline)')
+        parser.add_argument('--limit', type=int, default=50,
+                            help='Drifted items to list (0 lists all)')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+
+        def progress(done, total, movements, drifted):
+            self.stdout.write(f'  {done}/{total} chunks, {movements} movements, {drifted} drifted')
+
+        result = stockcheck.verify(
+            chunk_size=options['chunk_size'],
+            workers=options['workers'],
+            fix=options['repair'],
+            progress=progress if options['verbosity'] > 0 else None,
+        )
+
+        drifted = result['drifted']
+        shown = drifted[:options['limit']] if options['limit'] else drifted
+        codes = dict(Location.objects.values_list('id', 'code')) if shown else {}
+        for row in shown:
+            line = f"{row['sku']}: recorded {row['recorded']}, ledger {row['expected']} ({row['expected'] - row['recorded']:+d})"
+            locations = ', '.join(
+                f'{codes.get(location_id, location_id)} {recorded} -> {expected}'
+                for location_id, (recorded, expected) in sorted(row['locations'].items())
+            )
+            self.stdout.write(f'{line}; {locations}' if locations else line)
+        if len(shown) < len(drifted):
+            self.stdout.write(f'  ... and {len(drifted) - len(shown)} more')
+
+        summary = (
+            f"Checked {result['movements']} movements in {result['chunks']} chunks "
+            f"in {time.monotonic() - started:.1f}s: {len(drifted)} item{'s' if len(drifted) != 1 else ''} drifted"
+        )
+        if options['repair']:
+            summary += f", {result['repaired']} repaired"
+        self.stdout.write(self.style.SUCCESS(summary) if not drifted or options['repair'] else self.style.WARNING(summary))
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.5 on 2026-10-19 10:40
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0003_reportsnapshot'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='stockmovement',
+            index=models.Index(fields=['item', 'created_at', 'id'], name='stockmove_item_created_idx'),
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 5.2.5 on 2026-10-19 10:41
+
+import django.core.validators
+import django.db.models.deletion
+import django.utils.timezone
+from decimal import Decimal
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0004_stockmovement_item_created_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ItemCost',
+            fields=[
+                ('item', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='cost', serialize=False, to='inventory.item')),
+                ('quantity', models.PositiveIntegerField(default=0)),
+                ('average_cost', models.DecimalField(decimal_places=4, default=Decimal('0'), max_digits=12)),
+                ('fifo_value', models.DecimalField(decimal_places=4, default=Decimal('0'), max_digits=18)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='stockmovement',
+            name='unit_cost',
+            field=models.DecimalField(blank=True, decimal_places=4, help_text="Purchase cost per unit for stock in; defaults to the item's unit price", max_digits=12, null=True, validators=[django.core.validators.MinValueValidator(Decimal('0.00'))]),
+        ),
+        migrations.CreateModel(
+            name='CostLayer',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('unit_cost', models.DecimalField(decimal_places=4, max_digits=12)),
+                ('quantity_received', models.PositiveIntegerField()),
+                ('quantity_remaining', models.PositiveIntegerField()),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('item', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='cost_layers', to='inventory.item')),
+                ('movement', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='cost_layers', to='inventory.stockmovement')),
+            ],
+            options={
+                'ordering': ['created_at', 'id'],
+                'indexes': [models.Index(fields=['item', 'created_at', 'id'], name='costlayer_item_created_idx')],
+            },
+        ),
+    ]
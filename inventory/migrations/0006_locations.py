@@ -0,0 +1,46 @@
+# Generated by Django 5.2.5 on 2026-10-19 10:43
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0005_cost_layers'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Location',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True)),
+                ('code', models.CharField(max_length=20, unique=True)),
+                ('address', models.TextField(blank=True)),
+                ('is_active', models.BooleanField(default=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['name'],
+            },
+        ),
+        migrations.AddField(
+            model_name='stockmovement',
+            name='location',
+            field=models.ForeignKey(blank=True, help_text='Defaults to the main warehouse', null=True, on_delete=django.db.models.deletion.PROTECT, related_name='stock_movements', to='inventory.location'),
+        ),
+        migrations.CreateModel(
+            name='ItemStock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.PositiveIntegerField(default=0)),
+                ('item', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='location_stock', to='inventory.item')),
+                ('location', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='item_stock', to='inventory.location')),
+            ],
+            options={
+                'ordering': ['location__name'],
+                'constraints': [models.UniqueConstraint(fields=('item', 'location'), name='itemstock_item_location_uniq')],
+            },
+        ),
+    ]
@@ -0,0 +1,37 @@
+from django.conf import settings
+from django.db import migrations
+
+
+def populate_default_location(apps, schema_editor):
+    Location = apps.get_model('inventory', 'Location')
+    Item = apps.get_model('inventory', 'Item')
+    ItemStock = apps.get_model('inventory', 'ItemStock')
+    StockMovement = apps.get_model('inventory', 'StockMovement')
+
+    code = getattr(settings, 'INVENTORY_DEFAULT_LOCATION', 'MAIN')
+    location, _ = Location.objects.get_or_create(code=code, defaults={'name': 'Main Warehouse'})
+
+    stock = (
+        ItemStock(item_id=item_id, location_id=location.id, quantity=quantity)
+        for item_id, quantity in Item.objects.filter(quantity_in_stock__gt=0).values_list('id', 'quantity_in_stock').iterator()
+    )
+    batch = []
+    for row in stock:
+        batch.append(row)
+        if len(batch) == 1000:
+            ItemStock.objects.bulk_create(batch)
+            batch = []
+    ItemStock.objects.bulk_create(batch)
+
+    StockMovement.objects.filter(location__isnull=True).update(location=location)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0006_locations'),
+    ]
+
+    operations = [
+        migrations.RunPython(populate_default_location, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.5 on 2026-10-19 10:50
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0008_changelog'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ItemClassification',
+            fields=[
+                ('item', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='classification', serialize=False, to='inventory.item')),
+                ('value_class', models.CharField(choices=[('A', 'A'), ('B', 'B'), ('C', 'C')], db_index=True, max_length=1)),
+                ('usage_class', models.CharField(choices=[('A', 'A'), ('B', 'B'), ('C', 'C')], db_index=True, max_length=1)),
+                ('stock_value', models.DecimalField(decimal_places=2, max_digits=18)),
+                ('usage_value', models.DecimalField(decimal_places=2, max_digits=18)),
+                ('period_days', models.PositiveIntegerField()),
+                ('classified_at', models.DateTimeField()),
+            ],
+        ),
+    ]
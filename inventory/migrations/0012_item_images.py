@@ -0,0 +1,29 @@
+# Generated by Django 5.2.5 on 2026-10-19 11:05
+
+import inventory.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0011_movement_archive'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='item',
+            name='image',
+            field=models.ImageField(blank=True, upload_to=inventory.models.item_image_path),
+        ),
+        migrations.AddField(
+            model_name='item',
+            name='image_preview',
+            field=models.CharField(blank=True, editable=False, max_length=100),
+        ),
+        migrations.AddField(
+            model_name='item',
+            name='image_thumbnail',
+            field=models.CharField(blank=True, editable=False, max_length=100),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.5 on 2026-10-19 11:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0012_item_images'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='received_at',
+            field=models.DateTimeField(blank=True, help_text='Set when the order is marked received', null=True),
+        ),
+        migrations.AddField(
+            model_name='orderitem',
+            name='received_at',
+            field=models.DateTimeField(blank=True, help_text='When goods first arrived against this line', null=True),
+        ),
+    ]
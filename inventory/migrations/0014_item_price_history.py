@@ -0,0 +1,53 @@
+# Generated by Django 5.2.5 on 2026-10-19 11:11
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+def record_current_prices(apps, schema_editor):
+    """Start every item's history with its current prices, effective from its creation"""
+    Item = apps.get_model('inventory', 'Item')
+    ItemPrice = apps.get_model('inventory', 'ItemPrice')
+
+    batch = []
+    for item_id, unit_price, selling_price, created_at in Item.objects.values_list(
+        'id', 'unit_price', 'selling_price', 'created_at'
+    ).iterator():
+        batch.append(ItemPrice(
+            item_id=item_id, unit_price=unit_price, selling_price=selling_price, effective_at=created_at,
+            reason='Price at upgrade',
+        ))
+        if len(batch) == 1000:
+            ItemPrice.objects.bulk_create(batch)
+            batch = []
+    ItemPrice.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0013_order_received_at'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ItemPrice',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('unit_price', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('selling_price', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('effective_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('reason', models.CharField(blank=True, max_length=200)),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('item', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='price_history', to='inventory.item')),
+            ],
+            options={
+                'ordering': ['-effective_at', '-id'],
+                'indexes': [models.Index(fields=['item', 'effective_at', 'id'], name='itemprice_item_effective_idx')],
+            },
+        ),
+        migrations.RunPython(record_current_prices, migrations.RunPython.noop),
+    ]
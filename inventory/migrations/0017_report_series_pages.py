@@ -0,0 +1,34 @@
+# Generated by Django 5.2.5 on 2026-10-19 11:47
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def drop_snapshots(apps, schema_editor):
+    """Snapshots built before the per-item series moved out are rebuilt on the next request"""
+    apps.get_model('inventory', 'ReportSnapshot').objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0016_stockmovement_reference_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReportSeriesPage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dataset', models.CharField(max_length=50)),
+                ('number', models.PositiveIntegerField()),
+                ('data', models.JSONField()),
+                ('snapshot', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='series_pages', to='inventory.reportsnapshot')),
+            ],
+            options={
+                'ordering': ['snapshot', 'dataset', 'number'],
+                'constraints': [models.UniqueConstraint(fields=('snapshot', 'dataset', 'number'), name='report_series_page_unique')],
+            },
+        ),
+        migrations.RunPython(drop_snapshots, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,74 @@
+from django.conf import settings
+from django.db import migrations
+
+CHUNK = 1000
+
+
+def _apply(balance, movement_type, quantity):
+    # StockMovement.save as of this migration
+    if movement_type == 'in':
+        return balance + quantity
+    if movement_type == 'out':
+        return max(0, balance - quantity)
+    if movement_type == 'adjustment':
+        return max(0, quantity)
+    return balance
+
+
+def post_opening_stock(apps, schema_editor):
+    """
+    Stock entered on items was never posted to the ledger, and the stock 0007
+    carried into location rows has no movements behind it. Record whatever the
+    ledger does not explain as an adjustment to the current level, so replaying
+    it (verify_stock) gives the stock on hand rather than reporting it as drift.
+    """
+    Location = apps.get_model('inventory', 'Location')
+    Item = apps.get_model('inventory', 'Item')
+    ItemStock = apps.get_model('inventory', 'ItemStock')
+    StockMovement = apps.get_model('inventory', 'StockMovement')
+    OpeningBalance = apps.get_model('inventory', 'OpeningBalance')
+
+    code = getattr(settings, 'INVENTORY_DEFAULT_LOCATION', 'MAIN')
+    default_id = Location.objects.filter(code=code).values_list('id', flat=True).first()
+
+    item_ids = list(Item.objects.order_by('id').values_list('id', flat=True))
+    for start in range(0, len(item_ids), CHUNK):
+        ids = item_ids[start:start + CHUNK]
+        expected = {}
+        for item_id, location_id, quantity in OpeningBalance.objects.filter(item_id__in=ids).values_list(
+            'item_id', 'location_id', 'quantity'
+        ):
+            expected[item_id, location_id] = quantity
+        rows = StockMovement.objects.filter(item_id__in=ids).order_by('item_id', 'created_at', 'id').values_list(
+            'item_id', 'location_id', 'movement_type', 'quantity'
+        )
+        for item_id, location_id, movement_type, quantity in rows.iterator(chunk_size=10000):
+            key = (item_id, location_id or default_id)
+            expected[key] = _apply(expected.get(key, 0), movement_type, quantity)
+
+        recorded = {
+            (item_id, location_id): quantity
+            for item_id, location_id, quantity in ItemStock.objects.filter(item_id__in=ids).values_list(
+                'item_id', 'location_id', 'quantity'
+            )
+        }
+        StockMovement.objects.bulk_create([
+            StockMovement(
+                item_id=item_id, location_id=location_id, movement_type='adjustment',
+                quantity=recorded.get((item_id, location_id), 0), reference='OPENING',
+                notes='Stock on hand without ledger entries',
+            )
+            for item_id, location_id in sorted(expected.keys() | recorded.keys())
+            if recorded.get((item_id, location_id), 0) != expected.get((item_id, location_id), 0)
+        ], batch_size=CHUNK)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0017_report_series_pages'),
+    ]
+
+    operations = [
+        migrations.RunPython(post_opening_stock, migrations.RunPython.noop),
+    ]
@@ -1,7 +1,27 @@
-from django.db import models
+from django.conf import settings
+from django.db import models, transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
 from django.contrib.auth.models import User
+from django.core.serializers.json import DjangoJSONEncoder
 from django.core.validators import MinValueValidator
+from django.utils import timezone
+from django.urls import reverse
 from decimal import Decimal
+import hashlib
+import os
+
+
+class Sequence(models.Model):
+    """Named counter used to allocate document numbers"""
+    name = models.CharField(max_length=50, unique=True)
+    value = models.BigIntegerField(default=0, help_text="Last value handed out")
+
+    class Meta:
+        ordering = ['name']
+
+    def __str__(self):
+        return f"{self.name} ({self.value})"
 
 
 class Category(models.Model):
@@ -36,6 +56,37 @@ class Supplier(models.Model):
         return self.name
 
 
+class Location(models.Model):
+    """Warehouse or site that holds stock"""
+    name = models.CharField(max_length=100, unique=True)
+    code = models.CharField(max_length=20, unique=True)
+    address = models.TextField(blank=True)
+    is_active = models.BooleanField(default=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['name']
+
+    def __str__(self):
+        return self.name
+
+    @classmethod
+    def default(cls):
+        """Location used for movements and stock edits that do not name one"""
+        code = getattr(settings, 'INVENTORY_DEFAULT_LOCATION', 'MAIN')
+        location, _ = cls.objects.get_or_create(code=code, defaults={'name': 'Main Warehouse'})
+        return location
+
+
+def item_image_path(instance, filename):
+    """Store originals under their content hash, so the name changes whenever the photo does"""
+    digest = hashlib.sha256()
+    for chunk in instance.image.chunks():
+        digest.update(chunk)
+    extension = os.path.splitext(filename)[1].lower() or '.jpg'
+    return f'items/originals/{digest.hexdigest()[:32]}{extension}'
+
+
 class Item(models.Model):
     """Main inventory item model"""
     UNIT_CHOICES = [
@@ -63,6 +114,11 @@ class Item(models.Model):
     
     # Status
     is_active = models.BooleanField(default=True)
+
+    # Photo; pages only ever load the generated variants
+    image = models.ImageField(upload_to=item_image_path, blank=True)
+    image_thumbnail = models.CharField(max_length=100, blank=True, editable=False)
+    image_preview = models.CharField(max_length=100, blank=True, editable=False)
     
     # Timestamps
     created_at = models.DateTimeField(auto_now_add=True)
@@ -75,6 +131,19 @@ class Item(models.Model):
     def __str__(self):
         return f"{self.name} ({self.sku})"
 
+    @transaction.atomic
+    def save(self, *args, **kwargs):
+        """Save in one transaction with the stock sync and change-feed writes"""
+        super().save(*args, **kwargs)
+
+    @property
+    def thumbnail_url(self):
+        return reverse('inventory:item_image', args=[self.image_thumbnail]) if self.image_thumbnail else ''
+
+    @property
+    def preview_url(self):
+        return reverse('inventory:item_image', args=[self.image_preview]) if self.image_preview else ''
+
     @property
     def is_low_stock(self):
         """Check if item is below minimum stock level"""
@@ -93,6 +162,42 @@ class Item(models.Model):
         return 0
 
 
+class ItemPrice(models.Model):
+    """An item's prices from ``effective_at`` until its next price row"""
+    item = models.ForeignKey(Item, on_delete=models.CASCADE, related_name='price_history')
+    unit_price = models.DecimalField(max_digits=10, decimal_places=2)
+    selling_price = models.DecimalField(max_digits=10, decimal_places=2)
+    effective_at = models.DateTimeField(default=timezone.now)
+    reason = models.CharField(max_length=200, blank=True)
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+
+    class Meta:
+        ordering = ['-effective_at', '-id']
+        indexes = [
+            # Latest row per item at or before a date: one index probe
+            models.Index(fields=['item', 'effective_at', 'id'], name='itemprice_item_effective_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.item}: {self.unit_price} / {self.selling_price} from {self.effective_at:%Y-%m-%d}"
+
+
+class ItemStock(models.Model):
+    """Quantity of an item held at one location"""
+    item = models.ForeignKey(Item, on_delete=models.CASCADE, related_name='location_stock')
+    location = models.ForeignKey(Location, on_delete=models.PROTECT, related_name='item_stock')
+    quantity = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ['location__name']
+        constraints = [
+            models.UniqueConstraint(fields=['item', 'location'], name='itemstock_item_location_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.item} @ {self.location}: {self.quantity}"
+
+
 class StockMovement(models.Model):
     """Track all stock movements (in/out)"""
     MOVEMENT_TYPES = [
@@ -102,8 +207,17 @@ class StockMovement(models.Model):
     ]
 
     item = models.ForeignKey(Item, on_delete=models.CASCADE, related_name='stock_movements')
+    location = models.ForeignKey(
+        Location, on_delete=models.PROTECT, null=True, blank=True, related_name='stock_movements',
+        help_text="Defaults to the main warehouse"
+    )
     movement_type = models.CharField(max_length=20, choices=MOVEMENT_TYPES)
     quantity = models.IntegerField()
+    unit_cost = models.DecimalField(
+        max_digits=12, decimal_places=4, null=True, blank=True,
+        validators=[MinValueValidator(Decimal('0.00'))],
+        help_text="Purchase cost per unit for stock in; defaults to the item's unit price"
+    )
     reference = models.CharField(max_length=100, blank=True, help_text="Reference number or note")
     notes = models.TextField(blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
@@ -111,24 +225,109 @@ class StockMovement(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Per-item history in (created_at, id) keyset order
+            models.Index(fields=['item', 'created_at', 'id'], name='stockmove_item_created_idx'),
+            # Recent-movement windows across all items (dashboard, reports, reorder and ABC usage)
+            models.Index(fields=['created_at'], name='stockmove_created_idx'),
+            # Point-of-sale resends, matched on the terminal's reference
+            models.Index(fields=['reference'], name='stockmove_reference_idx'),
+        ]
 
     def __str__(self):
         return f"{self.item.name} - {self.movement_type} ({self.quantity})"
 
     def save(self, *args, **kwargs):
-        """Update item stock when movement is saved"""
+        """Update location stock, the item total and cost layers when movement is saved"""
+        if not self.reference and self._state.adding:
+            # Numbered before the transaction opens, so the sequence can hand
+            # out values from a pre-allocated block
+            from .sequences import MOVEMENT, next_number
+            self.reference = next_number(MOVEMENT)
+        self._save_and_apply(*args, **kwargs)
+
+    @transaction.atomic
+    def _save_and_apply(self, *args, **kwargs):
+        """
+        Insert the movement, move its location's stock and the item total, and
+        cost it and record the change in one transaction, so the change feed
+        never misses a movement or reports one that rolled back. Rows are
+        locked in a fixed order, location stock before item, and the item
+        row, the one every location shares, is taken last so it is held for
+        the shortest time.
+        """
+        from .changes import record
+        from .costing import record_movement
+        from .ledger import apply_movement
+
+        if self.movement_type == 'in' and self.unit_cost is None:
+            self.unit_cost = self.item.unit_price
+        if self.location_id is None:
+            self.location = Location.default()
         super().save(*args, **kwargs)
-        
-        # Update the item's stock quantity
+
+        stock, _ = ItemStock.objects.select_for_update().get_or_create(
+            item_id=self.item_id, location_id=self.location_id
+        )
+        before = stock.quantity
+        stock.quantity = apply_movement(before, self.movement_type, self.quantity)
+        stock.save(update_fields=['quantity'])
+
+        # The item total is a cached aggregate of its location rows, moved by
+        # the same delta in a single UPDATE rather than a read-modify-write
+        delta = stock.quantity - before
         item = self.item
-        if self.movement_type == 'in':
-            item.quantity_in_stock += self.quantity
-        elif self.movement_type == 'out':
-            item.quantity_in_stock = max(0, item.quantity_in_stock - self.quantity)
-        elif self.movement_type == 'adjustment':
-            item.quantity_in_stock = max(0, self.quantity)
-        
-        item.save()
+        Item.objects.filter(pk=item.pk).update(
+            quantity_in_stock=Greatest(F('quantity_in_stock') + delta, 0),
+            updated_at=timezone.now(),
+        )
+        item.refresh_from_db()
+        record_movement(self, max(0, item.quantity_in_stock - delta))
+        record(item, 'update')
+
+
+class ArchivedStockMovement(models.Model):
+    """Stock movement moved out of the hot ledger table by ``archive_movements``; keeps its original id"""
+    id = models.BigIntegerField(primary_key=True)
+    item = models.ForeignKey(Item, on_delete=models.CASCADE, related_name='archived_movements')
+    location = models.ForeignKey(Location, on_delete=models.PROTECT, null=True, blank=True, related_name='+')
+    movement_type = models.CharField(max_length=20, choices=StockMovement.MOVEMENT_TYPES)
+    quantity = models.IntegerField()
+    unit_cost = models.DecimalField(max_digits=12, decimal_places=4, null=True, blank=True)
+    reference = models.CharField(max_length=100, blank=True)
+    notes = models.TextField(blank=True)
+    created_at = models.DateTimeField()
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    archived_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['item', 'created_at', 'id'], name='archivedmove_item_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.item.name} - {self.movement_type} ({self.quantity}, archived)"
+
+
+class OpeningBalance(models.Model):
+    """
+    Stock of an item at a location after its archived movements. Every
+    movement of the item before ``as_of`` is archived and every later one is
+    still in ``StockMovement``.
+    """
+    item = models.ForeignKey(Item, on_delete=models.CASCADE, related_name='opening_balances')
+    location = models.ForeignKey(Location, on_delete=models.PROTECT, related_name='+')
+    quantity = models.IntegerField(default=0)
+    as_of = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['item', 'location'], name='openingbalance_item_location_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.item} @ {self.location}: {self.quantity} as of {self.as_of:%Y-%m-%d}"
 
 
 class Order(models.Model):
@@ -141,11 +340,12 @@ class Order(models.Model):
         ('cancelled', 'Cancelled'),
     ]
 
-    order_number = models.CharField(max_length=50, unique=True)
+    order_number = models.CharField(max_length=50, unique=True, blank=True, help_text="Assigned automatically when left blank")
     supplier = models.ForeignKey(Supplier, on_delete=models.CASCADE, related_name='orders')
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
     order_date = models.DateTimeField(auto_now_add=True)
     expected_delivery_date = models.DateField(blank=True, null=True)
+    received_at = models.DateTimeField(blank=True, null=True, help_text="Set when the order is marked received")
     notes = models.TextField(blank=True)
     created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
 
@@ -155,6 +355,16 @@ class Order(models.Model):
     def __str__(self):
         return f"Order {self.order_number} - {self.supplier.name}"
 
+    def save(self, *args, **kwargs):
+        """Assign an order number from the order sequence on first save and stamp receipt"""
+        if not self.order_number:
+            # Outside any transaction of our own, so a pre-allocated block can be used
+            from .sequences import ORDER, next_number
+            self.order_number = next_number(ORDER)
+        if self.status == 'received' and self.received_at is None:
+            self.received_at = timezone.now()
+        super().save(*args, **kwargs)
+
     @property
     def total_amount(self):
         """Calculate total order amount"""
@@ -168,10 +378,16 @@ class OrderItem(models.Model):
     quantity_ordered = models.PositiveIntegerField()
     unit_price = models.DecimalField(max_digits=10, decimal_places=2)
     quantity_received = models.PositiveIntegerField(default=0)
+    received_at = models.DateTimeField(blank=True, null=True, help_text="When goods first arrived against this line")
 
     def __str__(self):
         return f"{self.order.order_number} - {self.item.name}"
 
+    def save(self, *args, **kwargs):
+        if self.quantity_received and self.received_at is None:
+            self.received_at = timezone.now()
+        super().save(*args, **kwargs)
+
     @property
     def subtotal(self):
         """Calculate subtotal for this order item"""
@@ -181,3 +397,163 @@ class OrderItem(models.Model):
     def is_fully_received(self):
         """Check if all ordered quantity has been received"""
         return self.quantity_received >= self.quantity_ordered
+
+
+class ReportSnapshot(models.Model):
+    """Precomputed report datasets served by the reports page and chart endpoints"""
+    data = models.JSONField()
+    build_seconds = models.FloatField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-id']
+        get_latest_by = 'id'
+
+    def __str__(self):
+        return f"Report snapshot v{self.version} ({self.created_at:%Y-%m-%d %H:%M})"
+
+    @property
+    def version(self):
+        """Snapshots are versioned by their insertion order"""
+        return self.id
+
+
+class ReportSeriesPage(models.Model):
+    """One page of a snapshot's per-item chart series, in columnar form"""
+    snapshot = models.ForeignKey(ReportSnapshot, on_delete=models.CASCADE, related_name='series_pages')
+    dataset = models.CharField(max_length=50)
+    number = models.PositiveIntegerField()
+    data = models.JSONField()
+
+    class Meta:
+        ordering = ['snapshot', 'dataset', 'number']
+        constraints = [
+            models.UniqueConstraint(fields=['snapshot', 'dataset', 'number'], name='report_series_page_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.dataset} page {self.number} of snapshot v{self.snapshot_id}"
+
+
+class ItemCost(models.Model):
+    """Running cost balance of an item's stock, maintained as movements are recorded"""
+    item = models.OneToOneField(Item, on_delete=models.CASCADE, primary_key=True, related_name='cost')
+    quantity = models.PositiveIntegerField(default=0)
+    average_cost = models.DecimalField(max_digits=12, decimal_places=4, default=Decimal('0'))
+    fifo_value = models.DecimalField(max_digits=18, decimal_places=4, default=Decimal('0'))
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.item} @ {self.average_cost}"
+
+    @property
+    def average_value(self):
+        """Stock value at weighted average cost"""
+        return self.quantity * self.average_cost
+
+
+class CostLayer(models.Model):
+    """Open receipt of stock at one unit cost, consumed first-in first-out"""
+    item = models.ForeignKey(Item, on_delete=models.CASCADE, related_name='cost_layers')
+    movement = models.ForeignKey(StockMovement, on_delete=models.SET_NULL, null=True, blank=True, related_name='cost_layers')
+    unit_cost = models.DecimalField(max_digits=12, decimal_places=4)
+    quantity_received = models.PositiveIntegerField()
+    quantity_remaining = models.PositiveIntegerField()
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ['created_at', 'id']
+        indexes = [
+            models.Index(fields=['item', 'created_at', 'id'], name='costlayer_item_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.item} - {self.quantity_remaining}/{self.quantity_received} @ {self.unit_cost}"
+
+
+class ChangeLogEntry(models.Model):
+    """Append-only outbox of inventory changes, ordered by sequence number"""
+    ACTIONS = [
+        ('create', 'Created'),
+        ('update', 'Updated'),
+        ('delete', 'Deleted'),
+    ]
+
+    seq = models.BigAutoField(primary_key=True)
+    model = models.CharField(max_length=50)
+    object_id = models.BigIntegerField()
+    action = models.CharField(max_length=10, choices=ACTIONS)
+    payload = models.JSONField(encoder=DjangoJSONEncoder, default=dict)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        ordering = ['seq']
+        verbose_name_plural = "Change log entries"
+        indexes = [
+            models.Index(fields=['model', 'object_id', 'seq'], name='changelog_object_idx'),
+        ]
+
+    def __str__(self):
+        return f"#{self.seq} {self.action} {self.model} {self.object_id}"
+
+
+class ItemClassification(models.Model):
+    """ABC class of an item by stock value and by issue value, from the latest analysis run"""
+    CLASSES = [
+        ('A', 'A'),
+        ('B', 'B'),
+        ('C', 'C'),
+    ]
+
+    item = models.OneToOneField(Item, on_delete=models.CASCADE, primary_key=True, related_name='classification')
+    value_class = models.CharField(max_length=1, choices=CLASSES, db_index=True)
+    usage_class = models.CharField(max_length=1, choices=CLASSES, db_index=True)
+    stock_value = models.DecimalField(max_digits=18, decimal_places=2)
+    usage_value = models.DecimalField(max_digits=18, decimal_places=2)
+    period_days = models.PositiveIntegerField()
+    classified_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.item}: {self.value_class}/{self.usage_class}"
+
+
+class CycleCount(models.Model):
+    """A physical stock count at one location, reconciled against the books on approval"""
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('approved', 'Approved'),
+        ('cancelled', 'Cancelled'),
+    ]
+
+    location = models.ForeignKey(Location, on_delete=models.PROTECT, related_name='cycle_counts')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    notes = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    approved_at = models.DateTimeField(null=True, blank=True)
+    approved_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    adjustment_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"Cycle count #{self.id} at {self.location}"
+
+
+class CycleCountLine(models.Model):
+    """Staged counted quantity for one SKU; ``item`` is resolved from the SKU after loading"""
+    cycle_count = models.ForeignKey(CycleCount, on_delete=models.CASCADE, related_name='lines')
+    sku = models.CharField(max_length=50)
+    item = models.ForeignKey(Item, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    counted_quantity = models.PositiveIntegerField()
+    expected_quantity = models.IntegerField(null=True, blank=True, help_text="Book quantity when the count was approved")
+
+    class Meta:
+        ordering = ['id']
+        constraints = [
+            models.UniqueConstraint(fields=['cycle_count', 'sku'], name='cyclecountline_unique_sku'),
+        ]
+
+    def __str__(self):
+        return f"{self.sku}: {self.counted_quantity}"
@@ -0,0 +1,277 @@
+"""
+Group commit for point-of-sale stock-out events.
+
+Terminals post one sale at a time. Rather than a ``StockMovement.save()``
+transaction per sale, the ingest view hands each event to the process's
+``GroupCommitter`` and waits. A writer thread gathers whatever arrives within
+``INVENTORY_POS_FLUSH_INTERVAL`` seconds (or until ``INVENTORY_POS_BATCH_SIZE``
+events) and posts the batch in one transaction with bulk inserts and one
+stock update per table, then hands each waiting request its own result.
+"""
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from . import changes, costing, sequences, skuindex
+from .caching import bump_data_version
+from .ledger import apply_movement
+from .models import Item, ItemStock, Location, StockMovement
+
+DEFAULT_FLUSH_INTERVAL = 0.005
+DEFAULT_BATCH_SIZE = 500
+RESULT_TIMEOUT = 10
+POS_NOTE = 'Point of sale'
+
+
+def flush_interval():
+    return getattr(settings, 'INVENTORY_POS_FLUSH_INTERVAL', DEFAULT_FLUSH_INTERVAL)
+
+
+def batch_size():
+    return getattr(settings, 'INVENTORY_POS_BATCH_SIZE', DEFAULT_BATCH_SIZE)
+
+
+def group_commit_enabled():
+    return getattr(settings, 'INVENTORY_POS_GROUP_COMMIT', True)
+
+
+def api_token():
+    return getattr(settings, 'INVENTORY_POS_API_TOKEN', None)
+
+
+def parse_event(data, user=None):
+    """
+    Validate one ``{"sku", "quantity", "location", "reference"}`` event and
+    resolve its SKU through the SKU index. Raises ValueError.
+
+    A ``reference`` is the sale's idempotency key: terminals should make it
+    unique (e.g. prefix receipt numbers with the terminal id), and an event
+    resent with the same reference and SKU is not posted twice.
+    """
+    if not isinstance(data, dict):
+        raise ValueError('Each event must be an object')
+    sku = data.get('sku')
+    if not isinstance(sku, str) or not sku.strip():
+        raise ValueError('sku is required')
+    quantity = data.get('quantity', 1)
+    if not isinstance(quantity, int) or isinstance(quantity, bool) or quantity < 1:
+        raise ValueError('quantity must be a positive integer')
+    reference = data.get('reference') or ''
+    if not isinstance(reference, str) or len(reference) > 100:
+        raise ValueError('reference must be a string of at most 100 characters')
+    location = data.get('location') or None
+    if location is not None and not isinstance(location, str):
+        raise ValueError('location must be a location code')
+    entry = skuindex.index.lookup(sku.strip())
+    if entry is None:
+        raise ValueError(f'Unknown SKU "{sku}"')
+    return {
+        'item_id': entry[0],
+        'quantity': quantity,
+        'location': location,
+        'reference': reference,
+        'user_id': user.pk if user is not None and user.is_authenticated else None,
+    }
+
+
+def post_batch(events):
+    """
+    Post an 'out' movement for each event in one transaction.
+
+    Location and item rows are read and locked once, the events are applied
+    in arrival order in memory, and the movements, location rows, item
+    totals, cost layers and change feed are each written in bulk. Returns one
+    result per event: a dict for a posted sale, or a ValueError for an event
+    naming an unknown item or location. An event whose reference and item
+    match a sale already posted (earlier or in this batch) is not posted
+    again; its result describes that sale and has ``duplicate`` set.
+    """
+    results = [None] * len(events)
+    with transaction.atomic():
+        codes = {event['location'] for event in events if event['location']}
+        location_ids = dict(Location.objects.filter(code__in=codes).values_list('code', 'id'))
+        default_id = Location.default().id
+        items = {
+            item_id: [quantity, unit_price]
+            for item_id, quantity, unit_price in Item.objects.select_for_update().filter(
+                id__in={event['item_id'] for event in events}
+            ).values_list('id', 'quantity_in_stock', 'unit_price')
+        }
+        # Read under the item locks, so a resend cannot race its original
+        previous = _posted_sales(events)
+
+        accepted, duplicates, claimed = [], [], {}
+        for index, event in enumerate(events):
+            key = (event['reference'], event['item_id']) if event['reference'] else None
+            location_id = location_ids.get(event['location']) if event['location'] else default_id
+            if event['item_id'] not in items:
+                results[index] = ValueError('Item no longer exists')
+            elif key in previous or key in claimed:
+                duplicates.append((index, key))
+            elif location_id is None:
+                results[index] = ValueError(f'Unknown location "{event["location"]}"')
+            else:
+                accepted.append((index, event, location_id))
+                if key:
+                    claimed[key] = index
+        posted = _post(accepted, items) if accepted else []
+
+    for index, movement, quantity_in_stock, location_quantity in posted:
+        results[index] = {
+            'id': movement.id,
+            'reference': movement.reference,
+            'item_id': movement.item_id,
+            'quantity': movement.quantity,
+            'quantity_in_stock': quantity_in_stock,
+            'location_quantity': location_quantity,
+        }
+    for index, key in duplicates:
+        if key in claimed:
+            results[index] = {**results[claimed[key]], 'duplicate': True}
+        else:
+            results[index] = {**previous[key], 'quantity_in_stock': items[key[1]][0], 'duplicate': True}
+    return results
+
+
+def _posted_sales(events):
+    """``{(reference, item_id): result}`` for point-of-sale movements already posted for ``events``"""
+    keys = {(event['reference'], event['item_id']) for event in events if event['reference']}
+    if not keys:
+        return {}
+    rows = StockMovement.objects.filter(
+        reference__in={reference for reference, _ in keys}, movement_type='out', notes=POS_NOTE
+    ).values_list('id', 'reference', 'item_id', 'quantity')
+    return {
+        (reference, item_id): {'id': movement_id, 'reference': reference, 'item_id': item_id, 'quantity': quantity}
+        for movement_id, reference, item_id, quantity in rows
+        if (reference, item_id) in keys
+    }
+
+
+def _post(accepted, items):
+    """Write the ``accepted`` events; returns ``(index, movement, item total, location quantity)`` per event"""
+    pairs = {(event['item_id'], location_id) for _, event, location_id in accepted}
+    ItemStock.objects.bulk_create(
+        [ItemStock(item_id=item_id, location_id=location_id) for item_id, location_id in pairs],
+        ignore_conflicts=True,
+    )
+    stock = {
+        (row.item_id, row.location_id): row
+        for row in ItemStock.objects.select_for_update().filter(
+            item_id__in={item_id for item_id, _ in pairs}, location_id__in={location_id for _, location_id in pairs}
+        )
+        if (row.item_id, row.location_id) in pairs
+    }
+
+    references = iter(sequences.allocate_numbers(
+        sequences.MOVEMENT, sum(1 for _, event, _ in accepted if not event['reference'])
+    ))
+    movements, adjustments, posted = [], [], []
+    for index, event, location_id in accepted:
+        item_id = event['item_id']
+        row = stock[(item_id, location_id)]
+        before = row.quantity
+        row.quantity = apply_movement(before, 'out', event['quantity'])
+        totals = items[item_id]
+        total_before = totals[0]
+        totals[0] = max(0, total_before + row.quantity - before)
+
+        movement = StockMovement(
+            item_id=item_id, location_id=location_id, movement_type='out', quantity=event['quantity'],
+            reference=event['reference'] or next(references), notes=POS_NOTE,
+            created_by_id=event['user_id'],
+        )
+        movements.append(movement)
+        adjustments.append((movement, total_before, totals[0], totals[1]))
+        posted.append((index, movement, totals[0], row.quantity))
+
+    StockMovement.objects.bulk_create(movements)
+    ItemStock.objects.bulk_update(stock.values(), ['quantity'])
+    now = timezone.now()
+    touched = {movement.item_id for movement in movements}
+    Item.objects.bulk_update(
+        [Item(id=item_id, quantity_in_stock=items[item_id][0], updated_at=now) for item_id in touched],
+        ['quantity_in_stock', 'updated_at'],
+    )
+    costing.record_adjustments(adjustments)
+    changes.record_many(movements, 'create')
+    changes.record_many(Item.objects.filter(id__in=touched), 'update')
+
+    # Bulk writes skip the model signals that normally invalidate cached pages
+    bump_data_version()
+    transaction.on_commit(bump_data_version)
+    return posted
+
+
+class GroupCommitter:
+    """Queues events from request threads and posts them in batches from one writer thread"""
+
+    def __init__(self):
+        self.queue = queue.Queue()
+        self.lock = threading.Lock()
+        self.batches = 0
+        self.events = 0
+        self._thread = None
+
+    def submit(self, event):
+        """Queue ``event`` and return a Future resolved once its batch commits"""
+        future = Future()
+        if not group_commit_enabled():
+            self.flush([(event, future)])
+            return future
+        with self.lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='inventory-pos-writer', daemon=True)
+                self._thread.start()
+        self.queue.put((event, future))
+        return future
+
+    def collect(self):
+        """Block for the first event, then take more until the interval ends or the batch is full"""
+        batch = [self.queue.get()]
+        deadline = time.monotonic() + flush_interval()
+        limit = batch_size()
+        while len(batch) < limit:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def flush(self, batch):
+        try:
+            results = post_batch([event for event, _ in batch])
+        except Exception as exc:
+            if threading.current_thread() is self._thread:
+                # A failed transaction may leave the writer's connection unusable
+                connection.close()
+            if len(batch) > 1:
+                # Post the events one at a time so an event that breaks the
+                # batch fails only its own request, not other terminals'
+                for entry in batch:
+                    self.flush([entry])
+                return
+            batch[0][1].set_exception(exc)
+            return
+        self.batches += 1
+        self.events += len(batch)
+        for (_, future), result in zip(batch, results):
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    def _run(self):
+        while True:
+            self.flush(self.collect())
+
+
+committer = GroupCommitter()
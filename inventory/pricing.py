@@ -0,0 +1,137 @@
+"""
+Item price history and bulk repricing.
+
+Every change to an item's unit or selling price appends an ``ItemPrice`` row,
+so prices (and margins) can be read as of any date: the latest row per item
+at or before the date is one probe of the (item, effective_at, id) index.
+``reprice`` changes the prices of a whole category or supplier with one
+set-based UPDATE and bulk-inserts the history rows in the same transaction.
+"""
+import datetime
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import DecimalField, ExpressionWrapper, F, OuterRef, Subquery, Value
+from django.db.models.functions import Greatest, Round
+from django.utils import timezone
+
+from . import changes, skuindex
+from .caching import bump_data_version
+from .models import Item, ItemPrice
+
+PRICE_FIELDS = ('unit_price', 'selling_price')
+PRICE_FIELD = DecimalField(max_digits=10, decimal_places=2)
+CENTS = Decimal('0.01')
+
+
+def as_of_datetime(value):
+    """The end of ``value``'s day if it is a date, so prices set that day count"""
+    if isinstance(value, datetime.datetime):
+        return value
+    return timezone.make_aware(datetime.datetime.combine(value, datetime.time.max))
+
+
+def _latest(when):
+    return ItemPrice.objects.filter(item=OuterRef('pk'), effective_at__lte=when).order_by('-effective_at', '-id')
+
+
+def with_prices_as_of(items, when):
+    """
+    ``items`` annotated with ``price_unit`` and ``price_selling`` as they were
+    at ``when`` (a date or datetime); None for items without a price by then
+    """
+    latest = _latest(as_of_datetime(when))
+    return items.annotate(
+        price_unit=Subquery(latest.values('unit_price')[:1], output_field=PRICE_FIELD),
+        price_selling=Subquery(latest.values('selling_price')[:1], output_field=PRICE_FIELD),
+    )
+
+
+def price_as_of(item, when):
+    """``item``'s ``ItemPrice`` in effect at ``when``, or None"""
+    return ItemPrice.objects.filter(item=item, effective_at__lte=as_of_datetime(when)).first()
+
+
+def margin_data_as_of(when):
+    """``price_margin`` chart data (see ``snapshots``) from the prices in effect at ``when``"""
+    data = {'items': [], 'selling_prices': [], 'unit_prices': [], 'margins': []}
+    rows = with_prices_as_of(Item.objects.order_by('id'), when).filter(price_unit__isnull=False).values_list(
+        'name', 'price_unit', 'price_selling'
+    )
+    for name, unit_price, selling_price in rows:
+        data['items'].append(name)
+        data['selling_prices'].append(float(selling_price))
+        data['unit_prices'].append(float(unit_price))
+        data['margins'].append(float(selling_price - unit_price))
+    return data
+
+
+def record_price_change(sender, instance, created, raw=False, **kwargs):
+    """Signal receiver for item saves: append a history row when either price changed"""
+    if raw:
+        return
+    update_fields = kwargs.get('update_fields')
+    if update_fields is not None and not set(update_fields) & set(PRICE_FIELDS):
+        return
+    prices = tuple(Decimal(str(getattr(instance, name))).quantize(CENTS) for name in PRICE_FIELDS)
+    if not created:
+        latest = ItemPrice.objects.filter(item=instance).values_list('unit_price', 'selling_price').first()
+        if latest == prices:
+            return
+    ItemPrice.objects.create(item=instance, unit_price=prices[0], selling_price=prices[1])
+
+
+def _adjusted(field, percent, amount):
+    if percent is not None:
+        change = F(field) * Value(1 + Decimal(percent) / 100)
+    else:
+        change = F(field) + Value(Decimal(amount))
+    return Greatest(Round(ExpressionWrapper(change, output_field=PRICE_FIELD), 2), Value(Decimal('0')))
+
+
+@transaction.atomic
+def reprice(field='selling_price', percent=None, amount=None, category=None, supplier=None,
+            user=None, reason='', batch_size=1000):
+    """
+    Change ``field`` (or both prices for ``field='both'``) of every active
+    item in ``category`` and/or from ``supplier`` by ``percent`` or by an
+    absolute ``amount``, rounded to cents and never below zero. Returns the
+    number of items repriced. Raises ValueError for an invalid request.
+    """
+    fields = PRICE_FIELDS if field == 'both' else (field,)
+    if not set(fields) <= set(PRICE_FIELDS):
+        raise ValueError(f'Unknown price field "{field}"')
+    if (percent is None) == (amount is None):
+        raise ValueError('Give either a percentage or an amount')
+    if category is None and supplier is None:
+        raise ValueError('Choose a category or a supplier to reprice')
+
+    items = Item.objects.filter(is_active=True)
+    if category is not None:
+        items = items.filter(category=category)
+    if supplier is not None:
+        items = items.filter(supplier=supplier)
+
+    now = timezone.now()
+    repriced = items.update(
+        updated_at=now, **{name: _adjusted(name, percent, amount) for name in fields}
+    )
+    if not repriced:
+        return 0
+
+    history = (
+        ItemPrice(item_id=item_id, unit_price=unit_price, selling_price=selling_price, effective_at=now,
+                  reason=reason, created_by=user)
+        for item_id, unit_price, selling_price in items.order_by('id').values_list('id', *PRICE_FIELDS).iterator(
+            chunk_size=batch_size
+        )
+    )
+    ItemPrice.objects.bulk_create(history, batch_size=batch_size)
+    changes.record_many(items, 'update')
+
+    # A queryset update skips the signals that invalidate cached pages and the SKU index
+    bump_data_version()
+    transaction.on_commit(bump_data_version)
+    skuindex.invalidate()
+    transaction.on_commit(skuindex.invalidate)
+    return repriced
@@ -0,0 +1,191 @@
+"""
+On-demand profiling of slow views.
+
+Staff can profile a single request by adding ``?_profile=1`` (or an
+``X-Profile: 1`` header). The view runs under cProfile and the response is
+replaced by a plain-text report of the top functions, tagged with the
+route name and the SQL queries issued, so time spent in the ORM, templates
+and Python code can be told apart. ``_profile=store`` writes the pstats
+file to ``INVENTORY_PROFILE_DIR`` instead and returns the normal page.
+
+Separately, ``INVENTORY_PROFILE_SAMPLE_RATE`` picks a fraction of all
+requests whose threads are sampled by a background stack sampler; the
+aggregated stacks per route are served to staff in collapsed ("flame graph")
+format by the ``profile_samples`` view.
+"""
+import cProfile
+import io
+import os
+import pstats
+import random
+import sys
+import threading
+import time
+from collections import Counter
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.db import connection
+from django.http import HttpResponse
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.utils.deprecation import MiddlewareMixin
+
+PROFILE_PARAM = '_profile'
+PROFILE_HEADER = 'HTTP_X_PROFILE'
+SORT_KEYS = ('cumulative', 'tottime', 'calls')
+TOP_FUNCTIONS = 40
+MAX_STACK_DEPTH = 64
+
+
+def sample_rate():
+    return getattr(settings, 'INVENTORY_PROFILE_SAMPLE_RATE', 0.0)
+
+
+def sample_interval():
+    return getattr(settings, 'INVENTORY_PROFILE_SAMPLE_INTERVAL', 0.005)
+
+
+def profile_dir():
+    return getattr(settings, 'INVENTORY_PROFILE_DIR', None)
+
+
+def route_name(request):
+    match = getattr(request, 'resolver_match', None)
+    return match.view_name if match and match.view_name else request.path
+
+
+def _collapse(frame):
+    """'module:function;module:function;...' from the outermost frame inwards"""
+    names = []
+    while frame is not None and len(names) < MAX_STACK_DEPTH:
+        code = frame.f_code
+        names.append(f"{frame.f_globals.get('__name__', '?')}:{code.co_name}")
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+
+class StackSampler:
+    """
+    Samples the stacks of registered threads from one daemon thread.
+
+    Sampling costs nothing on the request thread itself; stacks are
+    attributed to a route when its request finishes.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.active = {}
+        self.stacks = Counter()
+        self.requests = Counter()
+        self._thread = None
+
+    def start(self):
+        with self.lock:
+            self.active[threading.get_ident()] = Counter()
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='inventory-stack-sampler', daemon=True)
+                self._thread.start()
+
+    def stop(self, route):
+        with self.lock:
+            samples = self.active.pop(threading.get_ident(), Counter())
+            self.requests[route] += 1
+            for stack, count in samples.items():
+                self.stacks[f'{route};{stack}'] += count
+
+    def collapsed(self):
+        """Aggregated stacks as 'route;frame;frame count' lines, heaviest first"""
+        with self.lock:
+            return [f'{stack} {count}' for stack, count in self.stacks.most_common()]
+
+    def reset(self):
+        with self.lock:
+            self.stacks.clear()
+            self.requests.clear()
+
+    def _run(self):
+        while True:
+            time.sleep(sample_interval())
+            with self.lock:
+                if not self.active:
+                    continue
+                frames = sys._current_frames()
+                for thread_id, samples in self.active.items():
+                    frame = frames.get(thread_id)
+                    if frame is not None:
+                        samples[_collapse(frame)] += 1
+
+
+sampler = StackSampler()
+
+
+def profile_report(profiler, route, queries, elapsed, sort='cumulative'):
+    out = io.StringIO()
+    out.write(f'Route: {route}\n')
+    out.write(f'Wall time: {elapsed * 1000:.1f} ms\n')
+    out.write(f'SQL queries: {len(queries)} '
+              f'({sum(float(q["time"]) for q in queries) * 1000:.1f} ms)\n\n')
+    stats = pstats.Stats(profiler, stream=out)
+    stats.sort_stats(sort).print_stats(TOP_FUNCTIONS)
+    return out.getvalue()
+
+
+class ProfilerMiddleware(MiddlewareMixin):
+    """
+    Runs the view under cProfile for staff requests that ask for it, and under
+    the stack sampler for a sampled fraction of all requests.
+
+    The view is called from ``process_view``, so list this middleware last:
+    view middleware after it would be skipped for profiled requests. Async
+    views are never profiled.
+    """
+
+    def requested_mode(self, request):
+        mode = request.GET.get(PROFILE_PARAM) or request.META.get(PROFILE_HEADER)
+        if not mode:
+            return None
+        user = getattr(request, 'user', None)
+        if user is None or not user.is_staff:
+            return None
+        return mode
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if iscoroutinefunction(view_func):
+            return None
+        mode = self.requested_mode(request)
+        if mode:
+            return self.profile(request, mode, view_func, view_args, view_kwargs)
+        rate = sample_rate()
+        if rate and random.random() < rate:
+            sampler.start()
+            try:
+                return view_func(request, *view_args, **view_kwargs)
+            finally:
+                sampler.stop(route_name(request))
+        return None
+
+    def profile(self, request, mode, view_func, view_args, view_kwargs):
+        profiler = cProfile.Profile()
+        started = time.perf_counter()
+        with CaptureQueriesContext(connection) as queries:
+            profiler.enable()
+            try:
+                response = view_func(request, *view_args, **view_kwargs)
+            finally:
+                profiler.disable()
+        elapsed = time.perf_counter() - started
+        route = route_name(request)
+
+        if mode == 'store':
+            directory = profile_dir()
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+                filename = f"{route.replace(':', '-')}-{timezone.now():%Y%m%d-%H%M%S-%f}.prof"
+                profiler.dump_stats(os.path.join(directory, filename))
+                response['X-Profile-File'] = filename
+            return response
+
+        sort = mode if mode in SORT_KEYS else 'cumulative'
+        report = profile_report(profiler, route, queries.captured_queries, elapsed, sort)
+        return HttpResponse(report, content_type='text/plain; charset=utf-8')
@@ -0,0 +1,72 @@
+"""
+Read-through cache of reference data: the category and supplier lists.
+
+Filters, dropdowns and reports all need these small tables on almost every
+request. Each list is read once into the cache under a version token, and
+category and supplier saves and deletes replace the token (again on commit,
+like the data version). With a shared cache backend every process reads the
+new list on its next lookup. With a per-process cache, such as the default
+LocMemCache, only the writing process does; the others keep their lists
+until the token expires, so both expire after ``INVENTORY_REFDATA_TIMEOUT``
+seconds to bound that staleness. Unlike the data version, stock movements do
+not invalidate it. Bulk writes to categories or suppliers must call
+``invalidate()``.
+"""
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import Category, Supplier
+
+VERSION_KEY = 'inventory:refdata-version'
+
+
+def cache_timeout():
+    return getattr(settings, 'INVENTORY_REFDATA_TIMEOUT', 60)
+
+
+def _version():
+    # A random token rather than a counter, so an evicted key can never come
+    # back with a value some process has already cached lists under
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        cache.add(VERSION_KEY, uuid.uuid4().hex, timeout=cache_timeout())
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+def invalidate():
+    cache.set(VERSION_KEY, uuid.uuid4().hex, timeout=cache_timeout())
+
+
+def invalidate_reference_data(sender, **kwargs):
+    """Signal receiver for category and supplier saves and deletes"""
+    invalidate()
+    transaction.on_commit(invalidate)
+
+
+def _rows(model):
+    key = f'inventory:refdata:{model._meta.model_name}:{_version()}'
+    return cache.get_or_set(key, lambda: list(model.objects.order_by('name', 'id').values('id', 'name')), timeout=cache_timeout())
+
+
+def categories():
+    """``[{'id', 'name'}, ...]`` for every category, by name"""
+    return _rows(Category)
+
+
+def suppliers():
+    """``[{'id', 'name'}, ...]`` for every supplier, by name"""
+    return _rows(Supplier)
+
+
+def category_names():
+    """``{id: name}`` for every category"""
+    return {row['id']: row['name'] for row in categories()}
+
+
+def supplier_names():
+    """``{id: name}`` for every supplier"""
+    return {row['id']: row['name'] for row in suppliers()}
@@ -0,0 +1,159 @@
+"""Reorder-point planning and draft purchase order generation"""
+import datetime
+
+import numpy as np
+from django.db import transaction
+from django.db.models import F, Sum
+from django.utils import timezone
+
+from . import analytics, sequences
+from .models import Item, StockMovement, Order, OrderItem
+
+DEFAULT_LOOKBACK_DAYS = 30
+DEFAULT_LEAD_TIME_DAYS = 7
+DEFAULT_SAFETY_DAYS = 3
+DEFAULT_COVER_DAYS = 14
+
+OPEN_ORDER_STATUSES = ['pending', 'approved', 'ordered']
+
+
+def _grouped_totals(ids, rows):
+    """Scatter (item_id, total) rows onto the positions of the sorted ``ids`` array"""
+    totals = np.zeros(len(ids), dtype=np.float64)
+    if rows:
+        keys, values = np.array(rows, dtype=np.float64).T
+        positions = np.searchsorted(ids, keys.astype(np.int64))
+        totals[positions] = values
+    return totals
+
+
+def _lead_times(supplier_ids, fallback):
+    """Whole days of measured lead time for each entry of ``supplier_ids``, else ``fallback``"""
+    measured = {
+        supplier_id: stats['lead_time_days']
+        for supplier_id, stats in analytics.supplier_performance().items()
+        if stats['lead_time_days'] is not None
+    }
+    lead_times = np.full(len(supplier_ids), fallback, dtype=np.int64)
+    if measured:
+        keys = np.array(sorted(measured), dtype=np.int64)
+        days = np.ceil([measured[key] for key in keys]).astype(np.int64)
+        positions = np.searchsorted(keys, supplier_ids).clip(max=len(keys) - 1)
+        known = keys[positions] == supplier_ids
+        lead_times[known] = days[positions[known]]
+    return lead_times
+
+
+def plan_reorders(lookback_days=DEFAULT_LOOKBACK_DAYS, lead_time_days=DEFAULT_LEAD_TIME_DAYS,
+                  safety_days=DEFAULT_SAFETY_DAYS, cover_days=DEFAULT_COVER_DAYS):
+    """
+    Compute reorder suggestions for every active item with a supplier.
+
+    Consumption is the daily average of 'out' movements over the lookback
+    window. An item is due when its inventory position (on hand plus still
+    open on order) is at or below its reorder point, which is the larger of
+    ``minimum_stock_level`` and lead-time demand plus safety stock. Lead time
+    is the supplier's measured average (see
+    ``analytics.supplier_performance``), rounded up to whole days;
+    ``lead_time_days`` applies to suppliers without received orders. The
+    suggested quantity tops the position up to the reorder point plus
+    ``cover_days`` of demand (at least one unit above the reorder point).
+
+    Returns a dict of parallel NumPy arrays holding only the items that
+    need reordering, ordered by item id.
+    """
+    rows = list(
+        Item.objects.filter(is_active=True, supplier__isnull=False)
+        .order_by('id')
+        .values_list('id', 'supplier_id', 'quantity_in_stock', 'minimum_stock_level', 'unit_price')
+    )
+    if not rows:
+        empty = np.array([], dtype=np.int64)
+        return {
+            'item_id': empty, 'supplier_id': empty, 'on_hand': empty, 'on_order': empty,
+            'daily_usage': empty.astype(np.float64), 'lead_time_days': empty, 'reorder_point': empty,
+            'suggested_quantity': empty, 'unit_price': np.array([], dtype=object),
+        }
+
+    ids, supplier_ids, on_hand, minimum = (
+        np.array(column, dtype=np.int64) for column in list(zip(*rows))[:4]
+    )
+    unit_prices = np.array([row[4] for row in rows], dtype=object)
+
+    since = timezone.now() - datetime.timedelta(days=lookback_days)
+    consumed = _grouped_totals(ids, list(
+        StockMovement.objects.filter(
+            movement_type='out', created_at__gte=since,
+            item__is_active=True, item__supplier__isnull=False,
+        ).values('item_id').annotate(total=Sum('quantity')).values_list('item_id', 'total')
+    ))
+    on_order = _grouped_totals(ids, list(
+        OrderItem.objects.filter(
+            order__status__in=OPEN_ORDER_STATUSES,
+            item__is_active=True, item__supplier__isnull=False,
+        ).values('item_id').annotate(
+            total=Sum(F('quantity_ordered') - F('quantity_received'))
+        ).values_list('item_id', 'total')
+    )).clip(min=0).astype(np.int64)
+
+    daily_usage = consumed / max(lookback_days, 1)
+    lead_times = _lead_times(supplier_ids, lead_time_days)
+    reorder_point = np.maximum(
+        minimum, np.ceil(daily_usage * (lead_times + safety_days)).astype(np.int64)
+    )
+    position = on_hand + on_order
+    # Always land strictly above the reorder point so the item stops being due
+    target = reorder_point + np.maximum(np.ceil(daily_usage * cover_days).astype(np.int64), 1)
+    suggested = target - position
+
+    due = (position <= reorder_point) & (reorder_point > 0)
+    return {
+        'item_id': ids[due],
+        'supplier_id': supplier_ids[due],
+        'on_hand': on_hand[due],
+        'on_order': on_order[due],
+        'daily_usage': daily_usage[due],
+        'lead_time_days': lead_times[due],
+        'reorder_point': reorder_point[due],
+        'suggested_quantity': suggested[due],
+        'unit_price': unit_prices[due],
+    }
+
+
+@transaction.atomic
+def create_draft_orders(plan, user=None, batch_size=1000):
+    """
+    Turn a plan from ``plan_reorders`` into pending orders, one per supplier.
+
+    Orders and their lines are inserted with ``bulk_create``; returns the
+    list of created orders.
+    """
+    if not len(plan['item_id']):
+        return []
+
+    order_positions = np.argsort(plan['supplier_id'], kind='stable')
+    suppliers, starts = np.unique(plan['supplier_id'][order_positions], return_index=True)
+
+    orders = Order.objects.bulk_create([
+        Order(
+            order_number=number,
+            supplier_id=int(supplier_id),
+            status='pending',
+            notes='Draft generated from reorder points',
+            created_by=user,
+        )
+        for supplier_id, number in zip(suppliers, sequences.allocate_numbers(sequences.ORDER, len(suppliers)))
+    ], batch_size=batch_size)
+
+    bounds = list(starts[1:]) + [len(order_positions)]
+    order_items = []
+    for order, start, end in zip(orders, starts, bounds):
+        for position in order_positions[start:end]:
+            order_items.append(OrderItem(
+                order=order,
+                item_id=int(plan['item_id'][position]),
+                quantity_ordered=int(plan['suggested_quantity'][position]),
+                unit_price=plan['unit_price'][position],
+            ))
+    OrderItem.objects.bulk_create(order_items, batch_size=batch_size)
+    return orders
@@ -0,0 +1,57 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+
+from .caching import bump_data_version
+from . import changes, pricing, refdata, skuindex
+from .costing import sync_item
+from .locations import sync_item_locations
+from .models import Category, Supplier, Location, Item, ItemStock, StockMovement, Order, OrderItem
+
+VERSIONED_MODELS = (Category, Supplier, Location, Item, ItemStock, StockMovement, Order, OrderItem)
+
+
+def invalidate_data_version(sender, **kwargs):
+    """
+    Bump the data version whenever inventory data changes, and again once the
+    transaction commits so nothing rendered from uncommitted reads survives
+    """
+    bump_data_version()
+    transaction.on_commit(bump_data_version)
+
+
+def sync_item_stock(sender, instance, raw=False, **kwargs):
+    """Post stock levels edited outside the ledger as movements and keep cost layers in step"""
+    if not raw:
+        sync_item_locations(instance)
+        sync_item(instance)
+
+
+def record_save(sender, instance, created, raw=False, **kwargs):
+    """Append saved items, movements and orders to the change feed"""
+    if not raw:
+        changes.record(instance, 'create' if created else 'update')
+
+
+def record_delete(sender, instance, **kwargs):
+    changes.record(instance, 'delete')
+
+
+for model in (Item, StockMovement, Order):
+    post_save.connect(record_save, sender=model, dispatch_uid=f'change-feed-save-{model.__name__}')
+    post_delete.connect(record_delete, sender=model, dispatch_uid=f'change-feed-delete-{model.__name__}')
+
+# After the item's own change entry, so the feed has the item before its movements
+post_save.connect(sync_item_stock, sender=Item, dispatch_uid='item-stock-sync')
+
+for model in (Category, Supplier):
+    post_save.connect(refdata.invalidate_reference_data, sender=model, dispatch_uid=f'refdata-save-{model.__name__}')
+    post_delete.connect(refdata.invalidate_reference_data, sender=model, dispatch_uid=f'refdata-delete-{model.__name__}')
+
+post_save.connect(pricing.record_price_change, sender=Item, dispatch_uid='item-price-history')
+
+post_save.connect(skuindex.invalidate_item, sender=Item, dispatch_uid='sku-index-save')
+post_delete.connect(skuindex.invalidate_item, sender=Item, dispatch_uid='sku-index-delete')
+
+for model in VERSIONED_MODELS:
+    post_save.connect(invalidate_data_version, sender=model, dispatch_uid=f'data-version-save-{model.__name__}')
+    post_delete.connect(invalidate_data_version, sender=model, dispatch_uid=f'data-version-delete-{model.__name__}')
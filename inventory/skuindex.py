@@ -0,0 +1,141 @@
+"""
+In-memory SKU index for barcode lookups.
+
+Each process keeps a bounded map of SKU -> (item id, name, selling price),
+filled with the active catalogue on first use and topped up one SKU at a
+time on misses (unknown SKUs are remembered too). Item saves and deletes clear
+the index in the writing process. Every other process catches up from the
+change feed, which item writes append to in the same transaction: at most
+once per sync interval a lookup applies the item entries past the index's
+position, so changes show everywhere within that interval whatever the
+cache backend. Bulk writes must record their changes (``changes.record_many``)
+and should call ``invalidate()``.
+"""
+import threading
+import time
+from collections import OrderedDict
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+
+from . import changes
+from .models import ChangeLogEntry, Item
+
+DEFAULT_SIZE = 50000
+MISSING = None
+# More item changes than this since the last sync reload the index instead
+SYNC_BATCH = 1000
+
+
+def index_size():
+    return getattr(settings, 'INVENTORY_SKU_INDEX_SIZE', DEFAULT_SIZE)
+
+
+def sync_interval():
+    return getattr(settings, 'INVENTORY_SKU_INDEX_SYNC_INTERVAL', 1.0)
+
+
+def live_stock():
+    return getattr(settings, 'INVENTORY_SKU_LOOKUP_LIVE_STOCK', True)
+
+
+def invalidate():
+    """Make this process's index reload; other processes follow the change feed"""
+    index.clear()
+
+
+class SkuIndex:
+    """Least-recently-used map of SKU to ``(id, name, price)``, or ``MISSING`` for unknown SKUs"""
+
+    def __init__(self, max_size=None):
+        self.max_size = max_size
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        # item id -> SKU of its entry, to drop the old SKU when one changes
+        self.skus = {}
+        self.position = 0
+        self.synced_at = 0.0
+        self.loaded = False
+
+    def size(self):
+        return self.max_size or index_size()
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.skus.clear()
+            self.loaded = False
+
+    def _put(self, sku, entry):
+        self.entries[sku] = entry
+        self.entries.move_to_end(sku)
+        if entry is not MISSING:
+            self.skus[entry[0]] = sku
+        while len(self.entries) > self.size():
+            _, evicted = self.entries.popitem(last=False)
+            if evicted is not MISSING:
+                self.skus.pop(evicted[0], None)
+
+    def _rows(self, qs):
+        return qs.filter(is_active=True).values_list('sku', 'id', 'name', 'selling_price')
+
+    def load(self):
+        """Fill the index with up to ``size()`` active items in one query"""
+        # Taken before the rows, so changes committed in between are replayed, not missed
+        position = ChangeLogEntry.objects.order_by('-seq').values_list('seq', flat=True).first() or 0
+        rows = self._rows(Item.objects.order_by('id'))[:self.size()]
+        with self.lock:
+            self.entries.clear()
+            self.skus.clear()
+            for sku, item_id, name, price in rows.iterator(chunk_size=5000):
+                self.entries[sku] = (item_id, name, price)
+                self.skus[item_id] = sku
+            self.position = position
+            self.synced_at = time.monotonic()
+            self.loaded = True
+
+    def sync(self):
+        """Apply item changes from the feed since the last load or sync"""
+        entries = list(ChangeLogEntry.objects.filter(
+            seq__gt=self.position, model='item'
+        ).order_by('seq').values_list('seq', 'object_id', 'action', 'payload')[:SYNC_BATCH + 1])
+        if len(entries) > SYNC_BATCH or self.position < changes.expired_through():
+            # Cheaper to start over, and required once compaction has removed entries we needed
+            self.load()
+            return
+        with self.lock:
+            for seq, item_id, action, payload in entries:
+                old_sku = self.skus.pop(item_id, None)
+                if old_sku is not None:
+                    self.entries.pop(old_sku, None)
+                if action != 'delete' and payload.get('is_active', True):
+                    self._put(payload['sku'], (item_id, payload['name'], Decimal(payload['selling_price'])))
+                self.position = seq
+            self.synced_at = time.monotonic()
+
+    def lookup(self, sku):
+        """``(id, name, price)`` of the active item with ``sku``, or None"""
+        if not self.loaded:
+            self.load()
+        elif time.monotonic() - self.synced_at >= sync_interval():
+            self.sync()
+        with self.lock:
+            if sku in self.entries:
+                self.entries.move_to_end(sku)
+                return self.entries[sku]
+        row = self._rows(Item.objects.filter(sku=sku).order_by('id')).first()
+        entry = row[1:] if row else MISSING
+        with self.lock:
+            self._put(sku, entry)
+        return entry
+
+
+index = SkuIndex()
+
+
+def invalidate_item(sender, instance, raw=False, **kwargs):
+    """Signal receiver for item saves and deletes; runs again on commit, like the data version"""
+    if not raw:
+        invalidate()
+        transaction.on_commit(invalidate)
@@ -0,0 +1,211 @@
+"""
+Build and serve precomputed report snapshots.
+
+A snapshot's ``data`` holds the datasets whose size does not grow with the
+catalogue (category totals, low-stock and recent-movement lists, the
+movement time series). The per-item series (stock by item, price margins)
+are stored apart in ``ReportSeriesPage`` rows of ``SERIES_PAGE_SIZE`` items,
+so a request decodes only the page it shows.
+"""
+import datetime
+import time
+
+from django.db import transaction
+from django.db.models import Count, F
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from . import costing, refdata
+from .models import Item, StockMovement, ReportSeriesPage, ReportSnapshot
+
+LOW_STOCK_LIMIT = 50
+RECENT_MOVEMENTS_LIMIT = 20
+TIME_SERIES_DAYS = 30
+DEFAULT_KEEP = 10
+SERIES_PAGE_SIZE = 500
+SERIES = ('stock_by_item', 'price_margin')
+
+
+def _category_values():
+    """
+    Stock value per category, valued by the costing method like the
+    dashboard total, with empty categories (from the cached names) at zero
+    """
+    values = dict.fromkeys((row['name'] for row in refdata.categories()), 0.0)
+    for row in costing.category_values():
+        values[row['name']] = float(row['total_value'] or 0)
+    return [
+        {'name': name, 'total_value': total}
+        for name, total in sorted(values.items(), key=lambda pair: -pair[1])
+    ]
+
+
+def _low_stock():
+    qs = Item.objects.filter(
+        quantity_in_stock__lte=F('minimum_stock_level'),
+        is_active=True
+    )
+    rows = qs.values(
+        'id', 'name', 'sku', 'quantity_in_stock', 'minimum_stock_level',
+        category_name=F('category__name'),
+    )[:LOW_STOCK_LIMIT]
+    return qs.count(), list(rows)
+
+
+def _recent_movements():
+    qs = StockMovement.objects.values(
+        'created_at', 'movement_type', 'quantity', 'reference',
+        item_name=F('item__name'),
+        item_sku=F('item__sku'),
+        created_by_username=F('created_by__username'),
+    )[:RECENT_MOVEMENTS_LIMIT]
+    return [{**m, 'created_at': m['created_at'].isoformat()} for m in qs]
+
+
+def _item_series():
+    """Stock by item and price margins, as columns, from one scan of the item table"""
+    stock = []
+    price_margin = {'items': [], 'selling_prices': [], 'unit_prices': [], 'margins': []}
+
+    rows = Item.objects.order_by('id').values_list(
+        'name', 'is_active', 'quantity_in_stock', 'unit_price', 'selling_price'
+    )
+    for name, is_active, quantity, unit_price, selling_price in rows:
+        if is_active:
+            stock.append((name, quantity))
+        price_margin['items'].append(name)
+        price_margin['selling_prices'].append(float(selling_price))
+        price_margin['unit_prices'].append(float(unit_price))
+        price_margin['margins'].append(float(selling_price - unit_price))
+
+    stock.sort(key=lambda row: -row[1])
+    stock_by_item = {
+        'name': [name for name, _ in stock],
+        'quantity_in_stock': [quantity for _, quantity in stock],
+    }
+    return {'stock_by_item': stock_by_item, 'price_margin': price_margin}
+
+
+def _pages(columns, size):
+    """Split columnar data into pages of ``size`` rows; always at least one page"""
+    length = len(next(iter(columns.values())))
+    return [
+        {field: values[start:start + size] for field, values in columns.items()}
+        for start in range(0, max(length, 1), size)
+    ]
+
+
+def _movements_time_series():
+    since = timezone.now() - datetime.timedelta(days=TIME_SERIES_DAYS)
+    movements = StockMovement.objects.filter(
+        created_at__gte=since
+    ).annotate(
+        date=TruncDate('created_at')
+    ).values('date', 'movement_type').annotate(
+        total=Count('id')
+    ).order_by('date')
+
+    data_by_date = {}
+    for m in movements:
+        counts = data_by_date.setdefault(m['date'].strftime('%Y-%m-%d'), {'in': 0, 'out': 0})
+        if m['movement_type'] in counts:
+            counts[m['movement_type']] = m['total']
+
+    return {
+        'dates': list(data_by_date),
+        'in_movements': [counts['in'] for counts in data_by_date.values()],
+        'out_movements': [counts['out'] for counts in data_by_date.values()],
+    }
+
+
+def build_report_data():
+    """
+    Compute every dataset shown on the reports page: ``(data, series)``
+    where ``series`` holds the per-item datasets as columns
+    """
+    low_stock_count, low_stock_items = _low_stock()
+    stock_value_by_category = _category_values()
+    data = {
+        'category_stock_value': [row for row in stock_value_by_category if row['total_value'] > 0],
+        'low_stock_count': low_stock_count,
+        'low_stock_items': low_stock_items,
+        'recent_movements': _recent_movements(),
+        'stock_value_by_category': stock_value_by_category,
+        'movements_time_series': _movements_time_series(),
+    }
+    return data, _item_series()
+
+
+def _columns(rows, fields):
+    return {field: [row[field] for row in rows] for field in fields}
+
+
+# Chart datasets in columnar form: one list per field instead of one object per row
+CHART_DATASETS = {
+    'stock_value_by_category': lambda data: _columns(data['stock_value_by_category'], ('name', 'total_value')),
+    'movements_time_series': lambda data: data['movements_time_series'],
+}
+
+
+def series_pages(snapshot, names, number=1):
+    """
+    ``{name: (page data, num_pages)}`` for page ``number`` of each per-item
+    series in ``names``, in one query; out-of-range pages give the last one
+    """
+    pages = snapshot.data['series_pages']
+    wanted = {name: min(max(number, 1), pages[name]) for name in names}
+    rows = ReportSeriesPage.objects.filter(snapshot=snapshot, dataset__in=list(wanted)).filter(
+        number__in=set(wanted.values())
+    ).values_list('dataset', 'number', 'data')
+    found = {dataset: data for dataset, page, data in rows if wanted[dataset] == page}
+    return {name: (found[name], pages[name]) for name in names}
+
+
+def series_page(snapshot, name, number=1):
+    """``(page data, num_pages)`` for one per-item series"""
+    return series_pages(snapshot, [name], number)[name]
+
+
+def chart_data(snapshot, names=None, page=1):
+    """
+    Columnar chart datasets from ``snapshot``; ``names`` selects a subset.
+    Per-item series hold page ``page``. Returns ``(datasets, num_pages)``
+    with the page count of each per-item series included.
+    """
+    names = [*SERIES, *CHART_DATASETS] if names is None else names
+    unknown = [name for name in names if name not in CHART_DATASETS and name not in SERIES]
+    if unknown:
+        raise ValueError(f'Unknown dataset(s): {", ".join(unknown)}')
+    series = series_pages(snapshot, [name for name in names if name in SERIES], page)
+    datasets = {
+        name: series[name][0] if name in series else CHART_DATASETS[name](snapshot.data)
+        for name in names
+    }
+    return datasets, {name: num_pages for name, (_, num_pages) in series.items()}
+
+
+@transaction.atomic
+def refresh_snapshot(keep=DEFAULT_KEEP):
+    """Store a new snapshot and prune all but the ``keep`` most recent ones"""
+    started = time.perf_counter()
+    data, series = build_report_data()
+    pages = {name: _pages(columns, SERIES_PAGE_SIZE) for name, columns in series.items()}
+    data['series_pages'] = {name: len(chunks) for name, chunks in pages.items()}
+    snapshot = ReportSnapshot.objects.create(data=data, build_seconds=time.perf_counter() - started)
+    ReportSeriesPage.objects.bulk_create([
+        ReportSeriesPage(snapshot=snapshot, dataset=name, number=number, data=chunk)
+        for name, chunks in pages.items()
+        for number, chunk in enumerate(chunks, start=1)
+    ], batch_size=100)
+    if keep:
+        stale = ReportSnapshot.objects.values_list('id', flat=True)[keep:]
+        ReportSnapshot.objects.filter(id__in=list(stale)).delete()
+    return snapshot
+
+
+def latest_snapshot():
+    """Return the newest snapshot, building the first one on demand"""
+    snapshot = ReportSnapshot.objects.first()
+    if snapshot is None:
+        snapshot = refresh_snapshot()
+    return snapshot
@@ -0,0 +1,161 @@
+"""
+Ledger consistency check for stock levels.
+
+``quantity_in_stock`` and the per-location ``ItemStock`` rows are caches of
+the movement ledger, and they drift when a write bypasses it (queryset
+updates, raw SQL; item form and admin edits are posted as adjustments) or
+when an 'out' movement is clamped at zero.
+``verify`` replays each item's ledger from its opening balances in item-id
+chunks across a process pool and reports every item whose cached figures
+differ. With ``fix=True`` the drifted items are replayed again under lock
+and their totals, location rows and cost balances are set in bulk.
+"""
+from concurrent.futures import ProcessPoolExecutor
+
+from django.db import connections, transaction
+from django.db.models import Max, Min
+
+from . import changes, costing
+from .caching import bump_data_version
+from .ledger import apply_movement
+from .models import Item, ItemStock, Location, OpeningBalance, StockMovement
+from .workers import init_worker
+
+
+def _expected(items, **item_filter):
+    """
+    Replay the ledger of the ``items`` queryset, whose movements are selected
+    by ``item_filter`` (``item_id`` lookups): ``({item_id: {location_id:
+    quantity}}, movements_read)``, every item present even without movements
+    """
+    expected = {item_id: {} for item_id in items.values_list('id', flat=True)}
+    for item_id, location_id, quantity in OpeningBalance.objects.filter(**item_filter).values_list(
+        'item_id', 'location_id', 'quantity'
+    ):
+        expected[item_id][location_id] = quantity
+
+    default_location_id = None
+    read = 0
+    rows = StockMovement.objects.filter(**item_filter).order_by('item_id', 'created_at', 'id').values_list(
+        'item_id', 'location_id', 'movement_type', 'quantity'
+    )
+    for item_id, location_id, movement_type, quantity in rows.iterator(chunk_size=10000):
+        if location_id is None:
+            # Movements without a location were booked to the default warehouse
+            default_location_id = default_location_id or Location.default().id
+            location_id = default_location_id
+        balances = expected[item_id]
+        balances[location_id] = apply_movement(balances.get(location_id, 0), movement_type, quantity)
+        read += 1
+    return expected, read
+
+
+def _drift(items, expected, **item_filter):
+    """Drift records for the ``items`` whose cached stock differs from ``expected``"""
+    recorded = {}
+    for item_id, location_id, quantity in ItemStock.objects.filter(**item_filter).values_list(
+        'item_id', 'location_id', 'quantity'
+    ):
+        recorded.setdefault(item_id, {})[location_id] = quantity
+
+    drifted = []
+    for item_id, sku, total in items.order_by('id').values_list('id', 'sku', 'quantity_in_stock'):
+        balances, rows = expected[item_id], recorded.get(item_id, {})
+        locations = {
+            location_id: (rows.get(location_id, 0), balances.get(location_id, 0))
+            for location_id in balances.keys() | rows.keys()
+            if rows.get(location_id, 0) != balances.get(location_id, 0)
+        }
+        expected_total = sum(balances.values())
+        if locations or total != expected_total:
+            drifted.append({
+                'item_id': item_id,
+                'sku': sku,
+                'recorded': total,
+                'expected': expected_total,
+                'locations': locations,
+            })
+    return drifted
+
+
+def check_range(bounds):
+    """
+    Worker entry point: ``(drifted, movements_read)`` for items with
+    ``lo <= id < hi``, as plain data for the parent
+    """
+    lo, hi = bounds
+    item_filter = {'item_id__gte': lo, 'item_id__lt': hi}
+    items = Item.objects.filter(id__gte=lo, id__lt=hi)
+    expected, read = _expected(items, **item_filter)
+    return _drift(items, expected, **item_filter), read
+
+
+@transaction.atomic
+def repair(item_ids):
+    """
+    Set the stock of ``item_ids`` to their ledger balances. The items are
+    locked and replayed again first, so movements posted since the check are
+    included. Returns the drift records that were corrected.
+    """
+    ids = list(Item.objects.select_for_update().filter(id__in=item_ids).values_list('id', flat=True))
+    items = Item.objects.filter(id__in=ids)
+    expected, _ = _expected(items, item_id__in=ids)
+    drifted = _drift(items, expected, item_id__in=ids)
+    if not drifted:
+        return []
+
+    ids = [row['item_id'] for row in drifted]
+    ItemStock.objects.bulk_create(
+        [ItemStock(item_id=row['item_id'], location_id=location_id, quantity=quantities[1])
+         for row in drifted for location_id, quantities in row['locations'].items()],
+        update_conflicts=True, unique_fields=['item', 'location'], update_fields=['quantity'],
+        batch_size=1000,
+    )
+    Item.objects.bulk_update(
+        [Item(id=row['item_id'], quantity_in_stock=row['expected']) for row in drifted],
+        ['quantity_in_stock'], batch_size=1000,
+    )
+    costing.sync_items(items.filter(id__in=ids))
+    changes.record_many(items.filter(id__in=ids), 'update')
+
+    # Bulk writes skip the model signals that normally invalidate cached pages
+    bump_data_version()
+    transaction.on_commit(bump_data_version)
+    return drifted
+
+
+def verify(chunk_size=1000, workers=None, fix=False, progress=None):
+    """
+    Check every item's cached stock against its ledger in item-id chunks,
+    replayed across a process pool (``workers=1`` runs inline). With ``fix``
+    each chunk's drifted items are repaired as its results arrive.
+    ``progress`` is called with ``(chunks_done, chunks_total,
+    movements_read, items_drifted)``.
+
+    Returns ``{'chunks', 'movements', 'drifted', 'repaired'}`` where
+    ``drifted`` lists the drift records in item-id order.
+    """
+    result = {'chunks': 0, 'movements': 0, 'drifted': [], 'repaired': 0}
+    bounds = Item.objects.aggregate(lo=Min('id'), hi=Max('id'))
+    if bounds['lo'] is None:
+        return result
+    ranges = [(lo, lo + chunk_size) for lo in range(bounds['lo'], bounds['hi'] + 1, chunk_size)]
+
+    def results():
+        if workers == 1:
+            yield from map(check_range, ranges)
+            return
+        # Forked workers must not share this process's database connections
+        connections.close_all()
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_worker) as pool:
+            yield from pool.map(check_range, ranges)
+
+    for done, (drifted, read) in enumerate(results(), start=1):
+        result['movements'] += read
+        result['drifted'].extend(drifted)
+        if fix and drifted:
+            result['repaired'] += len(repair([row['item_id'] for row in drifted]))
+        if progress:
+            progress(done, len(ranges), result['movements'], len(result['drifted']))
+    result['chunks'] = len(ranges)
+    return result
@@ -1,8 +1,16 @@
 
-from django.test import TestCase, Client
+import re
+from unittest import mock
+from django.test import TestCase, TransactionTestCase, Client
 from django.urls import reverse
 from django.contrib.auth.models import User
-from .models import Category, Supplier, Item, StockMovement
+from django.core.cache import cache
+from django.utils import timezone
+from decimal import Decimal
+from .models import (
+	Sequence, Category, Supplier, Item, StockMovement, Order, OrderItem, ReportSnapshot,
+	ItemCost, CostLayer, Location, ItemStock, ChangeLogEntry, ItemClassification, CycleCount,
+)
 from .forms import CategoryForm, ItemForm, StockMovementForm
 
 class CategoryModelTest(TestCase):
@@ -135,3 +143,1596 @@ class ItemViewTest(TestCase):
 		response = client.get(reverse('inventory:item_detail', args=[self.item.id]))
 		self.assertEqual(response.status_code, 200)
 		self.assertContains(response, "Chair")
+
+class ReorderPlanTest(TestCase):
+	def setUp(self):
+		self.category = Category.objects.create(name="Hardware")
+		self.supplier = Supplier.objects.create(name="Bolt Co")
+		self.other_supplier = Supplier.objects.create(name="Nut Co")
+		self.busy = Item.objects.create(
+			name="Bolt", sku="BOLT001", category=self.category, supplier=self.supplier,
+			unit_price=1.00, selling_price=2.00, quantity_in_stock=100, minimum_stock_level=5
+		)
+		self.idle = Item.objects.create(
+			name="Washer", sku="WASH001", category=self.category, supplier=self.other_supplier,
+			unit_price=0.50, selling_price=1.00, quantity_in_stock=50, minimum_stock_level=5
+		)
+		self.low = Item.objects.create(
+			name="Nut", sku="NUT001", category=self.category, supplier=self.other_supplier,
+			unit_price=0.25, selling_price=0.50, quantity_in_stock=3, minimum_stock_level=5
+		)
+		# 90 units out over the 30-day window -> 3 per day, reorder point 30
+		StockMovement.objects.create(item=self.busy, movement_type='out', quantity=90)
+
+	def test_plan_uses_consumption_and_minimum_level(self):
+		from .reorders import plan_reorders
+		plan = plan_reorders(lookback_days=30, lead_time_days=7, safety_days=3, cover_days=10)
+		rows = dict(zip(plan['item_id'].tolist(), plan['suggested_quantity'].tolist()))
+		self.assertEqual(set(rows), {self.busy.id, self.low.id})
+		# busy: position 10, target 30 + 30 -> 50
+		self.assertEqual(rows[self.busy.id], 50)
+		# low: no usage, tops up to just above the minimum level
+		self.assertEqual(rows[self.low.id], 3)
+
+	def test_draft_orders_grouped_by_supplier(self):
+		from .reorders import plan_reorders, create_draft_orders
+		orders = create_draft_orders(plan_reorders())
+		self.assertEqual(len(orders), 2)
+		self.assertEqual(
+			set(Order.objects.values_list('supplier_id', flat=True)),
+			{self.supplier.id, self.other_supplier.id}
+		)
+		self.assertEqual(OrderItem.objects.count(), 2)
+		# open orders count towards the inventory position on the next run
+		self.assertEqual(len(plan_reorders()['item_id']), 0)
+
+	def test_reorder_view_creates_orders(self):
+		client = Client()
+		response = client.get(reverse('inventory:reorder_suggestions'))
+		self.assertContains(response, "BOLT001")
+		response = client.post(reverse('inventory:reorder_suggestions'))
+		self.assertEqual(response.status_code, 302)
+		self.assertEqual(Order.objects.filter(status='pending').count(), 2)
+
+class SequenceTest(TestCase):
+	def setUp(self):
+		self.supplier = Supplier.objects.create(name="Seq Supplies")
+
+	def tearDown(self):
+		from .sequences import reset_blocks
+		reset_blocks()
+
+	def test_allocate_reserves_consecutive_ranges(self):
+		from .sequences import allocate
+		self.assertEqual(list(allocate('test')), [1])
+		self.assertEqual(list(allocate('test', 3)), [2, 3, 4])
+		self.assertEqual(Sequence.objects.get(name='test').value, 4)
+
+	def test_orders_get_unique_numbers(self):
+		first = Order.objects.create(supplier=self.supplier)
+		second = Order.objects.create(supplier=self.supplier)
+		self.assertTrue(first.order_number.startswith("PO-"))
+		self.assertNotEqual(first.order_number, second.order_number)
+
+	def test_blank_movement_reference_is_numbered(self):
+		category = Category.objects.create(name="Seq")
+		item = Item.objects.create(
+			name="Tape", sku="TAPE-SEQ", category=category,
+			unit_price=1.00, selling_price=2.00
+		)
+		movement = StockMovement.objects.create(item=item, movement_type='in', quantity=1)
+		self.assertEqual(movement.reference, "SM-00000001")
+
+	def test_no_block_inside_a_transaction(self):
+		from .sequences import next_value
+		# TestCase wraps each test in a transaction, which could roll a block back
+		with self.settings(INVENTORY_SEQUENCE_BLOCK_SIZES={'blocky': 10}):
+			values = [next_value('blocky') for _ in range(3)]
+		self.assertEqual(values, [1, 2, 3])
+		self.assertEqual(Sequence.objects.get(name='blocky').value, 3)
+
+class SequenceBlockTest(TransactionTestCase):
+	def setUp(self):
+		from .sequences import reset_blocks
+		reset_blocks()
+
+	def tearDown(self):
+		from .sequences import reset_blocks
+		reset_blocks()
+
+	def test_documents_are_numbered_from_reserved_blocks(self):
+		category = Category.objects.create(name="Blocks")
+		item = Item.objects.create(
+			name="Brick", sku="BRICK001", category=category,
+			unit_price=1.00, selling_price=2.00, quantity_in_stock=0
+		)
+		supplier = Supplier.objects.create(name="Block Supplies")
+		with self.settings(INVENTORY_SEQUENCE_BLOCK_SIZES={'movement': 50, 'order': 50}):
+			movements = [StockMovement.objects.create(item=item, movement_type='in', quantity=1) for _ in range(3)]
+			orders = [Order.objects.create(supplier=supplier) for _ in range(3)]
+		self.assertEqual([m.reference for m in movements], ['SM-00000001', 'SM-00000002', 'SM-00000003'])
+		self.assertEqual([o.order_number[-6:] for o in orders], ['000001', '000002', '000003'])
+		# One counter update reserved each block
+		self.assertEqual(Sequence.objects.get(name='movement').value, 50)
+		self.assertEqual(Sequence.objects.get(name='order').value, 50)
+
+class ReportSnapshotTest(TestCase):
+	def setUp(self):
+		cache.clear()
+		self.category = Category.objects.create(name="Garden")
+		self.item = Item.objects.create(
+			name="Hose", sku="HOSE001", category=self.category,
+			unit_price=10.00, selling_price=15.00, quantity_in_stock=2, minimum_stock_level=5
+		)
+
+	def test_reports_served_from_snapshot(self):
+		from .snapshots import refresh_snapshot
+		refresh_snapshot()
+		Item.objects.create(
+			name="Rake", sku="RAKE001", category=self.category,
+			unit_price=5.00, selling_price=8.00, quantity_in_stock=1, minimum_stock_level=5
+		)
+		client = Client()
+		response = client.get(reverse('inventory:reports'))
+		self.assertContains(response, "HOSE001")
+		self.assertNotContains(response, "RAKE001")
+		data = client.get(reverse('inventory:stock_by_item_data')).json()
+		self.assertEqual(data['items'], [{'name': 'Hose', 'quantity_in_stock': 2}])
+
+	def test_first_request_builds_snapshot(self):
+		response = Client().get(reverse('inventory:stock_movements_time_series_data'))
+		self.assertEqual(response.status_code, 200)
+		self.assertEqual(ReportSnapshot.objects.count(), 1)
+
+	def test_refresh_is_staff_only(self):
+		client = Client()
+		response = client.post(reverse('inventory:reports_refresh'))
+		self.assertEqual(response.status_code, 302)
+		self.assertEqual(ReportSnapshot.objects.count(), 0)
+		User.objects.create_user(username="boss", password="pass", is_staff=True)
+		client.login(username="boss", password="pass")
+		client.post(reverse('inventory:reports_refresh'))
+		self.assertEqual(ReportSnapshot.objects.count(), 1)
+
+	def test_refresh_prunes_old_snapshots(self):
+		from .snapshots import refresh_snapshot
+		for _ in range(3):
+			latest = refresh_snapshot(keep=2)
+		self.assertEqual(ReportSnapshot.objects.count(), 2)
+		self.assertEqual(ReportSnapshot.objects.first(), latest)
+
+	def test_bundled_chart_data_is_columnar_and_selectable(self):
+		Category.objects.create(name="Empty")
+		Item.objects.create(
+			name="Shears", sku="SHEAR001", category=self.category,
+			unit_price=4.00, selling_price=6.00, quantity_in_stock=5, is_active=False
+		)
+		client = Client()
+		data = client.get(reverse('inventory:api_report_data')).json()
+		datasets = data['datasets']
+		self.assertEqual(set(datasets), {'stock_by_item', 'stock_value_by_category', 'price_margin', 'movements_time_series'})
+		self.assertEqual(datasets['stock_by_item'], {'name': ['Hose'], 'quantity_in_stock': [2]})
+		self.assertEqual(datasets['stock_value_by_category'], {'name': ['Garden', 'Empty'], 'total_value': [20.0, 0.0]})
+		self.assertEqual(datasets['price_margin']['items'], ['Hose', 'Shears'])
+
+		data = client.get(reverse('inventory:api_report_data'), {'datasets': 'price_margin'}).json()
+		self.assertEqual(list(data['datasets']), ['price_margin'])
+		response = client.get(reverse('inventory:api_report_data'), {'datasets': 'nope'})
+		self.assertEqual(response.status_code, 400)
+
+		response = client.get(reverse('inventory:api_report_data'), HTTP_ACCEPT_ENCODING='gzip')
+		self.assertEqual(response['Content-Encoding'], 'gzip')
+
+	def test_item_series_are_paged_outside_the_snapshot(self):
+		from . import snapshots
+		Item.objects.create(
+			name="Rake", sku="RAKE001", category=self.category,
+			unit_price=5.00, selling_price=8.00, quantity_in_stock=7
+		)
+		with mock.patch.object(snapshots, 'SERIES_PAGE_SIZE', 1):
+			snapshot = snapshots.refresh_snapshot()
+		self.assertNotIn('stock_by_item', snapshot.data)
+		self.assertEqual(snapshot.data['series_pages'], {'stock_by_item': 2, 'price_margin': 2})
+		client = Client()
+		data = client.get(reverse('inventory:stock_by_item_data'), {'page': 2}).json()
+		self.assertEqual((data['items'], data['page'], data['num_pages']), ([{'name': 'Hose', 'quantity_in_stock': 2}], 2, 2))
+		self.assertEqual(client.get(reverse('inventory:price_margin_data'), {'page': 9}).json()['items'], ['Rake'])
+		bundle = client.get(reverse('inventory:api_report_data'), {'page': 1}).json()
+		self.assertEqual(bundle['datasets']['stock_by_item']['name'], ['Rake'])
+		self.assertEqual(bundle['num_pages'], {'stock_by_item': 2, 'price_margin': 2})
+		self.assertEqual(client.get(reverse('inventory:stock_by_item_data'), {'page': 'x'}).status_code, 400)
+
+	def test_category_values_match_costing(self):
+		from .costing import category_values
+		from .snapshots import refresh_snapshot
+		# Received above the unit price, so cost valuation differs from unit_price * quantity
+		StockMovement.objects.create(item=self.item, movement_type='in', quantity=2, unit_cost=Decimal('30.00'))
+		data = refresh_snapshot().data
+		expected = float(category_values()[0]['total_value'])
+		self.assertNotEqual(expected, 40.0)
+		self.assertEqual(data['category_stock_value'], [{'name': 'Garden', 'total_value': expected}])
+		self.assertEqual(data['stock_value_by_category'], [{'name': 'Garden', 'total_value': expected}])
+
+class FragmentCacheTest(TestCase):
+	def setUp(self):
+		cache.clear()
+		self.category = Category.objects.create(name="Toys")
+		self.item = Item.objects.create(
+			name="Kite", sku="KITE001", category=self.category,
+			unit_price=4.00, selling_price=9.00, quantity_in_stock=12
+		)
+
+	def test_item_table_served_from_cache_until_data_changes(self):
+		client = Client()
+		url = reverse('inventory:item_list')
+		self.assertContains(client.get(url), "Kite")
+		with self.assertNumQueries(1):
+			# the paginator count only; filter dropdown categories come from the reference cache
+			self.assertContains(client.get(url), "Kite")
+		self.item.name = "Box Kite"
+		self.item.save()
+		self.assertContains(client.get(url), "Box Kite")
+
+	def test_filters_are_part_of_the_key(self):
+		client = Client()
+		url = reverse('inventory:item_list')
+		self.assertContains(client.get(url), "Kite")
+		self.assertNotContains(client.get(url, {'search': 'yoyo'}), "KITE001")
+
+	def test_data_version_bumps_on_delete(self):
+		from .caching import get_data_version
+		before = get_data_version()
+		self.item.delete()
+		self.assertGreater(get_data_version(), before)
+
+class ItemMovementsApiTest(TestCase):
+	def setUp(self):
+		self.category = Category.objects.create(name="Paint")
+		self.item = Item.objects.create(
+			name="Primer", sku="PRIM001", category=self.category,
+			unit_price=3.00, selling_price=5.00, quantity_in_stock=0
+		)
+		for movement_type, quantity in [('in', 10), ('out', 4), ('adjustment', 20), ('out', 5), ('in', 2)]:
+			StockMovement.objects.create(item=self.item, movement_type=movement_type, quantity=quantity)
+		self.url = reverse('inventory:item_movements_api', args=[self.item.id])
+
+	def test_pages_follow_cursor_with_running_balance(self):
+		client = Client()
+		first = client.get(self.url, {'limit': 2}).json()
+		self.assertEqual([m['balance'] for m in first['movements']], [10, 6])
+		second = client.get(self.url, {'limit': 2, 'cursor': first['next_cursor']}).json()
+		self.assertEqual([m['balance'] for m in second['movements']], [20, 15])
+		last = client.get(self.url, {'limit': 2, 'cursor': second['next_cursor']}).json()
+		self.assertEqual([m['balance'] for m in last['movements']], [17])
+		self.assertIsNone(last['next_cursor'])
+		self.assertEqual(last['item']['quantity_in_stock'], 17)
+
+	def test_type_filter_omits_balance(self):
+		data = Client().get(self.url, {'type': 'out'}).json()
+		self.assertEqual([m['quantity'] for m in data['movements']], [4, 5])
+		self.assertTrue(all(m['balance'] is None for m in data['movements']))
+
+	def test_opening_balance_for_date_range(self):
+		from .ledger import balance_before
+		third = StockMovement.objects.filter(item=self.item).order_by('created_at', 'id')[3]
+		self.assertEqual(balance_before(self.item.id, third.created_at, third.id), 20)
+
+	def test_invalid_parameters(self):
+		client = Client()
+		self.assertEqual(client.get(self.url, {'type': 'gift'}).status_code, 400)
+		self.assertEqual(client.get(self.url, {'start': 'yesterday'}).status_code, 400)
+		self.assertEqual(client.get(self.url, {'start': '2024-13-45'}).status_code, 400)
+		self.assertEqual(client.get(self.url, {'end': '2024-02-30'}).status_code, 400)
+		self.assertEqual(client.get(self.url, {'cursor': 'forged'}).status_code, 400)
+		today = timezone.localdate().isoformat()
+		data = client.get(self.url, {'start': today, 'end': today}).json()
+		self.assertEqual(len(data['movements']), 5)
+
+class CostLayerTest(TestCase):
+	def setUp(self):
+		self.category = Category.objects.create(name="Metals")
+		self.item = Item.objects.create(
+			name="Copper", sku="CU001", category=self.category,
+			unit_price=2.00, selling_price=5.00, quantity_in_stock=0
+		)
+		StockMovement.objects.create(item=self.item, movement_type='in', quantity=10, unit_cost=2)
+		StockMovement.objects.create(item=self.item, movement_type='in', quantity=10, unit_cost=4)
+		StockMovement.objects.create(item=self.item, movement_type='out', quantity=15)
+
+	def test_layers_maintained_incrementally(self):
+		cost = ItemCost.objects.get(item=self.item)
+		self.assertEqual(cost.quantity, 5)
+		self.assertEqual(cost.average_cost, Decimal('3'))
+		self.assertEqual(cost.fifo_value, Decimal('20'))
+		layer = CostLayer.objects.get(item=self.item)
+		self.assertEqual((layer.quantity_remaining, layer.unit_cost), (5, Decimal('4')))
+
+	def test_inventory_value_by_method(self):
+		from .costing import inventory_value
+		self.assertEqual(inventory_value('fifo'), Decimal('20'))
+		self.assertEqual(inventory_value('average'), Decimal('15'))
+
+	def test_direct_stock_edit_is_absorbed(self):
+		self.item.refresh_from_db()
+		self.item.quantity_in_stock = 8
+		self.item.save()
+		self.assertEqual(ItemCost.objects.get(item=self.item).quantity, 8)
+		self.assertEqual(CostLayer.objects.filter(item=self.item).count(), 2)
+
+	def test_rebuild_matches_incremental(self):
+		from .costing import rebuild
+		before = ItemCost.objects.values_list('item_id', 'quantity', 'average_cost', 'fifo_value').get(item=self.item)
+		CostLayer.objects.all().delete()
+		ItemCost.objects.all().delete()
+		self.assertEqual(rebuild(chunk_size=10, workers=1), 1)
+		after = ItemCost.objects.values_list('item_id', 'quantity', 'average_cost', 'fifo_value').get(item=self.item)
+		self.assertEqual(before, after)
+
+class LocationStockTest(TestCase):
+	def setUp(self):
+		self.category = Category.objects.create(name="Grocery")
+		self.item = Item.objects.create(
+			name="Rice", sku="RICE001", category=self.category,
+			unit_price=1.00, selling_price=1.50, quantity_in_stock=5
+		)
+		self.main = Location.default()
+		self.north = Location.objects.create(name="North Depot", code="NORTH")
+
+	def stock_at(self, location):
+		return ItemStock.objects.get(item=self.item, location=location).quantity
+
+	def test_item_created_with_stock_lands_in_default_location(self):
+		self.assertEqual(self.stock_at(self.main), 5)
+
+	def test_movements_update_location_rows_and_total(self):
+		StockMovement.objects.create(item=self.item, location=self.north, movement_type='in', quantity=20)
+		StockMovement.objects.create(item=self.item, location=self.north, movement_type='out', quantity=8)
+		StockMovement.objects.create(item=self.item, movement_type='adjustment', quantity=2)
+		self.item.refresh_from_db()
+		self.assertEqual(self.stock_at(self.north), 12)
+		self.assertEqual(self.stock_at(self.main), 2)
+		self.assertEqual(self.item.quantity_in_stock, 14)
+		data = Client().get(reverse('inventory:item_movements_api', args=[self.item.id])).json()
+		# The item was created with 5 in stock, posted as an opening adjustment
+		self.assertEqual([m['balance'] for m in data['movements']], [5, 25, 17, 14])
+
+	def test_movement_writes_commit_together_location_row_first(self):
+		from django.db import connection
+		from django.test.utils import CaptureQueriesContext
+		with CaptureQueriesContext(connection) as captured:
+			StockMovement.objects.create(item=self.item, location=self.north, movement_type='in', quantity=4, reference='L-1')
+		writes = [q['sql'] for q in captured.captured_queries if q['sql'].startswith(('UPDATE', 'INSERT'))]
+		first = lambda table: next(n for n, sql in enumerate(writes) if f'"{table}"' in sql)
+		self.assertLess(first('inventory_itemstock'), first('inventory_item'))
+
+		# A failure in the item step rolls the whole movement back, change entry included
+		entries = ChangeLogEntry.objects.count()
+		with mock.patch('inventory.costing.record_movement', side_effect=RuntimeError):
+			with self.assertRaises(RuntimeError):
+				StockMovement.objects.create(item=self.item, location=self.north, movement_type='in', quantity=1)
+		self.assertEqual(self.stock_at(self.north), 4)
+		self.item.refresh_from_db()
+		self.assertEqual(self.item.quantity_in_stock, 9)
+		self.assertEqual(ChangeLogEntry.objects.count(), entries)
+		self.assertFalse(StockMovement.objects.filter(quantity=1).exists())
+
+	def test_direct_edit_reconciles_default_location(self):
+		StockMovement.objects.create(item=self.item, location=self.north, movement_type='in', quantity=10)
+		self.item.refresh_from_db()
+		self.item.quantity_in_stock = 12
+		self.item.save()
+		self.assertEqual(self.stock_at(self.main), 2)
+		self.assertEqual(self.stock_at(self.north), 10)
+		adjustment = StockMovement.objects.filter(item=self.item, movement_type='adjustment').latest('id')
+		self.assertEqual((adjustment.location, adjustment.quantity), (self.main, 2))
+		self.item.refresh_from_db()
+		self.assertEqual(self.item.quantity_in_stock, 12)
+
+	def test_stock_out_validated_per_location(self):
+		form = StockMovementForm(data={
+			"item": self.item.id,
+			"location": self.north.id,
+			"movement_type": "out",
+			"quantity": 1,
+		})
+		self.assertFalse(form.is_valid())
+		self.assertIn("North Depot", str(form.errors['quantity']))
+
+class ChangeFeedTest(TestCase):
+	def setUp(self):
+		self.category = Category.objects.create(name="Books")
+		self.item = Item.objects.create(
+			name="Atlas", sku="ATLAS001", category=self.category,
+			unit_price=20.00, selling_price=30.00, quantity_in_stock=3
+		)
+		self.start = ChangeLogEntry.objects.latest('seq').seq
+
+	def test_writes_append_entries_in_order(self):
+		StockMovement.objects.create(item=self.item, movement_type='in', quantity=2)
+		data = Client().get(reverse('inventory:api_changes'), {'since': self.start}).json()
+		self.assertEqual(
+			[(c['model'], c['action']) for c in data['changes']],
+			[('stockmovement', 'create'), ('item', 'update')]
+		)
+		self.assertEqual(data['changes'][-1]['data']['quantity_in_stock'], 5)
+		self.assertEqual(data['next_since'], data['changes'][-1]['seq'])
+		self.assertFalse(data['has_more'])
+
+	def test_limit_pages_through_feed(self):
+		StockMovement.objects.create(item=self.item, movement_type='out', quantity=1)
+		client = Client()
+		data = client.get(reverse('inventory:api_changes'), {'limit': 1}).json()
+		self.assertTrue(data['has_more'])
+		following = client.get(reverse('inventory:api_changes'), {'since': data['next_since']}).json()
+		self.assertGreater(following['changes'][0]['seq'], data['next_since'])
+
+	def test_compaction_keeps_latest_entry_per_object(self):
+		from .changes import compact
+		self.item.name = "Atlas of the World"
+		self.item.save()
+		self.item.name = "World Atlas"
+		self.item.save()
+		expired, superseded = compact(days=30)
+		# The create, the opening stock's update and the first rename
+		self.assertEqual((expired, superseded), (0, 3))
+		entries = ChangeLogEntry.objects.filter(model='item', object_id=self.item.id)
+		self.assertEqual(entries.count(), 1)
+		self.assertEqual(entries.get().payload['name'], "World Atlas")
+		# a consumer that is behind still gets the latest entry, so it need not resync
+		data = Client().get(reverse('inventory:api_changes'), {'since': self.start}).json()
+		self.assertFalse(data['resync_required'])
+		self.assertEqual(data['changes'][-1]['data']['name'], "World Atlas")
+
+	def test_expired_entries_require_resync(self):
+		from .changes import compact
+		StockMovement.objects.create(item=self.item, movement_type='in', quantity=1)
+		latest = ChangeLogEntry.objects.latest('seq').seq
+		ChangeLogEntry.objects.update(created_at=timezone.now() - timezone.timedelta(days=40))
+		StockMovement.objects.create(item=self.item, movement_type='in', quantity=1)
+		expired, _ = compact(days=30)
+		self.assertGreater(expired, 0)
+		self.assertFalse(ChangeLogEntry.objects.filter(seq__lte=latest).exists())
+		client = Client()
+		self.assertTrue(client.get(reverse('inventory:api_changes'), {'since': self.start}).json()['resync_required'])
+		self.assertFalse(client.get(reverse('inventory:api_changes'), {'since': latest}).json()['resync_required'])
+
+
+class StockBroadcasterTest(TestCase):
+	def setUp(self):
+		from .live import StockBroadcaster
+		self.category = Category.objects.create(name="Garden")
+		self.item = Item.objects.create(
+			name="Hose", sku="HOSE001", category=self.category,
+			unit_price=8.00, selling_price=12.00, quantity_in_stock=10, minimum_stock_level=5
+		)
+		self.broadcaster = StockBroadcaster()
+		self.broadcaster.prime()
+
+	def test_poll_emits_low_stock_and_restocked_transitions(self):
+		StockMovement.objects.create(item=self.item, movement_type='out', quantity=6)
+		events = self.broadcaster.poll()
+		self.assertEqual([e['type'] for e in events], ['stock', 'low_stock'])
+		self.assertEqual(events[0]['quantity_in_stock'], 4)
+
+		StockMovement.objects.create(item=self.item, movement_type='out', quantity=1)
+		self.assertEqual([e['type'] for e in self.broadcaster.poll()], ['stock'])
+
+		StockMovement.objects.create(item=self.item, movement_type='in', quantity=10)
+		events = self.broadcaster.poll()
+		self.assertEqual([e['type'] for e in events], ['stock', 'restocked'])
+		self.assertEqual(self.broadcaster.poll(), [])
+
+	async def test_stream_delivers_events_under_asgi(self):
+		import asyncio
+		from asgiref.sync import sync_to_async
+		from django.test import AsyncClient
+		with self.settings(INVENTORY_LIVE_POLL_INTERVAL=0.01):
+			response = await AsyncClient().get(reverse('inventory:stock_stream'))
+			self.assertEqual(response['Content-Type'], 'text/event-stream')
+			stream = aiter(response.streaming_content)
+			try:
+				self.assertEqual(await anext(stream), b'retry: 3000\n\n')
+				await sync_to_async(StockMovement.objects.create)(item=self.item, movement_type='out', quantity=6)
+				events = [await asyncio.wait_for(anext(stream), timeout=5) for _ in range(2)]
+			finally:
+				await stream.aclose()
+		self.assertTrue(events[0].startswith(b'id: '))
+		self.assertIn(b'event: stock\n', events[0])
+		self.assertIn(b'"quantity_in_stock": 4', events[0])
+		self.assertIn(b'event: low_stock\n', events[1])
+
+	async def test_concurrent_first_subscribers_share_one_watcher(self):
+		import asyncio
+		from .live import StockBroadcaster
+		broadcaster = StockBroadcaster()
+		with mock.patch.object(broadcaster, 'prime', wraps=broadcaster.prime) as prime, \
+				self.settings(INVENTORY_LIVE_POLL_INTERVAL=0.01):
+			first, second = await asyncio.gather(broadcaster.subscribe(), broadcaster.subscribe())
+			task = broadcaster._task
+			self.assertEqual(broadcaster.subscribers, {first, second})
+			self.assertEqual(prime.call_count, 1)
+			broadcaster.unsubscribe(first)
+			broadcaster.unsubscribe(second)
+			await asyncio.wait_for(task, timeout=5)
+
+	def test_wsgi_pages_do_not_subscribe(self):
+		# WSGI would buffer the endless stream, so it is refused and not opened
+		response = self.client.get(reverse('inventory:stock_stream'))
+		self.assertEqual(response.status_code, 204)
+		for name in ('dashboard', 'reports'):
+			self.assertFalse(self.client.get(reverse(f'inventory:{name}')).context['live_updates'])
+		self.assertNotContains(self.client.get(reverse('inventory:dashboard')), 'EventSource')
+
+
+class LoadTestTest(TestCase):
+	def setUp(self):
+		category = Category.objects.create(name="Toys")
+		self.item = Item.objects.create(
+			name="Yo-yo", sku="YOYO001", category=category,
+			unit_price=2.00, selling_price=4.00, quantity_in_stock=5
+		)
+
+	def test_percentile_uses_nearest_rank(self):
+		from .loadtest import percentile
+		values = [0.1 * n for n in range(1, 101)]
+		self.assertAlmostEqual(percentile(values, 50), 5.0)
+		self.assertAlmostEqual(percentile(values, 99), 9.9)
+		self.assertEqual(percentile([], 95), 0.0)
+		# Rank 28.5 rounds up to the 29th value, never down
+		self.assertEqual(percentile(list(range(1, 31)), 95), 29)
+
+	def test_every_route_in_mix_succeeds_in_process(self):
+		import random
+		from .loadtest import DEFAULT_MIX, InProcessTransport, RequestPlan, is_error
+		plan = RequestPlan.from_database()
+		transport = InProcessTransport()
+		rng = random.Random(1)
+		for route in DEFAULT_MIX:
+			method, path, data = plan.build(route, rng)
+			status, lock_error = transport.send(method, path, data)
+			self.assertFalse(is_error(method, status), route)
+			self.assertFalse(lock_error)
+		self.assertTrue(StockMovement.objects.filter(item=self.item, reference='LOADTEST').exists())
+
+	def test_movement_posts_alternate_per_item(self):
+		import random
+		from .loadtest import RequestPlan
+		plan = RequestPlan([(1, 'A1', 'Alpha'), (2, 'B2', 'Beta')])
+		rng = random.Random(3)
+		moves = {1: [], 2: []}
+		for _ in range(20):
+			_, _, data = plan.build('movement_post', rng)
+			moves[data['item']].append(data['movement_type'])
+		for types in moves.values():
+			self.assertTrue(types)
+			self.assertEqual(types, ['in', 'out'] * (len(types) // 2) + ['in'] * (len(types) % 2))
+
+	def test_form_rerender_on_post_is_an_error(self):
+		from .loadtest import is_error
+		self.assertTrue(is_error('POST', 200))
+		self.assertFalse(is_error('POST', 302))
+		self.assertFalse(is_error('GET', 200))
+		self.assertTrue(is_error('GET', 0))
+		self.assertTrue(is_error('GET', 500))
+
+
+class AbcClassificationTest(TestCase):
+	def setUp(self):
+		self.category = Category.objects.create(name="Tools")
+		self.items = [
+			Item.objects.create(
+				name=name, sku=f"ABC{n:03d}", category=self.category,
+				unit_price=price, selling_price=price * 2, quantity_in_stock=10
+			)
+			for n, (name, price) in enumerate([("Drill", 80), ("Saw", 15), ("Tape", 4), ("Nails", 1)])
+		]
+
+	def test_classes_follow_cumulative_share(self):
+		from .analytics import abc_classes
+		classes = abc_classes([5, 70, 0, 10, 15])
+		# 70 -> A; 15 starts at 70% -> A; 10 starts at 85% -> B; 5 starts at 95% -> C
+		self.assertEqual(classes.tolist(), [2, 0, 2, 1, 0])
+		self.assertEqual(abc_classes([0, 0]).tolist(), [2, 2])
+
+	def test_classify_stores_classes_and_filters_item_list(self):
+		from .analytics import classify
+		StockMovement.objects.create(item=self.items[2], movement_type='out', quantity=10)
+		result = classify(days=30)
+		self.assertEqual(result['items'], 4)
+		drill = ItemClassification.objects.get(item=self.items[0])
+		self.assertEqual((drill.value_class, drill.usage_class), ('A', 'C'))
+		self.assertEqual(ItemClassification.objects.get(item=self.items[2]).usage_class, 'A')
+
+		response = Client().get(reverse('inventory:item_list'), {'abc': 'usage:A'})
+		self.assertEqual([item.name for item in response.context['page_obj']], ["Tape"])
+
+		page = Client().get(reverse('inventory:abc_analysis'))
+		self.assertContains(page, "By Issue Value")
+
+
+class TurnoverReportTest(TestCase):
+	def setUp(self):
+		category = Category.objects.create(name="Kitchen")
+		self.kettle = Item.objects.create(
+			name="Kettle", sku="KET001", category=category,
+			unit_price=10.00, selling_price=15.00, quantity_in_stock=0
+		)
+		self.toaster = Item.objects.create(
+			name="Toaster", sku="TOA001", category=category,
+			unit_price=20.00, selling_price=30.00, quantity_in_stock=5
+		)
+		StockMovement.objects.create(item=self.kettle, movement_type='in', quantity=20)
+		StockMovement.objects.create(item=self.kettle, movement_type='out', quantity=10)
+
+	def test_item_figures_from_grouped_query(self):
+		from .analytics import turnover_report
+		rows = {row['sku']: row for row in turnover_report(days=30, dead_days=30)}
+		kettle = rows['KET001']
+		# opening 0, closing 10: average 5, 10 issued
+		self.assertEqual((kettle['received'], kettle['issued'], kettle['on_hand']), (20, 10, 10))
+		self.assertAlmostEqual(kettle['turnover'], 2.0)
+		self.assertAlmostEqual(kettle['days_of_supply'], 30.0)
+		self.assertFalse(kettle['dead_stock'])
+		self.assertIsNone(rows['TOA001']['days_of_supply'])
+		self.assertTrue(rows['TOA001']['dead_stock'])
+
+	def test_json_endpoint_pages_and_sorts(self):
+		client = Client()
+		data = client.get(reverse('inventory:api_turnover'), {'sort': 'name', 'page_size': 1}).json()
+		self.assertEqual([row['name'] for row in data['results']], ["Kettle"])
+		self.assertEqual(data['num_pages'], 2)
+
+		data = client.get(reverse('inventory:api_turnover'), {'level': 'category'}).json()
+		self.assertEqual(data['results'][0]['dead_stock_items'], 1)
+		self.assertEqual(data['results'][0]['issued'], 10)
+
+		response = client.get(reverse('inventory:api_turnover'), {'sort': 'bogus'})
+		self.assertEqual(response.status_code, 400)
+
+	def test_csv_stream(self):
+		response = Client().get(reverse('inventory:turnover_csv'), {'dead_only': '1'})
+		lines = b''.join(response.streaming_content).decode().splitlines()
+		self.assertTrue(lines[0].startswith('sku,name'))
+		self.assertEqual(len(lines), 2)
+		self.assertTrue(lines[1].startswith('TOA001'))
+
+
+class ProfilerMiddlewareTest(TestCase):
+	def setUp(self):
+		self.staff = User.objects.create_user(username="admin", password="pass", is_staff=True)
+		self.client = Client()
+
+	def test_staff_request_returns_profile_report(self):
+		self.client.force_login(self.staff)
+		response = self.client.get(reverse('inventory:item_list'), {'_profile': 'tottime'})
+		self.assertEqual(response['Content-Type'], 'text/plain; charset=utf-8')
+		report = response.content.decode()
+		self.assertIn('Route: inventory:item_list', report)
+		self.assertIn('SQL queries:', report)
+		self.assertIn('function calls', report)
+
+	def test_non_staff_requests_are_not_profiled(self):
+		response = self.client.get(reverse('inventory:item_list'), {'_profile': '1'})
+		self.assertTemplateUsed(response, 'inventory/item_list.html')
+
+	def test_sampled_requests_are_attributed_to_route(self):
+		from .profiling import sampler
+		sampler.reset()
+		with self.settings(INVENTORY_PROFILE_SAMPLE_RATE=1.0):
+			self.client.get(reverse('inventory:dashboard'))
+		self.assertEqual(sampler.requests['inventory:dashboard'], 1)
+		self.assertEqual(sampler.active, {})
+
+
+class CycleCountTest(TestCase):
+	def setUp(self):
+		cache.clear()
+		category = Category.objects.create(name="Hardware")
+		self.bolt = Item.objects.create(
+			name="Bolt", sku="BOLT001", category=category,
+			unit_price=1.00, selling_price=2.00, quantity_in_stock=50
+		)
+		self.nut = Item.objects.create(
+			name="Nut", sku="NUT001", category=category,
+			unit_price=0.50, selling_price=1.00, quantity_in_stock=30
+		)
+		self.washer = Item.objects.create(
+			name="Washer", sku="WASH001", category=category,
+			unit_price=0.10, selling_price=0.20, quantity_in_stock=10
+		)
+
+	def test_parse_counts_sums_repeated_skus(self):
+		from .cyclecounts import parse_counts
+		counts = parse_counts(["sku,counted_qty", "BOLT001,20", "", "BOLT001, 25", "NUT001,30"])
+		self.assertEqual(counts, {'BOLT001': 45, 'NUT001': 30})
+		with self.assertRaisesMessage(ValueError, 'Line 2'):
+			parse_counts(["BOLT001,1", "NUT001,lots"])
+
+	def test_variances_and_bulk_approval(self):
+		from .cyclecounts import approve, create_count, summarize
+		count = create_count({'BOLT001': 45, 'NUT001': 30, 'WASH001': 12, 'MISSING': 3})
+		summary = summarize(count)
+		self.assertEqual((summary['lines'], summary['unknown'], summary['variances']), (4, 1, 2))
+		self.assertEqual((summary['net_variance'], summary['absolute_variance']), (-3, 7))
+
+		start = ChangeLogEntry.objects.latest('seq').seq
+		# a fixed number of statements however many lines are posted
+		with self.assertNumQueries(25):
+			posted = approve(count)
+		self.assertEqual(posted, 2)
+
+		self.bolt.refresh_from_db()
+		self.washer.refresh_from_db()
+		self.assertEqual((self.bolt.quantity_in_stock, self.washer.quantity_in_stock), (45, 12))
+		self.assertEqual(ItemStock.objects.get(item=self.bolt).quantity, 45)
+		self.assertEqual(ItemCost.objects.get(item=self.washer).quantity, 12)
+		movements = StockMovement.objects.filter(movement_type='adjustment', notes=f'Cycle count #{count.pk}')
+		self.assertEqual(sorted(movements.values_list('quantity', flat=True)), [12, 45])
+		self.assertTrue(all(m.reference.startswith('SM-') for m in movements))
+		self.assertEqual(ChangeLogEntry.objects.filter(seq__gt=start, model='item').count(), 2)
+
+		count.refresh_from_db()
+		self.assertEqual((count.status, count.adjustment_count), ('approved', 2))
+		# book quantities are frozen once posted
+		self.assertEqual(summarize(count)['variances'], 2)
+		with self.assertRaises(ValueError):
+			approve(count)
+
+	def test_upload_and_staff_approval_views(self):
+		from django.core.files.uploadedfile import SimpleUploadedFile
+		client = Client()
+		upload = SimpleUploadedFile("count.csv", b"BOLT001,48\nNUT001,30\n")
+		response = client.post(reverse('inventory:cycle_count_list'), {'file': upload})
+		count = CycleCount.objects.get()
+		self.assertRedirects(response, reverse('inventory:cycle_count_detail', args=[count.id]))
+		response = client.get(reverse('inventory:cycle_count_detail', args=[count.id]))
+		self.assertContains(response, "BOLT001")
+		self.assertNotContains(response, "NUT001")
+
+		client.post(reverse('inventory:cycle_count_approve', args=[count.id]))
+		self.assertEqual(CycleCount.objects.get().status, 'pending')
+		User.objects.create_user(username="lead", password="pass", is_staff=True)
+		client.login(username="lead", password="pass")
+		client.post(reverse('inventory:cycle_count_approve', args=[count.id]))
+		self.bolt.refresh_from_db()
+		self.assertEqual(self.bolt.quantity_in_stock, 48)
+
+class ArchiveMovementsTest(TestCase):
+	def setUp(self):
+		self.category = Category.objects.create(name="Glue")
+		self.item = Item.objects.create(
+			name="Epoxy", sku="EPOX001", category=self.category,
+			unit_price=4.00, selling_price=7.00, quantity_in_stock=0
+		)
+		self.branch = Location.objects.create(name="Branch", code="BR")
+		now = timezone.now()
+		moves = [('in', 10, None), ('out', 4, None), ('in', 6, self.branch), ('adjustment', 20, None), ('out', 5, None), ('in', 2, self.branch)]
+		for days_ago, (movement_type, quantity, location) in zip([400, 390, 380, 370, 5, 1], moves):
+			movement = StockMovement.objects.create(item=self.item, movement_type=movement_type, quantity=quantity, location=location)
+			StockMovement.objects.filter(pk=movement.pk).update(created_at=now - timezone.timedelta(days=days_ago))
+		self.url = reverse('inventory:item_movements_api', args=[self.item.id])
+
+	def history(self, **params):
+		client, rows, cursor = Client(), [], None
+		while True:
+			data = client.get(self.url, {'limit': 2, **params, **({'cursor': cursor} if cursor else {})}).json()
+			rows.extend((m['id'], m['balance']) for m in data['movements'])
+			cursor = data['next_cursor']
+			if not cursor:
+				return rows
+
+	def test_history_and_balances_unchanged_by_archiving(self):
+		from . import archive
+		from .ledger import balance_before
+		from .models import ArchivedStockMovement, OpeningBalance
+		movements = list(StockMovement.objects.filter(item=self.item).order_by('created_at', 'id'))
+		before = self.history()
+		filtered = self.history(type='in')
+		points = [balance_before(self.item.id, m.created_at, m.id) for m in movements]
+
+		self.assertEqual(archive.archive(cutoff=timezone.now() - timezone.timedelta(days=30)), 4)
+		self.assertEqual(StockMovement.objects.filter(item=self.item).count(), 2)
+		self.assertEqual(ArchivedStockMovement.objects.filter(item=self.item).count(), 4)
+		self.assertEqual(
+			dict(OpeningBalance.objects.filter(item=self.item).values_list('location__code', 'quantity')),
+			{'MAIN': 20, 'BR': 6},
+		)
+		self.assertEqual(self.history(), before)
+		self.assertEqual(self.history(type='in'), filtered)
+		self.assertEqual([balance_before(self.item.id, m.created_at, m.id) for m in movements], points)
+		self.assertFalse(ChangeLogEntry.objects.filter(model='stockmovement', action='delete').exists())
+
+		# A later run moves the boundary forward on top of the opening balances
+		self.assertEqual(archive.archive(cutoff=timezone.now() - timezone.timedelta(days=3)), 1)
+		self.assertEqual(OpeningBalance.objects.get(item=self.item, location__code='MAIN').quantity, 15)
+		self.assertEqual(self.history(), before)
+
+	def test_cost_rebuild_reads_archive(self):
+		from . import archive, costing
+		costing.rebuild(workers=1)
+		expected = list(CostLayer.objects.filter(item=self.item).values_list('quantity_remaining', 'created_at'))
+		archive.archive(cutoff=timezone.now() - timezone.timedelta(days=30))
+		costing.rebuild(workers=1)
+		self.assertEqual(list(CostLayer.objects.filter(item=self.item).values_list('quantity_remaining', 'created_at')), expected)
+
+	def test_command(self):
+		from io import StringIO
+		from django.core.management import call_command
+		out = StringIO()
+		call_command('archive_movements', '--days', '30', stdout=out)
+		self.assertIn('Archived 4 movements', out.getvalue())
+
+class SkuLookupTest(TestCase):
+	def setUp(self):
+		from .skuindex import index
+		cache.clear()
+		index.clear()
+		self.category = Category.objects.create(name="Snacks")
+		self.item = Item.objects.create(
+			name="Crisps", sku="CRSP001", category=self.category,
+			unit_price=0.50, selling_price=1.20, quantity_in_stock=30
+		)
+		Item.objects.create(name="Old crisps", sku="CRSP000", category=self.category,
+			unit_price=0.50, selling_price=1.00, is_active=False)
+
+	def url(self, sku):
+		return reverse('inventory:api_sku_lookup', args=[sku])
+
+	def test_lookup_served_from_index(self):
+		client = Client()
+		client.get(self.url('CRSP001'))
+		with self.assertNumQueries(1):
+			data = client.get(self.url('CRSP001')).json()
+		self.assertEqual(data, {'id': self.item.id, 'sku': 'CRSP001', 'name': 'Crisps', 'price': '1.20', 'quantity_in_stock': 30})
+		with self.settings(INVENTORY_SKU_LOOKUP_LIVE_STOCK=False), self.assertNumQueries(0):
+			self.assertNotIn('quantity_in_stock', client.get(self.url('CRSP001')).json())
+		self.assertEqual(client.get(self.url('CRSP000')).status_code, 404)
+		with self.assertNumQueries(1):
+			self.assertEqual(client.get(self.url('NOPE')).status_code, 404)
+			self.assertEqual(client.get(self.url('NOPE')).status_code, 404)
+
+	def test_item_save_invalidates(self):
+		client = Client()
+		self.assertEqual(client.get(self.url('CRSP001')).json()['price'], '1.20')
+		self.item.selling_price = Decimal('1.50')
+		self.item.save()
+		self.assertEqual(client.get(self.url('CRSP001')).json()['price'], '1.50')
+		self.item.delete()
+		self.assertEqual(client.get(self.url('CRSP001')).status_code, 404)
+
+	def test_other_process_writes_arrive_through_change_feed(self):
+		from . import changes
+		from .skuindex import SkuIndex
+		# A second index stands in for another process: nothing invalidates it
+		index = SkuIndex()
+		self.assertEqual(index.lookup('CRSP001'), (self.item.id, 'Crisps', Decimal('1.20')))
+		self.assertIsNone(index.lookup('CRSP002'))
+		Item.objects.filter(pk=self.item.pk).update(sku='CRSP002', selling_price=Decimal('1.40'))
+		changes.record(Item.objects.get(pk=self.item.pk), 'update')
+		with self.assertNumQueries(0):
+			self.assertEqual(index.lookup('CRSP001')[0], self.item.id)
+		with self.settings(INVENTORY_SKU_INDEX_SYNC_INTERVAL=0):
+			self.assertIsNone(index.lookup('CRSP001'))
+			self.assertEqual(index.lookup('CRSP002'), (self.item.id, 'Crisps', Decimal('1.40')))
+			Item.objects.filter(pk=self.item.pk).update(is_active=False)
+			changes.record(Item.objects.get(pk=self.item.pk), 'update')
+			self.assertIsNone(index.lookup('CRSP002'))
+
+	def test_index_is_bounded(self):
+		from .skuindex import SkuIndex
+		index = SkuIndex(max_size=1)
+		self.assertEqual(index.lookup('CRSP001')[0], self.item.id)
+		self.assertIsNone(index.lookup('NOPE'))
+		self.assertEqual(list(index.entries), ['NOPE'])
+
+class PosEventsTest(TestCase):
+	def setUp(self):
+		from .skuindex import index
+		cache.clear()
+		index.clear()
+		self.category = Category.objects.create(name="Drinks")
+		self.cola = Item.objects.create(name="Cola", sku="COLA001", category=self.category,
+			unit_price=0.40, selling_price=1.00, quantity_in_stock=10)
+		self.water = Item.objects.create(name="Water", sku="WATR001", category=self.category,
+			unit_price=0.20, selling_price=0.60, quantity_in_stock=3)
+		self.url = reverse('inventory:api_pos_events')
+
+	def post(self, payload, **extra):
+		import json
+		return Client().post(self.url, json.dumps(payload), content_type='application/json', **extra)
+
+	def test_batch_posts_in_order_with_bulk_writes(self):
+		from . import pos
+		start = ChangeLogEntry.objects.latest('seq').seq
+		events = [pos.parse_event({'sku': sku, 'quantity': quantity}) for sku, quantity in
+			[('COLA001', 2), ('WATR001', 2), ('COLA001', 3), ('WATR001', 5)]]
+		results = pos.post_batch(events)
+		self.assertEqual([r['quantity_in_stock'] for r in results], [8, 1, 5, 0])
+		self.assertEqual(len({r['reference'] for r in results}), 4)
+		self.cola.refresh_from_db()
+		self.water.refresh_from_db()
+		self.assertEqual((self.cola.quantity_in_stock, self.water.quantity_in_stock), (5, 0))
+		self.assertEqual(ItemStock.objects.get(item=self.cola).quantity, 5)
+		self.assertEqual(ItemCost.objects.get(item=self.cola).quantity, 5)
+		self.assertEqual(StockMovement.objects.filter(movement_type='out').count(), 4)
+		self.assertEqual(ChangeLogEntry.objects.filter(seq__gt=start, model='stockmovement', action='create').count(), 4)
+
+	def test_endpoint(self):
+		with self.settings(INVENTORY_POS_GROUP_COMMIT=False):
+			response = self.post({'sku': 'COLA001', 'quantity': 4, 'reference': 'R-1'})
+			self.assertEqual(response.status_code, 201)
+			self.assertEqual(response.json()['quantity_in_stock'], 6)
+			data = self.post({'events': [{'sku': 'WATR001'}, {'sku': 'NOPE'}, {'sku': 'COLA001', 'location': 'XX'}]}).json()
+		self.assertEqual(data['results'][0]['quantity_in_stock'], 2)
+		self.assertIn('Unknown SKU', data['results'][1]['error'])
+		self.assertIn('Unknown location', data['results'][2]['error'])
+		self.assertEqual(self.post({'sku': 'COLA001', 'quantity': 0}).status_code, 400)
+		with self.settings(INVENTORY_POS_API_TOKEN='secret'):
+			self.assertEqual(self.post({'sku': 'COLA001'}).status_code, 403)
+
+	def test_csrf_protected_without_token(self):
+		import json
+		client = Client(enforce_csrf_checks=True)
+		body = json.dumps({'sku': 'COLA001'})
+		with self.settings(INVENTORY_POS_GROUP_COMMIT=False):
+			self.assertEqual(client.post(self.url, body, content_type='text/plain').status_code, 403)
+			with self.settings(INVENTORY_POS_API_TOKEN='secret'):
+				response = client.post(self.url, body, content_type='text/plain', HTTP_X_POS_TOKEN='secret')
+		self.assertEqual(response.status_code, 201)
+
+	def test_resend_with_reference_is_not_posted_twice(self):
+		with self.settings(INVENTORY_POS_GROUP_COMMIT=False):
+			first = self.post({'sku': 'COLA001', 'quantity': 2, 'reference': 'T1-R-7'}).json()
+			again = self.post({'sku': 'COLA001', 'quantity': 2, 'reference': 'T1-R-7'})
+			other = self.post({'sku': 'WATR001', 'reference': 'T1-R-7'}).json()
+			data = self.post({'events': [{'sku': 'COLA001', 'reference': 'T2-R-7'}] * 2}).json()
+		self.assertEqual(again.status_code, 201)
+		self.assertEqual((again.json()['id'], again.json()['duplicate']), (first['id'], True))
+		self.assertNotIn('duplicate', other)
+		self.assertEqual(data['results'][1]['id'], data['results'][0]['id'])
+		self.assertTrue(data['results'][1]['duplicate'])
+		self.cola.refresh_from_db()
+		self.assertEqual(self.cola.quantity_in_stock, 7)
+
+	def test_timeout_does_not_ask_for_blind_retry(self):
+		from concurrent.futures import Future
+		from . import pos
+		with mock.patch.object(pos.committer, 'submit', return_value=Future()), \
+				mock.patch.object(pos, 'RESULT_TIMEOUT', 0.01):
+			response = self.post({'sku': 'COLA001', 'reference': 'T1-R-8'})
+		self.assertEqual(response.status_code, 504)
+		self.assertIn('same reference', response.json()['error'])
+
+	def test_bad_event_fails_only_itself(self):
+		from concurrent.futures import Future
+		from . import pos
+		with self.assertRaises(ValueError):
+			pos.parse_event({'sku': 'COLA001', 'location': ['A']})
+		# An event that breaks the batch transaction is retried alone
+		good = pos.parse_event({'sku': 'COLA001'})
+		bad = {**pos.parse_event({'sku': 'WATR001'}), 'location': ['A']}
+		futures = [Future(), Future()]
+		pos.GroupCommitter().flush(list(zip([good, bad], futures)))
+		self.assertEqual(futures[0].result()['quantity_in_stock'], 9)
+		self.assertIsInstance(futures[1].exception(), TypeError)
+		with self.settings(INVENTORY_POS_GROUP_COMMIT=False):
+			response = self.post({'events': [{'sku': 'COLA001'}, {'sku': 'WATR001', 'location': {'code': 'A'}}]})
+		self.assertEqual(response.json()['results'][0]['quantity_in_stock'], 8)
+		self.assertIn('location', response.json()['results'][1]['error'])
+
+class PosGroupCommitTest(TransactionTestCase):
+	def test_concurrent_events_share_a_transaction(self):
+		import threading
+		from . import pos
+		from .skuindex import index
+		cache.clear()
+		index.clear()
+		category = Category.objects.create(name="Bakery")
+		item = Item.objects.create(name="Roll", sku="ROLL001", category=category,
+			unit_price=0.10, selling_price=0.30, quantity_in_stock=100)
+		committer = pos.GroupCommitter()
+		event = pos.parse_event({'sku': 'ROLL001'})
+		with self.settings(INVENTORY_POS_FLUSH_INTERVAL=0.2):
+			futures = []
+			threads = [threading.Thread(target=lambda: futures.append(committer.submit(dict(event)))) for _ in range(20)]
+			for thread in threads:
+				thread.start()
+			for thread in threads:
+				thread.join()
+			results = [future.result(timeout=10) for future in futures]
+		self.assertEqual(sorted(r['quantity_in_stock'] for r in results), list(range(80, 100)))
+		self.assertLess(committer.batches, 20)
+		item.refresh_from_db()
+		self.assertEqual(item.quantity_in_stock, 80)
+
+class ItemImageTest(TestCase):
+	def setUp(self):
+		import tempfile
+		from django.test import override_settings
+		media = tempfile.TemporaryDirectory()
+		self.addCleanup(media.cleanup)
+		settings = override_settings(MEDIA_ROOT=media.name, INVENTORY_IMAGE_ASYNC=False)
+		settings.enable()
+		self.addCleanup(settings.disable)
+		self.category = Category.objects.create(name="Hats")
+
+	def upload(self, color='red', size=(1200, 800)):
+		import io
+		from PIL import Image
+		from django.core.files.uploadedfile import SimpleUploadedFile
+		out = io.BytesIO()
+		Image.new('RGB', size, color).save(out, 'PNG')
+		return SimpleUploadedFile('photo.png', out.getvalue(), content_type='image/png')
+
+	def create(self):
+		with self.captureOnCommitCallbacks(execute=True):
+			response = Client().post(reverse('inventory:item_create'), {
+				'name': 'Cap', 'sku': 'CAP001', 'category': self.category.id, 'unit_price': '2.00',
+				'selling_price': '5.00', 'quantity_in_stock': 3, 'minimum_stock_level': 1,
+				'unit_of_measurement': 'pieces', 'is_active': 'on', 'image': self.upload(),
+			})
+		self.assertEqual(response.status_code, 302)
+		return Item.objects.get(sku='CAP001')
+
+	def test_upload_renders_hashed_variants(self):
+		from PIL import Image
+		from django.core.files.storage import default_storage
+		from . import images
+		item = self.create()
+		self.assertTrue(item.image.name.startswith('items/originals/'))
+		self.assertRegex(item.image_thumbnail, images.VARIANT_NAME)
+		with default_storage.open(images.VARIANT_DIR + item.image_thumbnail) as f:
+			self.assertEqual(Image.open(f).size, (96, 64))
+		with default_storage.open(images.VARIANT_DIR + item.image_preview) as f:
+			self.assertEqual(Image.open(f).size, (480, 320))
+
+		listing = Client().get(reverse('inventory:item_list')).content.decode()
+		self.assertIn(item.thumbnail_url, listing)
+		self.assertNotIn(item.image.name, listing)
+		detail = Client().get(reverse('inventory:item_detail', args=[item.id])).content.decode()
+		self.assertIn(item.preview_url, detail)
+		self.assertNotIn(item.image.name, detail)
+
+	def test_variants_served_with_immutable_caching(self):
+		item = self.create()
+		response = Client().get(item.thumbnail_url)
+		self.assertEqual(response.status_code, 200)
+		self.assertEqual(response['Content-Type'], 'image/jpeg')
+		self.assertIn('immutable', response['Cache-Control'])
+		self.assertIn('max-age=31536000', response['Cache-Control'])
+		self.assertEqual(Client().get(reverse('inventory:item_image', args=['..passwd'])).status_code, 404)
+
+	def test_stale_render_ignored_after_image_replaced(self):
+		from . import images
+		item = self.create()
+		old = item.image_thumbnail
+		Item.objects.filter(pk=item.pk).update(image='items/originals/other.png')
+		images.generate(item.pk, item.image.name)
+		item.refresh_from_db()
+		self.assertEqual(item.image_thumbnail, old)
+
+class BarcodeLabelTest(TestCase):
+	def setUp(self):
+		self.category = Category.objects.create(name="Tools")
+		for number in range(30):
+			Item.objects.create(name=f"Spanner {number}", sku=f"SPN{number:03d}", category=self.category,
+				unit_price=2.00, selling_price=4.50)
+
+	def test_code128_encoding(self):
+		from .labels import code128_modules, QUIET_ZONE
+		modules = code128_modules('A')
+		# Quiet zones, start B, 'A', checksum and stop: 3 * 11 + 13 modules
+		self.assertEqual(len(modules), 2 * QUIET_ZONE + 46)
+		bars = ''.join('1' if bar else '0' for bar in modules[QUIET_ZONE:QUIET_ZONE + 11])
+		self.assertEqual(bars, '11010010000')
+		with self.assertRaises(ValueError):
+			code128_modules('Ä')
+
+	def test_pdf_is_well_formed(self):
+		import re
+		import zlib
+		from . import labels
+		rows = labels.label_rows(Item.objects.all())
+		pdf = b''.join(labels.pdf_chunks(rows, workers=2))
+		self.assertTrue(pdf.startswith(b'%PDF-1.4'))
+		self.assertIn(b'/Count 2', pdf)
+		xref_at = int(re.search(rb'startxref\n(\d+)', pdf).group(1))
+		offsets = re.findall(rb'(\d{10}) 00000 n', pdf[xref_at:])
+		for number, offset in enumerate(offsets, start=1):
+			self.assertTrue(pdf[int(offset):].startswith(f'{number} 0 obj'.encode()))
+		stream = re.search(rb'/Length (\d+) >>\nstream\n', pdf)
+		bits = zlib.decompress(pdf[stream.end():stream.end() + int(stream.group(1))])
+		self.assertEqual(len(bits), (labels.PAGE_SIZE[0] + 7) // 8 * labels.PAGE_SIZE[1])
+
+	def test_command_writes_png_sheets(self):
+		import os
+		import tempfile
+		from io import StringIO
+		from PIL import Image
+		from django.core.management import call_command
+		with tempfile.TemporaryDirectory() as directory:
+			out = StringIO()
+			call_command('print_labels', directory, '--format', 'png', '--workers', '1', stdout=out)
+			self.assertIn('30 labels on 2 sheets', out.getvalue())
+			self.assertEqual(sorted(os.listdir(directory)), ['labels-00001.png', 'labels-00002.png'])
+			with Image.open(os.path.join(directory, 'labels-00001.png')) as sheet:
+				self.assertEqual(sheet.size, (2480, 3508))
+
+	def test_view_is_staff_only_and_filters(self):
+		from . import labels
+		url = reverse('inventory:item_labels')
+		client = Client()
+		self.assertEqual(client.get(url).status_code, 302)
+		client.force_login(User.objects.create(username="boss", is_staff=True))
+		with mock.patch.object(labels, 'ProcessPoolExecutor') as pool:
+			response = client.get(url, {'search': 'SPN00'})
+			pdf = b''.join(response.streaming_content)
+		pool.assert_not_called()
+		self.assertEqual(response['Content-Type'], 'application/pdf')
+		self.assertIn(b'/Count 1', pdf)
+
+
+class SupplierPerformanceTest(TestCase):
+	def setUp(self):
+		self.category = Category.objects.create(name="Hardware")
+		self.supplier = Supplier.objects.create(name="Bolt Co")
+		self.other_supplier = Supplier.objects.create(name="Nut Co")
+		self.bolt = Item.objects.create(
+			name="Bolt", sku="BOLT001", category=self.category, supplier=self.supplier,
+			unit_price=1.00, selling_price=2.00, quantity_in_stock=0, minimum_stock_level=5
+		)
+		self.nut = Item.objects.create(
+			name="Nut", sku="NUT001", category=self.category, supplier=self.other_supplier,
+			unit_price=0.25, selling_price=0.50, quantity_in_stock=0, minimum_stock_level=5
+		)
+		now = timezone.now()
+		# Received 4 days after ordering, a day late; one line short
+		self.late = self._order(self.supplier, now - timezone.timedelta(days=10), now - timezone.timedelta(days=6), due=now - timezone.timedelta(days=7))
+		OrderItem.objects.create(order=self.late, item=self.bolt, quantity_ordered=10, unit_price=1, quantity_received=6)
+		# Received 2 days after ordering, on time; over-delivered
+		self.early = self._order(self.supplier, now - timezone.timedelta(days=5), now - timezone.timedelta(days=3), due=now - timezone.timedelta(days=3))
+		OrderItem.objects.create(order=self.early, item=self.bolt, quantity_ordered=10, unit_price=1, quantity_received=12)
+		# Still open: not counted
+		open_order = Order.objects.create(supplier=self.supplier, status='ordered')
+		OrderItem.objects.create(order=open_order, item=self.bolt, quantity_ordered=1, unit_price=1)
+
+	def _order(self, supplier, ordered, received, due=None):
+		order = Order.objects.create(supplier=supplier, status='received', expected_delivery_date=due and due.date())
+		Order.objects.filter(pk=order.pk).update(order_date=ordered, received_at=received)
+		return order
+
+	def test_received_timestamps_are_recorded(self):
+		order = Order.objects.create(supplier=self.other_supplier)
+		line = OrderItem.objects.create(order=order, item=self.nut, quantity_ordered=5, unit_price=1)
+		self.assertIsNone(order.received_at)
+		self.assertIsNone(line.received_at)
+		line.quantity_received = 5
+		line.save()
+		order.status = 'received'
+		order.save()
+		self.assertIsNotNone(line.received_at)
+		self.assertIsNotNone(order.received_at)
+
+	def test_supplier_performance(self):
+		from .analytics import supplier_performance
+		with self.assertNumQueries(2):
+			performance = supplier_performance()
+		self.assertEqual(set(performance), {self.supplier.id})
+		stats = performance[self.supplier.id]
+		self.assertEqual(stats['received_orders'], 2)
+		self.assertAlmostEqual(stats['lead_time_days'], 3, places=3)
+		self.assertEqual(stats['on_time_rate'], 0.5)
+		# (6 + min(12, 10)) / 20
+		self.assertEqual(stats['fill_rate'], 0.8)
+		# Cached until data changes
+		with self.assertNumQueries(0):
+			supplier_performance()
+
+	def test_reorder_plan_uses_measured_lead_time(self):
+		from .reorders import plan_reorders
+		StockMovement.objects.create(item=self.bolt, movement_type='out', quantity=60)
+		StockMovement.objects.create(item=self.nut, movement_type='out', quantity=60)
+		plan = plan_reorders(lookback_days=30, lead_time_days=10, safety_days=0, cover_days=10)
+		lead_times = dict(zip(plan['item_id'].tolist(), plan['lead_time_days'].tolist()))
+		points = dict(zip(plan['item_id'].tolist(), plan['reorder_point'].tolist()))
+		# Bolt Co measured at 3 days, Nut Co falls back to 10; 2 units a day
+		self.assertEqual(lead_times, {self.bolt.id: 3, self.nut.id: 10})
+		self.assertEqual(points, {self.bolt.id: 6, self.nut.id: 20})
+
+	def test_supplier_list_shows_performance(self):
+		response = self.client.get(reverse('inventory:supplier_list'))
+		self.assertContains(response, 'Fill Rate')
+		self.assertContains(response, '80%')
+		self.assertContains(response, 'No received orders yet.')
+
+
+class PriceHistoryTest(TestCase):
+	def setUp(self):
+		self.category = Category.objects.create(name="Stationery")
+		self.other_category = Category.objects.create(name="Hardware")
+		self.supplier = Supplier.objects.create(name="Paper Co")
+		self.pen = Item.objects.create(
+			name="Pen", sku="PEN001", category=self.category, supplier=self.supplier,
+			unit_price=Decimal('1.00'), selling_price=Decimal('39.99')
+		)
+		self.pad = Item.objects.create(
+			name="Pad", sku="PAD001", category=self.category,
+			unit_price=Decimal('2.00'), selling_price=Decimal('3.00')
+		)
+		self.bolt = Item.objects.create(
+			name="Bolt", sku="BOLT001", category=self.other_category, supplier=self.supplier,
+			unit_price=Decimal('0.50'), selling_price=Decimal('1.00')
+		)
+
+	def test_saves_record_only_price_changes(self):
+		from .models import ItemPrice
+		self.assertEqual(ItemPrice.objects.filter(item=self.pen).count(), 1)
+		self.pen.minimum_stock_level = 3
+		self.pen.save()
+		self.assertEqual(ItemPrice.objects.filter(item=self.pen).count(), 1)
+		self.pen.selling_price = Decimal('45.00')
+		self.pen.save()
+		self.assertEqual(
+			list(self.pen.price_history.values_list('selling_price', flat=True)), [Decimal('45.00'), Decimal('39.99')]
+		)
+
+	def test_prices_as_of(self):
+		from .pricing import price_as_of, with_prices_as_of
+		from .models import ItemPrice
+		last_week = timezone.now() - timezone.timedelta(days=7)
+		ItemPrice.objects.filter(item=self.pen).update(effective_at=last_week)
+		self.pen.selling_price = Decimal('45.00')
+		self.pen.save()
+		yesterday = timezone.localdate() - timezone.timedelta(days=1)
+		self.assertEqual(price_as_of(self.pen, yesterday).selling_price, Decimal('39.99'))
+		self.assertEqual(price_as_of(self.pen, timezone.localdate()).selling_price, Decimal('45.00'))
+		self.assertIsNone(price_as_of(self.pen, last_week - timezone.timedelta(days=1)))
+		with self.assertNumQueries(1):
+			rows = dict(with_prices_as_of(Item.objects.all(), yesterday).values_list('sku', 'price_selling'))
+		self.assertEqual(rows, {'PEN001': Decimal('39.99'), 'PAD001': None, 'BOLT001': None})
+
+		response = self.client.get(reverse('inventory:price_margin_data'), {'as_of': yesterday.isoformat()})
+		self.assertEqual(response.json()['items'], ['Pen'])
+		self.assertEqual(response.json()['selling_prices'], [39.99])
+		response = self.client.get(reverse('inventory:price_margin_data'), {'as_of': 'last week'})
+		self.assertEqual(response.status_code, 400)
+		response = self.client.get(reverse('inventory:price_margin_data'), {'as_of': '2024-02-30'})
+		self.assertEqual(response.status_code, 400)
+
+	def test_reprice_by_category(self):
+		from .pricing import reprice
+		from .models import ItemPrice
+		# One UPDATE, a read-back, the history and change-feed inserts
+		with self.assertNumQueries(7):
+			self.assertEqual(reprice(percent=10, category=self.category, reason='Annual increase'), 2)
+		self.pen.refresh_from_db()
+		self.pad.refresh_from_db()
+		self.bolt.refresh_from_db()
+		self.assertEqual(self.pen.selling_price, Decimal('43.99'))
+		self.assertEqual(self.pad.selling_price, Decimal('3.30'))
+		self.assertEqual(self.pen.unit_price, Decimal('1.00'))
+		self.assertEqual(self.bolt.selling_price, Decimal('1.00'))
+		latest = self.pen.price_history.first()
+		self.assertEqual((latest.selling_price, latest.reason), (Decimal('43.99'), 'Annual increase'))
+		self.assertEqual(ItemPrice.objects.filter(item=self.bolt).count(), 1)
+
+	def test_reprice_by_supplier_and_amount(self):
+		from .pricing import reprice
+		self.assertEqual(reprice(field='both', amount=Decimal('-0.75'), supplier=self.supplier), 2)
+		self.bolt.refresh_from_db()
+		self.pen.refresh_from_db()
+		# Never below zero
+		self.assertEqual((self.bolt.unit_price, self.bolt.selling_price), (Decimal('0.00'), Decimal('0.25')))
+		self.assertEqual((self.pen.unit_price, self.pen.selling_price), (Decimal('0.25'), Decimal('39.24')))
+		with self.assertRaises(ValueError):
+			reprice(percent=5)
+		with self.assertRaises(ValueError):
+			reprice(percent=5, amount=1, category=self.category)
+
+
+class QueryBudgetTest(TestCase):
+	"""
+	Every route in inventory/urls.py is requested against a mid-size dataset
+	and must stay within its query budget, so a per-row query (N+1) fails
+	here instead of in production. Each captured SELECT is also run through
+	EXPLAIN QUERY PLAN: a full table scan (rather than an index search or an
+	ordered index walk) of the item or movement table fails unless the route
+	is listed as reading the whole table.
+	"""
+	ITEMS = 300
+	MOVEMENTS_PER_ITEM = 6
+	HOT_TABLES = ('inventory_item', 'inventory_stockmovement')
+	# Catalogue-wide pages, counts and aggregates, the SKU index warm-up and
+	# substring search read every item; nothing may scan the movement ledger
+	ITEM_SCAN = ('inventory_item',)
+	# A plan row scanning a table without an index; the whole name must be
+	# followed by something other than " USING (COVERING) INDEX"
+	SCAN_ROW = re.compile(r'^SCAN (?:TABLE )?(\w+)\b(?! USING)')
+
+	# route -> (method, query or form data, query budget, hot tables it may scan in full)
+	ROUTES = {
+		'dashboard': ('get', {}, 9, ITEM_SCAN),
+		'item_list': ('get', {}, 4, ITEM_SCAN),
+		'item_detail': ('get', {}, 8, ()),
+		'item_create': ('get', {}, 2, ()),
+		'item_labels': ('get', {}, 3, ITEM_SCAN),
+		'item_edit': ('get', {}, 3, ()),
+		'item_movements_api': ('get', {}, 3, ()),
+		'item_image': ('get', {}, 0, ()),
+		'stock_movement_create': ('get', {}, 4, ITEM_SCAN),
+		'cycle_count_list': ('get', {}, 5, ()),
+		'cycle_count_detail': ('get', {}, 6, ()),
+		'cycle_count_approve': ('post', {}, 29, ()),
+		'cycle_count_cancel': ('post', {}, 4, ()),
+		'category_list': ('get', {}, 4, ()),
+		'category_create': ('get', {}, 2, ()),
+		'supplier_list': ('get', {}, 6, ()),
+		'supplier_create': ('get', {}, 2, ()),
+		'reports': ('get', {}, 3, ()),
+		'reports_refresh': ('post', {}, 13, ITEM_SCAN),
+		'abc_analysis': ('get', {}, 5, ()),
+		'abc_refresh': ('post', {}, 10, ITEM_SCAN),
+		'turnover_csv': ('get', {}, 1, ITEM_SCAN),
+		'profile_samples': ('get', {}, 2, ()),
+		'reorder_suggestions': ('get', {}, 8, ITEM_SCAN),
+		'api_item_search': ('get', {'q': 'Item 01'}, 1, ITEM_SCAN),
+		'api_sku_lookup': ('get', {}, 3, ITEM_SCAN),
+		'api_pos_events': ('post', {'sku': 'SKU0001', 'quantity': 1}, 25, ()),
+		'api_changes': ('get', {'since': 0}, 2, ()),
+		'api_turnover': ('get', {}, 2, ITEM_SCAN),
+		'stock_by_item': ('get', {}, 2, ()),
+		'stock_by_item_data': ('get', {}, 2, ()),
+		'stock_value_by_category': ('get', {}, 2, ()),
+		'stock_value_by_category_data': ('get', {}, 1, ()),
+		'api_report_data': ('get', {}, 2, ()),
+		'stock_movements_time_series_data': ('get', {}, 1, ()),
+		'price_margin_data': ('get', {}, 2, ()),
+	}
+	# Routes without a budget, and why
+	EXEMPT = {
+		'stock_stream': 'an open-ended event stream; covered by StockBroadcasterTest',
+	}
+
+	@classmethod
+	def setUpTestData(cls):
+		from . import cyclecounts, refdata, snapshots
+		cls.staff = User.objects.create_user(username='staff', password='pw', is_staff=True)
+		location = Location.default()
+		categories = Category.objects.bulk_create([Category(name=f"Category {n}") for n in range(10)])
+		suppliers = Supplier.objects.bulk_create([Supplier(name=f"Supplier {n}") for n in range(10)])
+		# Bulk inserts skip the signals that refresh cached reference data
+		refdata.invalidate()
+		items = Item.objects.bulk_create([
+			Item(
+				name=f"Item {n:04d}", sku=f"SKU{n:04d}", category=categories[n % 10], supplier=suppliers[n % 10],
+				unit_price=Decimal('10.00') + n, selling_price=Decimal('15.00') + n,
+				quantity_in_stock=n % 40, minimum_stock_level=10,
+			)
+			for n in range(cls.ITEMS)
+		])
+		ItemStock.objects.bulk_create([
+			ItemStock(item=item, location=location, quantity=item.quantity_in_stock) for item in items
+		])
+		StockMovement.objects.bulk_create([
+			StockMovement(
+				item=item, location=location, movement_type=('in', 'out')[n % 2], quantity=n + 1,
+				reference=f"MV-{item.id}-{n}",
+			)
+			for item in items for n in range(cls.MOVEMENTS_PER_ITEM)
+		])
+		for supplier in suppliers[:3]:
+			order = Order.objects.create(supplier=supplier, status='ordered')
+			OrderItem.objects.bulk_create([
+				OrderItem(order=order, item=item, quantity_ordered=20, unit_price=item.unit_price)
+				for item in items if item.supplier_id == supplier.id
+			])
+		cls.item = items[0]
+		cls.count = cyclecounts.create_count({item.sku: 5 for item in items[:50]}, user=cls.staff)
+		cls.other_count = cyclecounts.create_count({items[60].sku: 1}, user=cls.staff)
+		snapshots.refresh_snapshot()
+
+	def setUp(self):
+		import tempfile
+		from django.core.files.base import ContentFile
+		from django.core.files.storage import default_storage
+		from django.test import override_settings
+		media = tempfile.TemporaryDirectory()
+		self.addCleanup(media.cleanup)
+		settings = override_settings(
+			MEDIA_ROOT=media.name, INVENTORY_LABEL_WORKERS=1, INVENTORY_POS_GROUP_COMMIT=False,
+		)
+		settings.enable()
+		self.addCleanup(settings.disable)
+		self.image = 'f' * 32 + '.jpg'
+		default_storage.save('items/variants/' + self.image, ContentFile(b'jpeg'))
+		cache.clear()
+		self.client.force_login(self.staff)
+
+	def route_kwargs(self, name):
+		return {
+			'item_detail': {'item_id': self.item.id},
+			'item_edit': {'item_id': self.item.id},
+			'item_movements_api': {'item_id': self.item.id},
+			'item_image': {'name': self.image},
+			'cycle_count_detail': {'count_id': self.count.id},
+			'cycle_count_approve': {'count_id': self.count.id},
+			'cycle_count_cancel': {'count_id': self.other_count.id},
+			'api_sku_lookup': {'sku': self.item.sku},
+		}.get(name, {})
+
+	def request(self, name, method, data):
+		import json
+		url = reverse(f'inventory:{name}', kwargs=self.route_kwargs(name))
+		if name == 'api_pos_events':
+			return self.client.post(url, json.dumps(data), content_type='application/json')
+		response = getattr(self.client, method)(url, data)
+		if response.streaming:
+			b''.join(response.streaming_content)
+		return response
+
+	def full_scans(self, statements):
+		"""(table, sql) for every hot table a captured SELECT reads without an index"""
+		from django.db import connection
+		found = []
+		with connection.cursor() as cursor:
+			for sql in statements:
+				if not sql.lstrip().upper().startswith(('SELECT', 'WITH')):
+					continue
+				cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+				for row in cursor.fetchall():
+					match = self.SCAN_ROW.match(row[-1])
+					if match and match.group(1) in self.HOT_TABLES:
+						found.append((match.group(1), sql))
+		return found
+
+	def test_every_route_has_a_budget(self):
+		from . import urls
+		names = {pattern.name for pattern in urls.urlpatterns}
+		self.assertEqual(names - set(self.EXEMPT), set(self.ROUTES))
+
+	def test_scan_row_pattern(self):
+		self.assertEqual(self.SCAN_ROW.match('SCAN inventory_item').group(1), 'inventory_item')
+		self.assertEqual(self.SCAN_ROW.match('SCAN TABLE inventory_item').group(1), 'inventory_item')
+		self.assertIsNone(self.SCAN_ROW.match('SCAN inventory_item USING INDEX inventory_item_sku_idx'))
+		self.assertIsNone(self.SCAN_ROW.match('SCAN inventory_item USING COVERING INDEX inventory_item_sku_idx'))
+		self.assertIsNone(self.SCAN_ROW.match('SEARCH inventory_item USING INTEGER PRIMARY KEY (rowid=?)'))
+
+	def test_query_budgets_and_plans(self):
+		from django.db import connection
+		from django.test.utils import CaptureQueriesContext
+		for name, (method, data, budget, scans) in self.ROUTES.items():
+			with self.subTest(route=name):
+				with CaptureQueriesContext(connection) as captured:
+					response = self.request(name, method, data)
+				self.assertIn(response.status_code, (200, 201, 302))
+				statements = [query['sql'] for query in captured.captured_queries]
+				self.assertLessEqual(len(statements), budget, '\n'.join(statements))
+				for table, sql in self.full_scans(statements):
+					self.assertIn(table, scans, f'Full scan of {table}: {sql}')
+
+
+class VerifyStockTest(TestCase):
+	def setUp(self):
+		self.category = Category.objects.create(name="Hardware")
+		self.main = Location.default()
+		self.store = Location.objects.create(code='STORE', name='Shop Floor')
+		self.bolt = Item.objects.create(
+			name="Bolt", sku="BOLT001", category=self.category, unit_price=Decimal('1.00'), selling_price=Decimal('2.00')
+		)
+		self.nut = Item.objects.create(
+			name="Nut", sku="NUT001", category=self.category, unit_price=Decimal('0.50'), selling_price=Decimal('1.00')
+		)
+		StockMovement.objects.create(item=self.bolt, movement_type='in', quantity=30)
+		StockMovement.objects.create(item=self.bolt, location=self.store, movement_type='in', quantity=10)
+		StockMovement.objects.create(item=self.bolt, movement_type='out', quantity=5)
+		StockMovement.objects.create(item=self.nut, movement_type='in', quantity=8)
+
+	def test_consistent_ledger(self):
+		from .stockcheck import verify
+		result = verify(chunk_size=1, workers=1)
+		self.assertEqual((result['chunks'], result['movements'], result['drifted']), (2, 4, []))
+
+	def test_stock_entered_on_items_verifies_clean(self):
+		from .stockcheck import verify
+		washer = Item.objects.create(
+			name="Washer", sku="WASH001", category=self.category, unit_price=Decimal('0.10'),
+			selling_price=Decimal('0.20'), quantity_in_stock=12
+		)
+		self.bolt.refresh_from_db()
+		self.bolt.quantity_in_stock = 20
+		self.bolt.save()
+		self.assertEqual(verify(workers=1)['drifted'], [])
+		self.assertEqual(verify(workers=1, fix=True)['repaired'], 0)
+		washer.refresh_from_db()
+		self.assertEqual(washer.quantity_in_stock, 12)
+
+	def test_reports_and_repairs_drift(self):
+		from .stockcheck import verify
+		from .models import ItemCost
+		# Writes that bypass the ledger move the total and the default location off it
+		Item.objects.filter(pk=self.bolt.pk).update(quantity_in_stock=50)
+		ItemStock.objects.filter(item=self.bolt, location=self.main).update(quantity=40)
+		ItemStock.objects.filter(item=self.nut).update(quantity=3)
+
+		result = verify(workers=1)
+		self.assertEqual(result['drifted'], [
+			{'item_id': self.bolt.id, 'sku': 'BOLT001', 'recorded': 50, 'expected': 35,
+			 'locations': {self.main.id: (40, 25)}},
+			{'item_id': self.nut.id, 'sku': 'NUT001', 'recorded': 8, 'expected': 8,
+			 'locations': {self.main.id: (3, 8)}},
+		])
+		self.assertEqual(result['repaired'], 0)
+
+		result = verify(workers=1, fix=True)
+		self.assertEqual(result['repaired'], 2)
+		self.bolt.refresh_from_db()
+		self.assertEqual(self.bolt.quantity_in_stock, 35)
+		self.assertEqual(ItemStock.objects.get(item=self.bolt, location=self.main).quantity, 25)
+		self.assertEqual(ItemStock.objects.get(item=self.nut, location=self.main).quantity, 8)
+		self.assertEqual(ItemCost.objects.get(item=self.bolt).quantity, 35)
+		self.assertEqual(verify(workers=1)['drifted'], [])
+
+	def test_command_lists_drift(self):
+		from io import StringIO
+		from django.core.management import call_command
+		Item.objects.filter(pk=self.nut.pk).update(quantity_in_stock=2)
+		out = StringIO()
+		call_command('verify_stock', workers=1, stdout=out)
+		self.assertIn('NUT001: recorded 2, ledger 8 (+6)', out.getvalue())
+		self.assertIn('1 item drifted', out.getvalue())
+
+
+class ReferenceDataCacheTest(TestCase):
+	def setUp(self):
+		cache.clear()
+		self.tools = Category.objects.create(name="Tools")
+		self.acme = Supplier.objects.create(name="Acme")
+
+	def test_lists_are_cached_until_reference_data_changes(self):
+		from . import refdata
+		self.assertEqual(refdata.categories(), [{'id': self.tools.id, 'name': "Tools"}])
+		self.assertEqual(refdata.suppliers(), [{'id': self.acme.id, 'name': "Acme"}])
+		with self.assertNumQueries(0):
+			self.assertEqual(refdata.category_names(), {self.tools.id: "Tools"})
+			self.assertEqual(refdata.supplier_names(), {self.acme.id: "Acme"})
+		# Stock changes leave the lists cached
+		item = Item.objects.create(
+			name="Hammer", sku="HAM001", category=self.tools, unit_price=5, selling_price=8
+		)
+		StockMovement.objects.create(item=item, movement_type='in', quantity=3)
+		with self.assertNumQueries(0):
+			refdata.categories()
+		garden = Category.objects.create(name="Garden")
+		self.assertEqual([row['name'] for row in refdata.categories()], ["Garden", "Tools"])
+		garden.delete()
+		self.assertEqual([row['name'] for row in refdata.categories()], ["Tools"])
+
+	def test_lists_expire_for_processes_that_missed_the_change(self):
+		import time
+		from . import refdata
+		refdata.categories()
+		# A write elsewhere, which this process's cache never heard of
+		Category.objects.filter(pk=self.tools.pk).update(name="Hand tools")
+		self.assertEqual(refdata.category_names(), {self.tools.id: "Tools"})
+		later = time.time() + refdata.cache_timeout() + 1
+		with mock.patch('django.core.cache.backends.locmem.time.time', return_value=later):
+			self.assertEqual(refdata.category_names(), {self.tools.id: "Hand tools"})
+
+	def test_forms_render_choices_from_cache(self):
+		from . import refdata
+		from .forms import ItemForm, OrderForm
+		refdata.categories(), refdata.suppliers()
+		with self.assertNumQueries(0):
+			html = str(ItemForm()['category']) + str(ItemForm()['supplier']) + str(OrderForm()['supplier'])
+		self.assertIn(f'<option value="{self.tools.id}">Tools</option>', html)
+		self.assertIn(f'<option value="{self.acme.id}">Acme</option>', html)
+		self.assertIn("Select a supplier (optional)", html)
+
+		form = ItemForm(data={
+			'name': "Saw", 'sku': "SAW001", 'category': self.tools.id, 'supplier': self.acme.id,
+			'unit_price': '3.00', 'selling_price': '6.00', 'quantity_in_stock': 0, 'minimum_stock_level': 1,
+			'unit_of_measurement': 'pieces', 'is_active': True,
+		})
+		self.assertTrue(form.is_valid(), form.errors)
+		self.assertEqual(form.cleaned_data['category'], self.tools)
+		self.assertTrue(ItemForm(data={'category': 999999})['category'].errors)
@@ -11,10 +11,19 @@ urlpatterns = [
     path('items/', views.item_list, name='item_list'),
     path('items/<int:item_id>/', views.item_detail, name='item_detail'),
     path('items/add/', views.item_create, name='item_create'),
+    path('items/labels.pdf', views.item_labels, name='item_labels'),
     path('items/<int:item_id>/edit/', views.item_edit, name='item_edit'),
+    path('items/<int:item_id>/movements/', views.item_movements_api, name='item_movements_api'),
+    path('images/<str:name>', views.item_image, name='item_image'),
     
     # Stock movements
     path('stock-movement/add/', views.stock_movement_create, name='stock_movement_create'),
+
+    # Cycle counts
+    path('cycle-counts/', views.cycle_count_list, name='cycle_count_list'),
+    path('cycle-counts/<int:count_id>/', views.cycle_count_detail, name='cycle_count_detail'),
+    path('cycle-counts/<int:count_id>/approve/', views.cycle_count_approve, name='cycle_count_approve'),
+    path('cycle-counts/<int:count_id>/cancel/', views.cycle_count_cancel, name='cycle_count_cancel'),
     
     # Categories
     path('categories/', views.category_list, name='category_list'),
@@ -26,9 +35,22 @@ urlpatterns = [
     
     # Reports
     path('reports/', views.reports, name='reports'),
+    path('reports/refresh/', views.reports_refresh, name='reports_refresh'),
+    path('reports/abc/', views.abc_analysis, name='abc_analysis'),
+    path('reports/abc/refresh/', views.abc_refresh, name='abc_refresh'),
+    path('reports/turnover.csv', views.turnover_csv, name='turnover_csv'),
+    path('reports/profile-samples/', views.profile_samples, name='profile_samples'),
+
+    # Purchasing
+    path('reorders/', views.reorder_suggestions, name='reorder_suggestions'),
     
     # API endpoints
     path('api/item-search/', views.api_item_search, name='api_item_search'),
+    path('api/sku/<str:sku>/', views.api_sku_lookup, name='api_sku_lookup'),
+    path('api/pos/events/', views.api_pos_events, name='api_pos_events'),
+    path('api/changes/', views.api_changes, name='api_changes'),
+    path('api/turnover/', views.api_turnover, name='api_turnover'),
+    path('api/stock-stream/', views.stock_stream, name='stock_stream'),
 
     # ...for chart display...
     path('stock-by-item/', views.stock_by_item_view, name='stock_by_item'),
@@ -38,6 +60,8 @@ urlpatterns = [
     path('stock-value-by-category/', views.stock_value_by_category_view, name='stock_value_by_category'),
     path('api/stock-value-by-category/', views.stock_value_by_category_data, name='stock_value_by_category_data'),
 
+    path('api/report-data/', views.api_report_data, name='api_report_data'),
+
     path('api/stock-movements-time-series/', views.stock_movements_time_series_data, 
          name='stock_movements_time_series_data'),
 
@@ -1,64 +1,85 @@
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib import messages
-from django.http import JsonResponse
-from django.db.models import Q, Sum, F
+from django.http import FileResponse, Http404, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.db.models import Count, Q, F
+from django.core.files.storage import default_storage
 from django.core.paginator import Paginator
+from django.utils.cache import patch_cache_control
+from django.views.decorators.csrf import csrf_exempt, csrf_protect
+from django.views.decorators.gzip import gzip_page
 from django.views.decorators.http import require_http_methods
+from django.utils.dateparse import parse_date, parse_datetime
+from django.utils import timezone
+from django.core import signing
+from django.utils.crypto import constant_time_compare
+from datetime import datetime, time, timedelta
+import asyncio
+import csv
 import json
-from .models import Item, Category, Supplier, StockMovement, Order, OrderItem
-from .forms import ItemForm, CategoryForm, SupplierForm, StockMovementForm, OrderForm
-# ...for chart display...
-from django.db.models import FloatField, ExpressionWrapper
-from django.db.models import Count
-from django.db.models.functions import TruncDate
-
-from django.http import JsonResponse
-from .models import Item
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from .models import Item, Category, Supplier, StockMovement, Order, OrderItem, ItemClassification, CycleCount
+from .forms import ItemForm, CategoryForm, SupplierForm, StockMovementForm, OrderForm, CycleCountUploadForm
+from . import (
+    analytics, changes, costing, cyclecounts, images, labels, ledger, live, locations, pos, pricing, profiling, refdata,
+    reorders, skuindex, snapshots,
+)
 
 
 def price_margin_data(request):
-    items = Item.objects.all()
-    
-    data = {
-        'items': [],
-        'selling_prices': [],
-        'unit_prices': [],
-        'margins': []
-    }
-    
-    for item in items:
-        data['items'].append(item.name)
-        data['selling_prices'].append(float(item.selling_price))
-        data['unit_prices'].append(float(item.unit_price))
-        data['margins'].append(float(item.selling_price - item.unit_price))
-    
-    return JsonResponse(data)
+    """
+    Prices and margins, a ``?page=`` at a time, from the latest snapshot, or
+    for every item from the price history with ``?as_of=YYYY-MM-DD``
+    """
+    as_of = request.GET.get('as_of')
+    if as_of:
+        try:
+            day = parse_date(as_of) if len(as_of) == 10 else None
+        except ValueError:
+            day = None
+        if day is None:
+            return JsonResponse({'error': 'as_of must be a date in YYYY-MM-DD format.'}, status=400)
+        return JsonResponse(pricing.margin_data_as_of(day))
+    try:
+        page, position = _series_page(request, 'price_margin')
+    except ValueError:
+        return JsonResponse({'error': 'page must be an integer.'}, status=400)
+    return JsonResponse({**page, **position})
+
+
+def _series_page(request, name):
+    """
+    ``?page=`` of the latest snapshot's per-item series ``name`` and its
+    ``{'page', 'num_pages'}`` position. Raises ValueError.
+    """
+    number = int(request.GET.get('page', 1))
+    page, num_pages = snapshots.series_page(snapshots.latest_snapshot(), name, number)
+    return page, {'page': min(max(number, 1), num_pages), 'num_pages': num_pages}
 
 def dashboard(request):
     """Dashboard view with inventory overview"""
     context = {
         'total_items': Item.objects.filter(is_active=True).count(),
-        'total_categories': Category.objects.count(),
-        'total_suppliers': Supplier.objects.count(),
+        'total_categories': len(refdata.categories()),
+        'total_suppliers': len(refdata.suppliers()),
         'low_stock_items': Item.objects.filter(
             quantity_in_stock__lte=F('minimum_stock_level'),
             is_active=True
         ).count(),
-        'total_stock_value': Item.objects.filter(is_active=True).aggregate(
-            total=Sum(F('quantity_in_stock') * F('unit_price'))
-        )['total'] or 0,
+        'total_stock_value': costing.inventory_value(),
         'recent_movements': StockMovement.objects.select_related('item', 'created_by')[:10],
         'low_stock_alerts': Item.objects.filter(
             quantity_in_stock__lte=F('minimum_stock_level'),
             is_active=True
         ).select_related('category')[:5],
+        'live_updates': live.streaming_supported(request),
     }
     return render(request, 'inventory/dashboard.html', context)
 
 
-def item_list(request):
-    """List all inventory items with search and filter"""
+def _filtered_items(request):
+    """Active items matching the item list's search, category, stock and ABC filters"""
     items = Item.objects.select_related('category', 'supplier').filter(is_active=True)
     
     # Search functionality
@@ -81,6 +102,25 @@ def item_list(request):
         items = items.filter(quantity_in_stock__lte=F('minimum_stock_level'))
     elif stock_filter == 'out':
         items = items.filter(quantity_in_stock=0)
+
+    # ABC class filter, e.g. "value:A" or "usage:C"
+    abc_filter = request.GET.get('abc', '')
+    basis, _, abc_class = abc_filter.partition(':')
+    if basis in ('value', 'usage') and abc_class in ('A', 'B', 'C'):
+        items = items.filter(**{f'classification__{basis}_class': abc_class})
+
+    filters = {
+        'search_query': search_query,
+        'category_filter': category_filter,
+        'stock_filter': stock_filter,
+        'abc_filter': abc_filter,
+    }
+    return items, filters
+
+
+def item_list(request):
+    """List all inventory items with search and filter"""
+    items, filters = _filtered_items(request)
     
     # Pagination
     paginator = Paginator(items, 20)
@@ -89,10 +129,8 @@ def item_list(request):
     
     context = {
         'page_obj': page_obj,
-        'categories': Category.objects.all(),
-        'search_query': search_query,
-        'category_filter': category_filter,
-        'stock_filter': stock_filter,
+        'categories': refdata.categories(),
+        **filters,
     }
     return render(request, 'inventory/item_list.html', context)
 
@@ -100,24 +138,113 @@ def item_list(request):
 def item_detail(request, item_id):
     """Display detailed view of an item"""
     item = get_object_or_404(Item, id=item_id)
-    recent_movements = StockMovement.objects.filter(item=item).select_related('created_by')[:10]
+    recent_movements = StockMovement.objects.filter(item=item).select_related('created_by', 'location')[:10]
     
     context = {
         'item': item,
         'recent_movements': recent_movements,
+        'location_stock': locations.stock_by_location(item),
+        'price_history': item.price_history.select_related('created_by')[:10],
     }
     return render(request, 'inventory/item_detail.html', context)
 
 
+@staff_member_required
+@require_http_methods(["GET"])
+def item_labels(request):
+    """
+    Barcode label sheets, as a streamed PDF, for the items the item list shows
+    with the same filters (or for a ``sku`` list). Rendered inline unless
+    INVENTORY_LABEL_VIEW_WORKERS allows a small pool: a request must not fork
+    one process per CPU.
+    """
+    items, _ = _filtered_items(request)
+    skus = request.GET.getlist('sku')
+    if skus:
+        items = items.filter(sku__in=skus)
+
+    response = StreamingHttpResponse(labels.pdf_chunks(labels.label_rows(items), labels.view_label_workers()), content_type='application/pdf')
+    response['Content-Disposition'] = 'attachment; filename="labels.pdf"'
+    return response
+
+
+@require_http_methods(["GET"])
+def item_image(request, name):
+    """Serve a generated photo variant; names are content hashes, so they can be cached for good"""
+    path = images.VARIANT_DIR + name
+    if not images.VARIANT_NAME.match(name) or not default_storage.exists(path):
+        raise Http404('No such image')
+    response = FileResponse(default_storage.open(path), content_type='image/jpeg')
+    patch_cache_control(response, public=True, max_age=365 * 24 * 60 * 60, immutable=True)
+    response['ETag'] = f'"{name.split(".")[0]}"'
+    return response
+
+
+@require_http_methods(["GET"])
+def item_movements_api(request, item_id):
+    """
+    JSON movement history for an item, paged with a ``cursor`` in
+    chronological order. Optional filters: ``type``, ``start`` and ``end``
+    (YYYY-MM-DD, inclusive) and ``limit`` (max 500).
+    """
+    item = get_object_or_404(Item.objects.only('id', 'sku', 'name', 'quantity_in_stock'), id=item_id)
+
+    movement_type = request.GET.get('type') or None
+    if movement_type and movement_type not in dict(StockMovement.MOVEMENT_TYPES):
+        return JsonResponse({'error': f'Unknown movement type "{movement_type}".'}, status=400)
+
+    try:
+        limit = min(max(int(request.GET.get('limit', 100)), 1), 500)
+    except ValueError:
+        return JsonResponse({'error': 'limit must be an integer.'}, status=400)
+
+    bounds = {}
+    for param in ('start', 'end'):
+        value = request.GET.get(param)
+        if not value:
+            continue
+        try:
+            day = parse_date(value) if len(value) == 10 else None
+        except ValueError:
+            day = None
+        if day is None:
+            return JsonResponse({'error': f'{param} must be a date in YYYY-MM-DD format.'}, status=400)
+        if param == 'end':
+            day += timedelta(days=1)
+        bounds[param] = timezone.make_aware(datetime.combine(day, time.min))
+
+    try:
+        rows, next_cursor = ledger.movement_page(
+            item.id, limit, cursor=request.GET.get('cursor'),
+            movement_type=movement_type, **bounds
+        )
+    except signing.BadSignature:
+        return JsonResponse({'error': 'Invalid cursor.'}, status=400)
+
+    return JsonResponse({
+        'item': {
+            'id': item.id,
+            'sku': item.sku,
+            'name': item.name,
+            'quantity_in_stock': item.quantity_in_stock,
+        },
+        'movements': rows,
+        'next_cursor': next_cursor,
+    })
+
+
 def item_create(request):
     """Create a new inventory item"""
     if request.method == 'POST':
-        form = ItemForm(request.POST)
+        form = ItemForm(request.POST, request.FILES)
         if form.is_valid():
+            new_image = images.image_changed(form)
             item = form.save(commit=False)
             if request.user.is_authenticated:
                 item.created_by = request.user
             item.save()
+            if new_image:
+                images.schedule(item)
             messages.success(request, f'Item "{item.name}" created successfully!')
             return redirect('inventory:item_detail', item_id=item.id)
     else:
@@ -134,9 +261,12 @@ def item_edit(request, item_id):
     item = get_object_or_404(Item, id=item_id)
     
     if request.method == 'POST':
-        form = ItemForm(request.POST, instance=item)
+        form = ItemForm(request.POST, request.FILES, instance=item)
         if form.is_valid():
+            new_image = images.image_changed(form)
             form.save()
+            if new_image:
+                images.schedule(item)
             messages.success(request, f'Item "{item.name}" updated successfully!')
             return redirect('inventory:item_detail', item_id=item.id)
     else:
@@ -173,6 +303,79 @@ def stock_movement_create(request):
     })
 
 
+@require_http_methods(["GET", "POST"])
+def cycle_count_list(request):
+    """List cycle counts and upload a new count file"""
+    if request.method == 'POST':
+        form = CycleCountUploadForm(request.POST, request.FILES)
+        if form.is_valid():
+            count = cyclecounts.create_count(
+                form.cleaned_data['file'],
+                location=form.cleaned_data['location'],
+                user=request.user if request.user.is_authenticated else None,
+                notes=form.cleaned_data['notes'],
+            )
+            messages.success(request, f'Loaded {len(form.cleaned_data["file"])} counted SKUs.')
+            return redirect('inventory:cycle_count_detail', count_id=count.id)
+    else:
+        form = CycleCountUploadForm()
+
+    # Meta.ordering does not apply to aggregated querysets
+    counts = CycleCount.objects.select_related('location', 'created_by').annotate(
+        line_count=Count('lines')
+    ).order_by('-created_at', '-id')
+    page_obj = Paginator(counts, 20).get_page(request.GET.get('page'))
+    return render(request, 'inventory/cycle_count_list.html', {'form': form, 'page_obj': page_obj})
+
+
+def cycle_count_detail(request, count_id):
+    """Variances of a count against book stock at its location"""
+    count = get_object_or_404(CycleCount.objects.select_related('location'), id=count_id)
+    lines = cyclecounts.variance_lines(count).select_related('item')
+    show = request.GET.get('show', 'variances')
+    if show == 'variances':
+        lines = lines.filter(item__isnull=False).exclude(variance=0)
+    elif show == 'unknown':
+        lines = lines.filter(item__isnull=True)
+
+    page_obj = Paginator(lines, 50).get_page(request.GET.get('page'))
+    return render(request, 'inventory/cycle_count_detail.html', {
+        'count': count,
+        'summary': cyclecounts.summarize(count),
+        'page_obj': page_obj,
+        'show': show,
+        'show_options': [('variances', 'Variances'), ('unknown', 'Unknown SKUs'), ('all', 'All Lines')],
+    })
+
+
+@staff_member_required
+@require_http_methods(["POST"])
+def cycle_count_approve(request, count_id):
+    """Post a count's variances as stock adjustments (staff only)"""
+    count = get_object_or_404(CycleCount, id=count_id)
+    try:
+        posted = cyclecounts.approve(count, user=request.user)
+    except ValueError as exc:
+        messages.error(request, str(exc))
+    else:
+        messages.success(request, f'Posted {posted} stock adjustment(s).')
+    return redirect('inventory:cycle_count_detail', count_id=count.id)
+
+
+@staff_member_required
+@require_http_methods(["POST"])
+def cycle_count_cancel(request, count_id):
+    """Discard a pending count (staff only)"""
+    count = get_object_or_404(CycleCount, id=count_id)
+    try:
+        cyclecounts.cancel(count)
+    except ValueError as exc:
+        messages.error(request, str(exc))
+    else:
+        messages.info(request, f'Cycle count #{count.id} cancelled.')
+    return redirect('inventory:cycle_count_detail', count_id=count.id)
+
+
 def category_list(request):
     """List all categories"""
     categories = Category.objects.prefetch_related('items').all()
@@ -197,8 +400,11 @@ def category_create(request):
 
 
 def supplier_list(request):
-    """List all suppliers"""
-    suppliers = Supplier.objects.prefetch_related('items').all()
+    """List all suppliers with their delivery performance"""
+    suppliers = list(Supplier.objects.prefetch_related('items').all())
+    performance = analytics.supplier_performance()
+    for supplier in suppliers:
+        supplier.performance = performance.get(supplier.id)
     return render(request, 'inventory/supplier_list.html', {'suppliers': suppliers})
 
 
@@ -220,29 +426,173 @@ def supplier_create(request):
 
 
 def reports(request):
-    """Generate inventory reports"""
-    # Stock value by category
-    category_stock_value = Category.objects.annotate(
-        total_value=Sum(F('items__quantity_in_stock') * F('items__unit_price'))
-    ).filter(total_value__gt=0)
-    
-    # Low stock items
-    low_stock_items = Item.objects.filter(
-        quantity_in_stock__lte=F('minimum_stock_level'),
-        is_active=True
-    ).select_related('category')
-    
-    # Recent stock movements
-    recent_movements = StockMovement.objects.select_related('item', 'created_by')[:20]
-    
+    """Generate inventory reports from the latest precomputed snapshot"""
+    snapshot = snapshots.latest_snapshot()
+    data = snapshot.data
+    recent_movements = [
+        {**m, 'created_at': parse_datetime(m['created_at'])} for m in data['recent_movements']
+    ]
+
     context = {
-        'category_stock_value': category_stock_value,
-        'low_stock_items': low_stock_items,
+        'snapshot': snapshot,
+        'category_stock_value': data['category_stock_value'],
+        'low_stock_items': data['low_stock_items'],
+        'low_stock_count': data['low_stock_count'],
         'recent_movements': recent_movements,
+        'live_updates': live.streaming_supported(request),
     }
     return render(request, 'inventory/reports.html', context)
 
 
+@staff_member_required
+@require_http_methods(["POST"])
+def reports_refresh(request):
+    """Rebuild the report snapshot immediately (staff only)"""
+    snapshot = snapshots.refresh_snapshot()
+    messages.success(request, f'Reports refreshed (snapshot v{snapshot.version}).')
+    return redirect('inventory:reports')
+
+
+@require_http_methods(["GET"])
+def abc_analysis(request):
+    """ABC classification of the catalogue by stock value and by issue value"""
+    summary = analytics.class_summary()
+    latest = ItemClassification.objects.order_by('-classified_at').values('classified_at', 'period_days').first()
+    return render(request, 'inventory/abc_analysis.html', {
+        'summary_tables': [
+            ('value', 'By Stock Value', summary['value']),
+            ('usage', 'By Issue Value', summary['usage']),
+        ],
+        'latest': latest,
+    })
+
+
+def _turnover_options(request):
+    """Parse the shared turnover report parameters; raises ValueError"""
+    days = int(request.GET.get('days', analytics.period_days()))
+    dead_days = int(request.GET.get('dead_days', analytics.dead_stock_days()))
+    if days < 1 or dead_days < 1:
+        raise ValueError('days and dead_days must be positive.')
+    return {
+        'level': request.GET.get('level', 'item'),
+        'days': days,
+        'dead_days': dead_days,
+        'sort': request.GET.get('sort', '-turnover'),
+        'dead_only': request.GET.get('dead_only') in ('1', 'true'),
+    }
+
+
+@require_http_methods(["GET"])
+def api_turnover(request):
+    """Paged, sortable turnover, days of supply and dead stock per item or category"""
+    try:
+        options = _turnover_options(request)
+        rows = analytics.turnover_report(**options)
+        page_size = min(max(int(request.GET.get('page_size', 50)), 1), 500)
+    except ValueError as exc:
+        return JsonResponse({'error': str(exc)}, status=400)
+
+    page_obj = Paginator(rows, page_size).get_page(request.GET.get('page'))
+    return JsonResponse({
+        **{key: options[key] for key in ('level', 'days', 'dead_days', 'sort')},
+        'results': list(page_obj.object_list),
+        'page': page_obj.number,
+        'num_pages': page_obj.paginator.num_pages,
+        'count': page_obj.paginator.count,
+    })
+
+
+class _Echo:
+    """File-like object whose write() hands back the value, for streaming csv rows"""
+    def write(self, value):
+        return value
+
+
+@require_http_methods(["GET"])
+def turnover_csv(request):
+    """Stream the full turnover report as CSV"""
+    try:
+        options = _turnover_options(request)
+        rows = analytics.turnover_report(**options)
+    except ValueError as exc:
+        return JsonResponse({'error': str(exc)}, status=400)
+
+    if options['level'] == 'category':
+        columns = ['name', 'items', 'on_hand', 'received', 'issued', 'average_stock',
+                   'turnover', 'days_of_supply', 'dead_stock_items']
+    else:
+        columns = ['sku', 'name', 'category_name', 'on_hand', 'received', 'issued', 'average_stock',
+                   'turnover', 'days_of_supply', 'last_issued_at', 'dead_stock']
+        rows = rows.iterator(chunk_size=2000)
+
+    writer = csv.writer(_Echo())
+
+    def lines():
+        yield writer.writerow(columns)
+        for row in rows:
+            yield writer.writerow([row[column] for column in columns])
+
+    response = StreamingHttpResponse(lines(), content_type='text/csv')
+    response['Content-Disposition'] = f'attachment; filename="turnover-{options["level"]}.csv"'
+    return response
+
+
+@staff_member_required
+@require_http_methods(["GET"])
+def profile_samples(request):
+    """Stacks collected by the request sampler in collapsed format (staff only)"""
+    lines = profiling.sampler.collapsed()
+    if request.GET.get('reset'):
+        profiling.sampler.reset()
+    return HttpResponse('\n'.join(lines), content_type='text/plain; charset=utf-8')
+
+
+@staff_member_required
+@require_http_methods(["POST"])
+def abc_refresh(request):
+    """Reclassify the catalogue immediately (staff only)"""
+    result = analytics.classify()
+    messages.success(request, f"Classified {result['items']} items in {result['seconds']:.2f}s.")
+    return redirect('inventory:abc_analysis')
+
+
+@require_http_methods(["GET", "POST"])
+def reorder_suggestions(request):
+    """Show items at or below their reorder point and draft orders for them"""
+    plan = reorders.plan_reorders()
+
+    if request.method == 'POST':
+        user = request.user if request.user.is_authenticated else None
+        orders = reorders.create_draft_orders(plan, user=user)
+        if orders:
+            messages.success(request, f'Created {len(orders)} draft purchase order(s).')
+        else:
+            messages.info(request, 'No items need reordering.')
+        return redirect('inventory:reorder_suggestions')
+
+    paginator = Paginator(range(len(plan['item_id'])), 50)
+    page_obj = paginator.get_page(request.GET.get('page'))
+    positions = list(page_obj.object_list)
+    items = Item.objects.in_bulk([int(plan['item_id'][p]) for p in positions])
+    supplier_names = refdata.supplier_names()
+    suggestions = [{
+        'item': items[int(plan['item_id'][p])],
+        'supplier': supplier_names.get(int(plan['supplier_id'][p]), ''),
+        'on_hand': int(plan['on_hand'][p]),
+        'on_order': int(plan['on_order'][p]),
+        'daily_usage': float(plan['daily_usage'][p]),
+        'lead_time_days': int(plan['lead_time_days'][p]),
+        'reorder_point': int(plan['reorder_point'][p]),
+        'suggested_quantity': int(plan['suggested_quantity'][p]),
+    } for p in positions]
+
+    return render(request, 'inventory/reorder_suggestions.html', {
+        'page_obj': page_obj,
+        'suggestions': suggestions,
+        'total_suggestions': paginator.count,
+    })
+
+
 @require_http_methods(["GET"])
 def api_item_search(request):
     """API endpoint for item search (for AJAX autocomplete)"""
@@ -264,15 +614,171 @@ def api_item_search(request):
     
     return JsonResponse({'items': items_data})
 
+@require_http_methods(["GET"])
+def api_sku_lookup(request, sku):
+    """
+    Resolve a scanned SKU from the in-memory index. Stock on hand is read by
+    primary key unless ``INVENTORY_SKU_LOOKUP_LIVE_STOCK`` is off, in which
+    case the lookup never touches the database once the index is warm.
+    """
+    entry = skuindex.index.lookup(sku.strip())
+    if entry is None:
+        return JsonResponse({'error': f'Unknown SKU "{sku}".'}, status=404)
+    item_id, name, price = entry
+    data = {'id': item_id, 'sku': sku.strip(), 'name': name, 'price': price}
+    if skuindex.live_stock():
+        data['quantity_in_stock'] = Item.objects.filter(pk=item_id).values_list(
+            'quantity_in_stock', flat=True
+        ).first()
+    return JsonResponse(data)
+
+
+@csrf_exempt
+@require_http_methods(["POST"])
+def api_pos_events(request):
+    """
+    Ingest point-of-sale stock-out events as JSON: one event
+    ``{"sku": ..., "quantity": 1, "location": "MAIN", "reference": ...}`` or
+    ``{"events": [...]}``. Events are group-committed with those from other
+    terminals; the response is sent once they are posted. Terminals send the
+    ``X-POS-Token`` header when ``INVENTORY_POS_API_TOKEN`` is set; without a
+    token the endpoint is only open to same-site requests (CSRF protected).
+
+    An event still unposted after ``pos.RESULT_TIMEOUT`` seconds gets a 504
+    but stays queued and may be posted afterwards. Resending it with the same
+    ``reference`` returns that sale instead of posting it again; an event
+    without a reference has no such guard, so terminals must not resend one.
+    """
+    token = pos.api_token()
+    if not token:
+        return csrf_protect(_pos_events)(request)
+    if not constant_time_compare(request.headers.get('X-POS-Token', ''), token):
+        return JsonResponse({'error': 'Invalid POS token.'}, status=403)
+    return _pos_events(request)
+
+
+def _pos_events(request):
+    try:
+        payload = json.loads(request.body)
+    except ValueError:
+        return JsonResponse({'error': 'Request body must be JSON.'}, status=400)
+    single = not (isinstance(payload, dict) and 'events' in payload)
+    events = [payload] if single else payload['events']
+    if not isinstance(events, list) or not events:
+        return JsonResponse({'error': 'events must be a non-empty list.'}, status=400)
+
+    pending = []
+    for data in events:
+        try:
+            pending.append(pos.committer.submit(pos.parse_event(data, request.user)))
+        except ValueError as exc:
+            pending.append(exc)
+
+    results, statuses = [], []
+    for future in pending:
+        if isinstance(future, ValueError):
+            results.append({'error': str(future)})
+            statuses.append(400)
+            continue
+        try:
+            results.append(future.result(timeout=pos.RESULT_TIMEOUT))
+            statuses.append(201)
+        except ValueError as exc:
+            results.append({'error': str(exc)})
+            statuses.append(400)
+        except FutureTimeoutError:
+            # The event is still queued and may yet be posted, so a blind retry
+            # could sell twice; a resend with the same reference cannot
+            results.append({'error': 'Stock update still pending; resend only with the same reference.'})
+            statuses.append(504)
+        except Exception:
+            # The event's transaction rolled back, so it is safe to send again
+            results.append({'error': 'Stock update failed, retry the event.'})
+            statuses.append(503)
+
+    if single:
+        return JsonResponse(results[0], status=statuses[0])
+    return JsonResponse({'results': results})
+
+
+@require_http_methods(["GET"])
+def api_changes(request):
+    """
+    Change feed for incremental sync: entries with ``seq > since``, oldest
+    first. Clients store ``next_since`` and pass it back on the next call; when
+    ``resync_required`` is true entries they missed have expired and a full
+    download is needed.
+    """
+    try:
+        since = int(request.GET.get('since', 0))
+        limit = min(max(int(request.GET.get('limit', 500)), 1), 5000)
+    except ValueError:
+        return JsonResponse({'error': 'since and limit must be integers.'}, status=400)
+
+    entries, has_more = changes.changes_since(since, limit)
+    expired_through = changes.expired_through()
+    return JsonResponse({
+        'changes': [{
+            'seq': entry.seq,
+            'model': entry.model,
+            'id': entry.object_id,
+            'action': entry.action,
+            'data': entry.payload,
+            'created_at': entry.created_at,
+        } for entry in entries],
+        'next_since': entries[-1].seq if entries else since,
+        'has_more': has_more,
+        'resync_required': since > 0 and since < expired_through,
+    })
+
+async def stock_stream(request):
+    """
+    Server-Sent Events stream of stock changes ('stock', 'low_stock' and
+    'restocked' events). Only served through ASGI, where connections stay
+    open without tying up a worker thread each; under WSGI it answers 204,
+    which tells EventSource clients not to reconnect.
+    """
+    if not live.streaming_supported(request):
+        return HttpResponse(status=204)
+    queue = await live.broadcaster.subscribe()
+
+    async def events():
+        try:
+            yield 'retry: 3000\n\n'
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=15)
+                except asyncio.TimeoutError:
+                    yield ': keep-alive\n\n'
+                    continue
+                yield f"id: {event['seq']}\nevent: {event['type']}\ndata: {json.dumps(event)}\n\n"
+        finally:
+            live.broadcaster.unsubscribe(queue)
+
+    response = StreamingHttpResponse(events(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
 # ...CHART DISPLAY...
 
 # Stock by item chart
 def stock_by_item_data(request):
     """
-    Returns JSON: { items: [{ name: "...", quantity_in_stock: 123 }, ...] }
+    Returns JSON: { items: [{ name: "...", quantity_in_stock: 123 }, ...], page: 1, num_pages: 1 }
+    One ``?page=`` of the snapshot's items, most stock first.
     """
-    qs = Item.objects.filter(is_active=True).order_by('-quantity_in_stock').values('name', 'quantity_in_stock')
-    return JsonResponse({'items': list(qs)})
+    try:
+        page, position = _series_page(request, 'stock_by_item')
+    except ValueError:
+        return JsonResponse({'error': 'page must be an integer.'}, status=400)
+    return JsonResponse({
+        'items': [
+            {'name': name, 'quantity_in_stock': quantity}
+            for name, quantity in zip(page['name'], page['quantity_in_stock'])
+        ],
+        **position,
+    })
 
 def stock_by_item_view(request):
     """Page that renders the bar chart and fetches the JSON endpoint."""
@@ -283,52 +789,40 @@ def stock_by_item_view(request):
 def stock_value_by_category_data(request):
     """
     Returns JSON: { categories: [{ name: "...", total_value: 123.45 }, ...] }
-    Aggregates unit_price * quantity_in_stock per category (only active items).
+    Stock value of active items per category, valued by the costing method.
     """
-    qs = Category.objects.all().annotate(
-        total_value=Sum(
-            ExpressionWrapper(
-                # use the Category -> items related_name ('items'), not 'item'
-                F('items__unit_price') * F('items__quantity_in_stock'),
-                output_field=FloatField()
-            ),
-            filter=Q(items__is_active=True)
-        )
-    ).values('name', 'total_value').order_by('-total_value')
-
-    data = [{'name': c['name'], 'total_value': float(c['total_value'] or 0)} for c in qs]
-    return JsonResponse({'categories': data})
+    return JsonResponse({'categories': snapshots.latest_snapshot().data['stock_value_by_category']})
 
 def stock_value_by_category_view(request):
     """Page that renders the stock value by category chart."""
     return render(request, 'inventory/stock_value_by_category.html')
 
-from django.db.models import Count
-from django.db.models.functions import TruncDate
-# ...existing code...
+
+@gzip_page
+@require_http_methods(["GET"])
+def api_report_data(request):
+    """
+    Every reports-page chart dataset in one gzipped, columnar response.
+    ``?datasets=stock_by_item,price_margin`` selects a subset, and the
+    per-item series hold ``?page=`` (``num_pages`` gives their page counts).
+    """
+    snapshot = snapshots.latest_snapshot()
+    names = request.GET.get('datasets')
+    try:
+        page = int(request.GET.get('page', 1))
+        datasets, num_pages = snapshots.chart_data(
+            snapshot, [n for n in names.split(',') if n] if names else None, page
+        )
+    except ValueError as exc:
+        return JsonResponse({'error': str(exc)}, status=400)
+    return JsonResponse({
+        'version': snapshot.version,
+        'generated_at': snapshot.created_at,
+        'datasets': datasets,
+        'num_pages': num_pages,
+    }, json_dumps_params={'separators': (',', ':')})
+
 
 def stock_movements_time_series_data(request):
     """Returns daily stock movements (in/out) for the last 30 days"""
-    thirty_days_ago = datetime.now() - timedelta(days=30)
-    
-    movements = StockMovement.objects.filter(
-        created_at__gte=thirty_days_ago
-    ).annotate(
-        date=TruncDate('created_at')
-    ).values('date', 'movement_type').annotate(
-        total=Count('id')
-    ).order_by('date')
-
-    # Organize by date for both in/out movements
-    data_by_date = {}
-    for m in movements:
-        date_str = m['date'].strftime('%Y-%m-%d')
-        if date_str not in data_by_date:
-            data_by_date[date_str] = {'in': 0, 'out': 0}
-        data_by_date[date_str][m['movement_type']] = m['total']
-
-    return JsonResponse({
-        'dates': list(data_by_date.keys()),
-        'in_movements': [data_by_date[d]['in'] for d in data_by_date],
-        'out_movements': [data_by_date[d]['out'] for d in data_by_date]
-    })
\ No newline at end of file
+    return JsonResponse(snapshots.latest_snapshot().data['movements_time_series'])
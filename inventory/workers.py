@@ -0,0 +1,12 @@
+"""
+Initializer for the process pools behind the bulk commands.
+
+Kept free of model imports: under the spawn start method (the macOS default)
+a worker imports this module to find its initializer before Django is set
+up, and only unpickles tasks from model-importing modules afterwards.
+"""
+import django
+
+
+def init_worker():
+    django.setup()
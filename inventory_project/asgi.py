@@ -3,6 +3,10 @@ ASGI config for inventory_project project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Serve it with an ASGI server (e.g. ``uvicorn inventory_project.asgi:application``)
+so the live stock stream at /inventory/api/stock-stream/ keeps its
+long-lived connections on the event loop instead of one thread each.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
@@ -48,6 +48,8 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    # Calls the view itself when profiling, so it must stay last
+    'inventory.profiling.ProfilerMiddleware',
 ]
 
 ROOT_URLCONF = 'inventory_project.urls'
@@ -62,12 +64,14 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'inventory.context_processors.data_version',
             ],
         },
     },
 ]
 
 WSGI_APPLICATION = 'inventory_project.wsgi.application'
+ASGI_APPLICATION = 'inventory_project.asgi.application'
 
 
 # Database
@@ -81,6 +85,17 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'inventory',
+    }
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -117,7 +132,84 @@ USE_TZ = True
 
 STATIC_URL = 'static/'
 
+# Uploaded files (item photos)
+MEDIA_URL = 'media/'
+MEDIA_ROOT = BASE_DIR / 'media'
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+
+# Inventory settings
+
+# Values reserved per worker process for each document sequence
+# (e.g. {'movement': 50}); 1 allocates every number straight from the counter
+INVENTORY_SEQUENCE_BLOCK_SIZES = {}
+
+# Seconds a rendered table fragment may be served from cache; entries are also
+# invalidated as soon as inventory data changes
+INVENTORY_FRAGMENT_CACHE_TIMEOUT = 300
+
+# Seconds category and supplier lists stay cached. Saves refresh them at once
+# where the cache is shared; with a per-process cache, other processes may
+# serve the old lists this long
+INVENTORY_REFDATA_TIMEOUT = 60
+
+# Location code used for movements and stock edits that do not name a location
+INVENTORY_DEFAULT_LOCATION = 'MAIN'
+
+# Days change-feed entries are kept before compact_changes removes them
+INVENTORY_CHANGE_RETENTION_DAYS = 30
+
+# SKU lookup endpoint: maximum SKUs held in each process's index, seconds
+# between its catch-ups with item changes made by other processes, and whether
+# responses include stock on hand (one primary-key query) or skip the database
+INVENTORY_SKU_INDEX_SIZE = 50000
+INVENTORY_SKU_INDEX_SYNC_INTERVAL = 1.0
+INVENTORY_SKU_LOOKUP_LIVE_STOCK = True
+
+# Point-of-sale ingestion: events are group-committed every flush interval
+# (seconds) or batch size, whichever comes first; False posts each event on its
+# own. Terminals send the token in the X-POS-Token header; without one the
+# endpoint is CSRF protected and only accepts same-site posts.
+INVENTORY_POS_GROUP_COMMIT = True
+INVENTORY_POS_FLUSH_INTERVAL = 0.005
+INVENTORY_POS_BATCH_SIZE = 500
+INVENTORY_POS_API_TOKEN = None
+
+# Item photos: threads rendering thumbnails and previews after upload; False
+# renders them on commit in the request instead
+INVENTORY_IMAGE_WORKERS = 2
+INVENTORY_IMAGE_ASYNC = True
+
+# Processes rendering barcode label sheets (None: one per CPU, 1: inline)
+INVENTORY_LABEL_WORKERS = None
+# The same for the label sheet view, per request (1: inline)
+INVENTORY_LABEL_VIEW_WORKERS = 1
+
+# Seconds between change-feed polls by the live stock broadcaster (one per process)
+INVENTORY_LIVE_POLL_INTERVAL = 1.0
+
+# ABC classification: cumulative value shares closing classes A and B, and the issue-value period
+INVENTORY_ABC_THRESHOLDS = (0.80, 0.95)
+INVENTORY_ABC_PERIOD_DAYS = 90
+
+# Age in days past which archive_movements moves stock movements to the archive table
+INVENTORY_ARCHIVE_AFTER_DAYS = 365
+
+# Items with stock but no issue for this many days are reported as dead stock
+INVENTORY_DEAD_STOCK_DAYS = 90
+
+# Supplier lead time, on-time and fill rates cover orders placed in this many days
+INVENTORY_SUPPLIER_PERIOD_DAYS = 365
+
+# Profiling: fraction of requests sampled by the stack sampler (0 disables it),
+# seconds between samples, and where staff ?_profile=store requests save pstats
+INVENTORY_PROFILE_SAMPLE_RATE = 0.0
+INVENTORY_PROFILE_SAMPLE_INTERVAL = 0.005
+INVENTORY_PROFILE_DIR = BASE_DIR / 'profiles'
+
+# Stock valuation method used by the dashboard and reports: 'average' or 'fifo'
+INVENTORY_VALUATION_METHOD = 'average'